@@ -1,6 +1,14 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_delete, post_save
 
 
 class ApiConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'api'
+
+    def ready(self):
+        from .models import Company
+        from .name_index import company_deleted, company_saved
+
+        post_save.connect(company_saved, sender=Company)
+        post_delete.connect(company_deleted, sender=Company)
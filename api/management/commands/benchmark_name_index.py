@@ -0,0 +1,108 @@
+"""
+Benchmark the in-memory company name index: build time, memory footprint and lookup latency
+"""
+from django.core.management.base import BaseCommand
+from api.models import Company
+from api.name_index import CompanyNameIndex, SortedNames, normalize
+import random
+import time
+import tracemalloc
+
+WORDS = [
+    'Alpha', 'Beta', 'Gamma', 'Delta', 'Nordic', 'Pacific', 'Global', 'United', 'Solar', 'Quantum',
+    'Atlas', 'Summit', 'Harbor', 'Vertex', 'Pioneer', 'Crescent', 'Meridian', 'Horizon', 'Apex', 'Zenith',
+]
+SUFFIXES = ['Holdings', 'Industries', 'Technologies', 'Group', 'Partners', 'Labs', 'Systems', 'Capital']
+
+
+class Command(BaseCommand):
+    help = 'Measure the memory per name and the lookup latency of the company name index'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--names',
+            type=int,
+            default=1000000,
+            help='Number of synthetic company names (default: 1000000)'
+        )
+
+        parser.add_argument(
+            '--database',
+            action='store_true',
+            help='Index the companies in the database instead of synthetic names'
+        )
+
+        parser.add_argument(
+            '--lookups',
+            type=int,
+            default=20000,
+            help='Number of prefix lookups to time (default: 20000)'
+        )
+
+        parser.add_argument(
+            '--seed',
+            type=int,
+            default=42,
+            help='Random seed (default: 42)'
+        )
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        if options['database']:
+            rows = list(Company.objects.order_by().values_list('id', 'name'))
+        else:
+            rows = [
+                (pk, f'{rng.choice(WORDS)} {rng.choice(WORDS)} {rng.choice(SUFFIXES)} {pk}')
+                for pk in range(1, options['names'] + 1)
+            ]
+        count = len(rows)
+        self.stdout.write(f'{count:,} names, {sum(len(name) for _pk, name in rows) / count:.1f} characters on average')
+
+        tracemalloc.start()
+        started = time.perf_counter()
+        names = SortedNames.from_rows(rows)
+        elapsed = time.perf_counter() - started
+        held, peak = tracemalloc.get_traced_memory()
+        self.stdout.write(
+            self.style.SUCCESS(f'Sorted array: {held / count:.1f} bytes/name ({held / 1e6:.1f} MB)')
+            + f', built in {elapsed:.2f}s (traced), build peak {peak / 1e6:.1f} MB'
+        )
+        tracemalloc.reset_peak()
+
+        # The same entries as a sorted list of Python objects, for comparison
+        before = tracemalloc.get_traced_memory()[0]
+        objects = sorted((normalize(name), pk, name) for pk, name in rows)
+        held = tracemalloc.get_traced_memory()[0] - before
+        self.stdout.write(f'Sorted list of tuples: {held / count:.1f} bytes/name ({held / 1e6:.1f} MB)')
+        del objects
+        tracemalloc.stop()
+
+        index = CompanyNameIndex(max_age=0)
+        index.build(rows=rows)
+        prefixes = [normalize(name)[:rng.randint(1, 12)] for _pk, name in rng.sample(rows, min(count, 1000))]
+        self.report('Lookup (10 results)', self.time_lookups(index, prefixes, options['lookups']))
+
+        for pk, name in rng.sample(rows, min(count, 500)):
+            index.change(pk, name + ' Renamed')
+        self.report('Lookup with 500 pending changes', self.time_lookups(index, prefixes, options['lookups']))
+
+    def time_lookups(self, index, prefixes, lookups):
+        clock = time.perf_counter_ns
+        latencies = []
+        for i in range(lookups):
+            prefix = prefixes[i % len(prefixes)]
+            t0 = clock()
+            index.lookup(prefix, 10)
+            latencies.append(clock() - t0)
+        latencies.sort()
+        return latencies
+
+    def report(self, label, latencies):
+        def percentile(p):
+            return latencies[min(len(latencies) - 1, int(len(latencies) * p))] / 1000
+
+        mean = sum(latencies) / len(latencies) / 1000
+        self.stdout.write(
+            self.style.SUCCESS(f'{label}: {1e6 / mean:,.0f} lookups/sec')
+            + f' (mean {mean:.1f}us, p50 {percentile(0.5):.1f}us, p99 {percentile(0.99):.1f}us)'
+        )
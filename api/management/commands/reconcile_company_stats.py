@@ -0,0 +1,31 @@
+"""
+Rebuild the company statistics store from the companies and report any drift
+"""
+from django.core.management.base import BaseCommand
+from api.stats import reconcile
+import time
+
+
+class Command(BaseCommand):
+    help = 'Recount companies per country and sector and replace the statistics store'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Only report the drift, do not rewrite the store'
+        )
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        drift = reconcile(dry_run=options['dry_run'])
+        for dimension, value, stored, actual in drift:
+            self.stdout.write(f'{dimension} {value!r}: stored {stored:,}, actual {actual:,}')
+
+        elapsed = time.perf_counter() - started
+        if not drift:
+            self.stdout.write(self.style.SUCCESS(f'Statistics are consistent ({elapsed:.2f}s).'))
+        elif options['dry_run']:
+            self.stdout.write(self.style.WARNING(f'{len(drift)} counters drifted ({elapsed:.2f}s); run without --dry-run to fix.'))
+        else:
+            self.stdout.write(self.style.SUCCESS(f'Rebuilt statistics, fixed {len(drift)} counters ({elapsed:.2f}s).'))
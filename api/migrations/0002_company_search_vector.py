@@ -0,0 +1,51 @@
+# Generated by Django 5.2.1 on 2026-10-18 01:11
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.db import migrations
+
+# Weights: name A, economic sector B, country C, description D
+TRIGGER_SQL = """
+CREATE FUNCTION api_company_search_vector_update() RETURNS trigger AS $$
+BEGIN
+    NEW.search_vector :=
+        setweight(to_tsvector('english', coalesce(NEW.name, '')), 'A') ||
+        setweight(to_tsvector('english', coalesce(NEW.economic_sector, '')), 'B') ||
+        setweight(to_tsvector('english', coalesce(NEW.country_of_origin, '')), 'C') ||
+        setweight(to_tsvector('english', coalesce(NEW.description, '')), 'D');
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER api_company_search_vector_trigger
+BEFORE INSERT OR UPDATE ON api_company
+FOR EACH ROW EXECUTE FUNCTION api_company_search_vector_update();
+
+-- Backfill existing rows through the trigger
+UPDATE api_company SET search_vector = NULL;
+"""
+
+REVERSE_SQL = """
+DROP TRIGGER IF EXISTS api_company_search_vector_trigger ON api_company;
+DROP FUNCTION IF EXISTS api_company_search_vector_update();
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='company',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.RunSQL(TRIGGER_SQL, REVERSE_SQL),
+        migrations.AddIndex(
+            model_name='company',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='api_company_search_idx'),
+        ),
+    ]
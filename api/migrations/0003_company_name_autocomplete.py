@@ -0,0 +1,57 @@
+# Generated by Django 5.2.1 on 2026-10-18 01:15
+
+import django.contrib.postgres.indexes
+import django.db.models.functions.comparison
+import django.db.models.functions.text
+from django.db import migrations, models
+
+# pg_trgm (PostgreSQL contrib) backs the fuzzy typeahead matches. Creating it
+# needs the contrib package on the server and, unless it is a trusted
+# extension there, a role allowed to CREATE EXTENSION. Without it the
+# migration still applies: it warns, skips the trigram index and the
+# autocomplete endpoint serves prefix matches only (see README).
+TRIGRAM_SQL = """
+DO $$
+BEGIN
+    CREATE EXTENSION IF NOT EXISTS pg_trgm;
+EXCEPTION WHEN insufficient_privilege OR feature_not_supported OR undefined_file THEN
+    RAISE WARNING 'pg_trgm is not available (%), fuzzy company name matches are disabled', SQLERRM;
+END
+$$;
+"""
+
+TRIGRAM_INDEX_SQL = """
+DO $$
+BEGIN
+    IF EXISTS (SELECT FROM pg_extension WHERE extname = 'pg_trgm') THEN
+        CREATE INDEX api_company_name_trgm_idx ON api_company USING gist (name gist_trgm_ops);
+    END IF;
+END
+$$;
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0002_company_search_vector'),
+    ]
+
+    operations = [
+        migrations.RunSQL(TRIGRAM_SQL, migrations.RunSQL.noop),
+        migrations.AddIndex(
+            model_name='company',
+            index=models.Index(django.db.models.functions.comparison.Collate(django.db.models.functions.text.Lower('name'), 'C'), name='api_company_name_prefix_idx'),
+        ),
+        migrations.SeparateDatabaseAndState(
+            database_operations=[
+                migrations.RunSQL(TRIGRAM_INDEX_SQL, "DROP INDEX IF EXISTS api_company_name_trgm_idx"),
+            ],
+            state_operations=[
+                migrations.AddIndex(
+                    model_name='company',
+                    index=django.contrib.postgres.indexes.GistIndex(fields=['name'], name='api_company_name_trgm_idx', opclasses=['gist_trgm_ops']),
+                ),
+            ],
+        ),
+    ]
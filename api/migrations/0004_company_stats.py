@@ -0,0 +1,98 @@
+# Generated by Django 5.2.1 on 2026-10-18 01:21
+
+from django.db import migrations, models
+
+# Statement-level triggers see every row a statement wrote through its
+# transition tables, so a bulk insert costs one grouped upsert per
+# country and sector rather than one per company. Rows are upserted in
+# (dimension, value) order so concurrent writers lock them in the same order.
+UPSERT_SQL = """
+        WITH changes AS ({changes})
+        INSERT INTO api_companystat (dimension, value, count)
+        SELECT dimension, value, SUM(delta)
+        FROM (
+            SELECT 'country' AS dimension, country_of_origin AS value, delta FROM changes
+            UNION ALL
+            SELECT 'sector', economic_sector, delta FROM changes
+        ) AS counts
+        GROUP BY dimension, value
+        HAVING SUM(delta) <> 0
+        ORDER BY dimension, value
+        ON CONFLICT (dimension, value) DO UPDATE SET count = api_companystat.count + EXCLUDED.count;"""
+
+ADDED = "SELECT country_of_origin, economic_sector, 1 AS delta FROM new_rows"
+REMOVED = "SELECT country_of_origin, economic_sector, -1 AS delta FROM old_rows"
+
+TRIGGER_SQL = """
+CREATE FUNCTION api_company_stats_update() RETURNS trigger AS $$
+BEGIN
+    -- Only the transition tables of the current event exist, hence one
+    -- statement per event (each with its own cached plan)
+    IF TG_OP = 'INSERT' THEN{insert}
+    ELSIF TG_OP = 'UPDATE' THEN{update}
+    ELSIF TG_OP = 'DELETE' THEN{delete}
+    ELSE  -- TRUNCATE
+        DELETE FROM api_companystat;
+    END IF;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER api_company_stats_insert
+AFTER INSERT ON api_company REFERENCING NEW TABLE AS new_rows
+FOR EACH STATEMENT EXECUTE FUNCTION api_company_stats_update();
+
+CREATE TRIGGER api_company_stats_update
+AFTER UPDATE ON api_company
+REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+FOR EACH STATEMENT EXECUTE FUNCTION api_company_stats_update();
+
+CREATE TRIGGER api_company_stats_delete
+AFTER DELETE ON api_company REFERENCING OLD TABLE AS old_rows
+FOR EACH STATEMENT EXECUTE FUNCTION api_company_stats_update();
+
+CREATE TRIGGER api_company_stats_truncate
+AFTER TRUNCATE ON api_company
+FOR EACH STATEMENT EXECUTE FUNCTION api_company_stats_update();
+
+-- Backfill from the existing companies
+INSERT INTO api_companystat (dimension, value, count)
+SELECT 'country', country_of_origin, COUNT(*) FROM api_company GROUP BY country_of_origin
+UNION ALL
+SELECT 'sector', economic_sector, COUNT(*) FROM api_company GROUP BY economic_sector;
+""".format(
+    insert=UPSERT_SQL.format(changes=ADDED),
+    update=UPSERT_SQL.format(changes=f"{ADDED} UNION ALL {REMOVED}"),
+    delete=UPSERT_SQL.format(changes=REMOVED),
+)
+
+REVERSE_SQL = """
+DROP TRIGGER IF EXISTS api_company_stats_insert ON api_company;
+DROP TRIGGER IF EXISTS api_company_stats_update ON api_company;
+DROP TRIGGER IF EXISTS api_company_stats_delete ON api_company;
+DROP TRIGGER IF EXISTS api_company_stats_truncate ON api_company;
+DROP FUNCTION IF EXISTS api_company_stats_update();
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0003_company_name_autocomplete'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CompanyStat',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('dimension', models.CharField(choices=[('country', 'Country of origin'), ('sector', 'Economic sector')], max_length=16)),
+                ('value', models.CharField(max_length=100)),
+                ('count', models.BigIntegerField(default=0)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('dimension', 'value'), name='api_companystat_unique')],
+            },
+        ),
+        migrations.RunSQL(TRIGGER_SQL, REVERSE_SQL),
+    ]
@@ -0,0 +1,67 @@
+# Generated by Django 5.2.1 on 2026-10-18 01:25
+
+import django.db.models.functions.datetime
+from django.db import migrations, models
+
+# A statement-level trigger bumps the table's version in the writing
+# transaction, so a new version becomes visible together with the data.
+# Other apps attach api_resource_version_bump() to their own tables.
+TRIGGER_SQL = """
+CREATE FUNCTION api_resource_version_bump() RETURNS trigger AS $$
+BEGIN
+    INSERT INTO api_resourceversion (name, version, updated_at)
+    VALUES (TG_TABLE_NAME, 1, now())
+    ON CONFLICT (name) DO UPDATE
+    SET version = api_resourceversion.version + 1, updated_at = now();
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE FUNCTION api_updated_at_touch() RETURNS trigger AS $$
+BEGIN
+    NEW.updated_at := now();
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER api_company_version_trigger
+AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON api_company
+FOR EACH STATEMENT EXECUTE FUNCTION api_resource_version_bump();
+
+CREATE TRIGGER api_company_updated_at_trigger
+BEFORE UPDATE ON api_company
+FOR EACH ROW EXECUTE FUNCTION api_updated_at_touch();
+
+INSERT INTO api_resourceversion (name, version, updated_at) VALUES ('api_company', 1, now());
+"""
+
+REVERSE_SQL = """
+DROP TRIGGER IF EXISTS api_company_version_trigger ON api_company;
+DROP TRIGGER IF EXISTS api_company_updated_at_trigger ON api_company;
+DROP FUNCTION IF EXISTS api_updated_at_touch();
+DROP FUNCTION IF EXISTS api_resource_version_bump();
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0004_company_stats'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ResourceVersion',
+            fields=[
+                ('name', models.CharField(max_length=63, primary_key=True, serialize=False)),
+                ('version', models.BigIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='company',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, db_default=django.db.models.functions.datetime.Now()),
+        ),
+        migrations.RunSQL(TRIGGER_SQL, REVERSE_SQL),
+    ]
@@ -0,0 +1,106 @@
+from django.db import migrations
+
+# Statements that change no rows (an UPDATE matching nothing, an empty
+# bulk_update batch) no longer bump the version: each would otherwise lock
+# the table's version row until commit and invalidate every cached ETag.
+# The function now reads the statement's transition tables, so tables
+# attach it with one trigger per event, each REFERENCING new_rows or
+# old_rows (see the triggers below).
+TRIGGER_SQL = """
+CREATE OR REPLACE FUNCTION api_resource_version_bump() RETURNS trigger AS $$
+BEGIN
+    -- Only the transition tables of the current event exist
+    IF TG_OP = 'INSERT' OR TG_OP = 'UPDATE' THEN
+        IF NOT EXISTS (SELECT FROM new_rows) THEN
+            RETURN NULL;
+        END IF;
+    ELSIF TG_OP = 'DELETE' THEN
+        IF NOT EXISTS (SELECT FROM old_rows) THEN
+            RETURN NULL;
+        END IF;
+    END IF;
+    INSERT INTO api_resourceversion (name, version, updated_at)
+    VALUES (TG_TABLE_NAME, 1, now())
+    ON CONFLICT (name) DO UPDATE
+    SET version = api_resourceversion.version + 1, updated_at = now();
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER api_company_version_trigger ON api_company;
+
+CREATE TRIGGER api_company_version_insert
+AFTER INSERT ON api_company REFERENCING NEW TABLE AS new_rows
+FOR EACH STATEMENT EXECUTE FUNCTION api_resource_version_bump();
+
+CREATE TRIGGER api_company_version_update
+AFTER UPDATE ON api_company REFERENCING NEW TABLE AS new_rows
+FOR EACH STATEMENT EXECUTE FUNCTION api_resource_version_bump();
+
+CREATE TRIGGER api_company_version_delete
+AFTER DELETE ON api_company REFERENCING OLD TABLE AS old_rows
+FOR EACH STATEMENT EXECUTE FUNCTION api_resource_version_bump();
+
+CREATE TRIGGER api_company_version_truncate
+AFTER TRUNCATE ON api_company
+FOR EACH STATEMENT EXECUTE FUNCTION api_resource_version_bump();
+
+-- Databases migrated before market 0009 created per-event triggers still
+-- have its single market_stock trigger, which would fail on every write
+-- now. A dependency on market 0011 (which drops it) would be circular.
+DO $$
+BEGIN
+    IF EXISTS (SELECT FROM pg_trigger WHERE tgname = 'market_stock_version_trigger') THEN
+        DROP TRIGGER market_stock_version_trigger ON market_stock;
+
+        CREATE TRIGGER market_stock_version_insert
+        AFTER INSERT ON market_stock REFERENCING NEW TABLE AS new_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION api_resource_version_bump();
+
+        CREATE TRIGGER market_stock_version_update
+        AFTER UPDATE ON market_stock REFERENCING NEW TABLE AS new_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION api_resource_version_bump();
+
+        CREATE TRIGGER market_stock_version_delete
+        AFTER DELETE ON market_stock REFERENCING OLD TABLE AS old_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION api_resource_version_bump();
+
+        CREATE TRIGGER market_stock_version_truncate
+        AFTER TRUNCATE ON market_stock
+        FOR EACH STATEMENT EXECUTE FUNCTION api_resource_version_bump();
+    END IF;
+END
+$$;
+"""
+
+REVERSE_SQL = """
+DROP TRIGGER IF EXISTS api_company_version_insert ON api_company;
+DROP TRIGGER IF EXISTS api_company_version_update ON api_company;
+DROP TRIGGER IF EXISTS api_company_version_delete ON api_company;
+DROP TRIGGER IF EXISTS api_company_version_truncate ON api_company;
+
+CREATE OR REPLACE FUNCTION api_resource_version_bump() RETURNS trigger AS $$
+BEGIN
+    INSERT INTO api_resourceversion (name, version, updated_at)
+    VALUES (TG_TABLE_NAME, 1, now())
+    ON CONFLICT (name) DO UPDATE
+    SET version = api_resourceversion.version + 1, updated_at = now();
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER api_company_version_trigger
+AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON api_company
+FOR EACH STATEMENT EXECUTE FUNCTION api_resource_version_bump();
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0005_resource_versions'),
+    ]
+
+    operations = [
+        migrations.RunSQL(TRIGGER_SQL, REVERSE_SQL),
+    ]
@@ -1,4 +1,7 @@
+from django.contrib.postgres.indexes import GinIndex, GistIndex
+from django.contrib.postgres.search import SearchVectorField
 from django.db import models
+from django.db.models.functions import Collate, Lower, Now
 
 # Create your models here.
 
@@ -9,6 +12,11 @@ class Company(models.Model):
     description = models.TextField()
     country_of_origin = models.CharField(max_length=100)
     economic_sector = models.CharField(max_length=100)
+    # Weighted full-text document (name A, sector B, country C, description D),
+    # maintained by a database trigger on every insert and update
+    search_vector = SearchVectorField(null=True, editable=False)
+    # Also set by a database trigger on every update, bulk ones included
+    updated_at = models.DateTimeField(auto_now=True, db_default=Now())
 
     def __str__(self):
         return self.name
@@ -17,3 +25,50 @@ class Company(models.Model):
         verbose_name = "Company"
         verbose_name_plural = "Companies"
         ordering = ["name"]
+        indexes = [
+            GinIndex(fields=["search_vector"], name="api_company_search_idx"),
+            # Autocomplete: case-insensitive prefix range scans on lower(name),
+            # in byte order ("C") so the same index also returns them sorted
+            models.Index(Collate(Lower("name"), "C"), name="api_company_name_prefix_idx"),
+            # Autocomplete: nearest names by trigram word distance (typo tolerant)
+            GistIndex(fields=["name"], opclasses=["gist_trgm_ops"], name="api_company_name_trgm_idx"),
+        ]
+
+
+class CompanyStat(models.Model):
+    """
+    Number of companies per country and per sector. Maintained by database
+    triggers on api_company in the writing transaction (bulk writes
+    included); ``manage.py reconcile_company_stats`` rebuilds it.
+    """
+
+    COUNTRY = "country"
+    SECTOR = "sector"
+    DIMENSIONS = [(COUNTRY, "Country of origin"), (SECTOR, "Economic sector")]
+
+    dimension = models.CharField(max_length=16, choices=DIMENSIONS)
+    value = models.CharField(max_length=100)
+    count = models.BigIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.dimension} {self.value}: {self.count}"
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["dimension", "value"], name="api_companystat_unique")
+        ]
+
+
+class ResourceVersion(models.Model):
+    """
+    Change counter of one table, bumped by a database trigger in every
+    transaction that writes to it, for conditional GETs (see
+    ``core.conditional``).
+    """
+
+    name = models.CharField(max_length=63, primary_key=True)  # Table name
+    version = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.name} v{self.version}"
@@ -0,0 +1,221 @@
+"""
+In-memory prefix index of company names for typeahead
+
+Each process holds one ``CompanyNameIndex``, built from the database on
+first use. The bulk of it is a ``SortedNames``: an immutable array of
+normalized names sorted once, stored as a few flat buffers rather than
+one Python object per company, and searched with bisect. Companies saved
+or deleted afterwards (``post_save``/``post_delete``, after commit) go
+into a small copy-on-write overlay that lookups merge in; once the
+overlay grows past ``MAX_CHANGES`` it is folded into a new SortedNames.
+
+Changes made by other processes are not signalled here, so the index is
+rebuilt in the background once it is older than ``MAX_AGE_SECONDS``.
+Measure its size with ``manage.py benchmark_name_index``.
+"""
+
+import bisect
+import heapq
+import logging
+import threading
+import time
+import unicodedata
+from array import array
+from itertools import islice, takewhile
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from django.db import connections, transaction
+
+logger = logging.getLogger(__name__)
+
+MAX_CHANGES = 1024  # Overlay size that triggers folding it into the sorted array
+MAX_AGE_SECONDS = 600  # Rebuild interval; bounds how long other processes' writes stay invisible
+
+
+def normalize(name: str) -> str:
+    """Case-folded, NFKC-normalized name with runs of whitespace collapsed"""
+    return " ".join(unicodedata.normalize("NFKC", name).casefold().split())
+
+
+class _Blob:
+    """Read-only sequence view of the strings packed in ``data`` at ``offsets``"""
+
+    __slots__ = ("data", "offsets")
+
+    def __init__(self, data: bytes, offsets: array):
+        self.data = data
+        self.offsets = offsets
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i: int) -> bytes:
+        return self.data[self.offsets[i]:self.offsets[i + 1]]
+
+
+def _pack(values: Iterable[bytes]) -> _Blob:
+    offsets = array("I", [0])
+    position = 0
+    for value in values:
+        position += len(value)
+        offsets.append(position)
+    return _Blob(b"".join(values), offsets)
+
+
+class SortedNames:
+    """
+    Immutable (normalized name, id, name) entries sorted by normalized name
+    then id. Names are UTF-8 encoded, and UTF-8 byte order is code point
+    order, so every name starting with a prefix lies in one contiguous
+    range found with two binary searches.
+    """
+
+    __slots__ = ("keys", "names", "ids")
+
+    def __init__(self, entries: List[Tuple[bytes, int, bytes]]):
+        entries.sort()
+        self.keys = _pack([key for key, _pk, _name in entries])
+        self.names = _pack([name for _key, _pk, name in entries])
+        self.ids = array("q", [pk for _key, pk, _name in entries])
+
+    @classmethod
+    def from_rows(cls, rows: Iterable[Tuple[int, str]]) -> "SortedNames":
+        """Build from (id, name) rows"""
+        return cls([(normalize(name).encode(), pk, name.encode()) for pk, name in rows])
+
+    def __len__(self):
+        return len(self.ids)
+
+    def entries(self) -> Iterator[Tuple[bytes, int, bytes]]:
+        keys, names, ids = self.keys, self.names, self.ids
+        return ((keys[i], ids[i], names[i]) for i in range(len(ids)))
+
+    def prefix(self, key: bytes) -> Iterator[Tuple[bytes, int, bytes]]:
+        """Entries whose normalized name starts with ``key``, in order"""
+        keys, names, ids = self.keys, self.names, self.ids
+        start = bisect.bisect_left(keys, key)
+        end = bisect.bisect_left(keys, key + b"\xff", start)  # 0xff never occurs in UTF-8
+        return ((keys[i], ids[i], names[i]) for i in range(start, end))
+
+    def merge(self, changes: Dict[int, Optional[Tuple[bytes, bytes]]]) -> "SortedNames":
+        """A new SortedNames with ``changes`` ({id: (key, name) or None if deleted}) applied"""
+        entries = [entry for entry in self.entries() if entry[1] not in changes]
+        entries.extend((key, pk, name) for pk, change in changes.items() if change for key, name in [change])
+        return SortedNames(entries)
+
+    def nbytes(self) -> int:
+        """Bytes held by the buffers (excluding the few fixed-size objects around them)"""
+        return sum(
+            len(blob.data) + blob.offsets.itemsize * len(blob.offsets) for blob in (self.keys, self.names)
+        ) + self.ids.itemsize * len(self.ids)
+
+
+class CompanyNameIndex:
+    """
+    Process-wide name index. State is replaced, never mutated, so lookups
+    read it without locking; writers serialize on ``lock``.
+    """
+
+    def __init__(self, max_changes: int = MAX_CHANGES, max_age: float = MAX_AGE_SECONDS):
+        self.max_changes = max_changes
+        self.max_age = max_age
+        self.lock = threading.Lock()
+        self.build_lock = threading.Lock()
+        # (sorted names, {id: (key, name) or None}, overlay entries sorted like the names)
+        self.state: Optional[Tuple[SortedNames, dict, list]] = None
+        self.pending: Optional[dict] = None  # Changes committed while a build is reading
+        self.built_at = 0.0
+
+    def lookup(self, prefix: str, limit: int = 10) -> List[Tuple[int, str]]:
+        """Up to ``limit`` (id, name) whose normalized name starts with ``prefix``, alphabetically"""
+        state = self.ensure_built()
+        if self.max_age and time.monotonic() - self.built_at > self.max_age:
+            self.refresh()
+        names, changes, overlay = state
+        key = normalize(prefix).encode()
+        base = (entry for entry in names.prefix(key) if entry[1] not in changes)
+        added = takewhile(lambda entry: entry[0].startswith(key), overlay[bisect.bisect_left(overlay, (key,)):])
+        return [(pk, name.decode()) for _key, pk, name in islice(heapq.merge(base, added), limit)]
+
+    def ensure_built(self):
+        state = self.state
+        if state is None:
+            self.build(force=False)
+            state = self.state
+        return state
+
+    def build(self, using: str = "default", rows: Optional[Iterable[Tuple[int, str]]] = None, force: bool = True):
+        """
+        (Re)load every company name, or index the (id, name) ``rows`` given
+        instead; changes committed meanwhile are kept. Without ``force`` an
+        index built meanwhile by another thread is kept.
+        """
+        from .models import Company
+
+        if rows is None:
+            rows = Company.objects.using(using).order_by().values_list("id", "name").iterator(chunk_size=10000)
+        with self.build_lock:
+            if not force and self.state is not None:
+                return
+            with self.lock:
+                self.pending = {}
+            try:
+                started = time.perf_counter()
+                names = SortedNames.from_rows(rows)
+            except Exception:
+                with self.lock:
+                    self.pending = None
+                raise
+            with self.lock:
+                changes, self.pending = self.pending, None
+                self._replace(names, changes)
+                self.built_at = time.monotonic()
+            logger.info(
+                f"Built company name index: {len(names):,} names, "
+                f"{names.nbytes() / 1e6:.1f} MB in {time.perf_counter() - started:.2f}s"
+            )
+
+    def refresh(self):
+        """Rebuild in a background thread unless one is already running"""
+        if self.build_lock.locked():
+            return
+        self.built_at = time.monotonic()  # Do not start another one until this is done
+
+        def run():
+            try:
+                self.build()
+            except Exception as e:
+                logger.error(f"Company name index rebuild failed: {e}")
+            finally:
+                connections.close_all()
+
+        threading.Thread(target=run, name="company-name-index", daemon=True).start()
+
+    def change(self, pk: int, name: Optional[str]):
+        """Record that company ``pk`` now has ``name`` (None: deleted)"""
+        entry = None if name is None else (normalize(name).encode(), name.encode())
+        with self.lock:
+            if self.pending is not None:
+                self.pending[pk] = entry
+            if self.state is not None:
+                names, changes, _overlay = self.state
+                self._replace(names, {**changes, pk: entry})
+
+    def _replace(self, names: SortedNames, changes: dict):
+        if len(changes) > self.max_changes:
+            names, changes = names.merge(changes), {}
+        overlay = sorted((key, pk, name) for pk, change in changes.items() if change for key, name in [change])
+        self.state = (names, changes, overlay)
+
+
+name_index = CompanyNameIndex()
+
+
+def company_saved(sender, instance, using, **kwargs):
+    pk, name = instance.pk, instance.name
+    transaction.on_commit(lambda: name_index.change(pk, name), using=using)
+
+
+def company_deleted(sender, instance, using, **kwargs):
+    pk = instance.pk
+    transaction.on_commit(lambda: name_index.change(pk, None), using=using)
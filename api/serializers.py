@@ -5,7 +5,7 @@ from .models import Company
 class CompanySerializer(serializers.ModelSerializer):
     class Meta:
         model = Company
-        fields = '__all__'
+        exclude = ['search_vector']
         
     def validate_name(self, value):
         """
@@ -0,0 +1,87 @@
+"""
+Company statistics from the CompanyStat store
+
+The store holds one counter per country and per sector, maintained by
+triggers on api_company (see migration 0004), so reading every statistic
+is a single query over a table with one row per distinct value, however
+many companies there are. ``reconcile`` rebuilds it from the companies.
+"""
+
+import logging
+from typing import Dict, List, Tuple
+
+from django.db import connections, transaction
+from django.db.models import Count
+
+from .models import Company, CompanyStat
+
+logger = logging.getLogger(__name__)
+
+# CompanyStat dimension -> Company field it counts
+FIELDS = {
+    CompanyStat.COUNTRY: "country_of_origin",
+    CompanyStat.SECTOR: "economic_sector",
+}
+
+
+def company_stats(using: str = "default") -> Dict:
+    """
+    Totals and per-country and per-sector counts, largest first:
+    {"total": n, "countries": [{"country_of_origin": .., "count": ..}],
+    "sectors": [{"economic_sector": .., "count": ..}]}
+    """
+    groups = {dimension: [] for dimension in FIELDS}
+    rows = (
+        CompanyStat.objects.using(using)
+        .filter(count__gt=0)
+        .order_by("-count", "value")
+        .values_list("dimension", "value", "count")
+    )
+    for dimension, value, count in rows:
+        groups[dimension].append({FIELDS[dimension]: value, "count": count})
+    countries = groups[CompanyStat.COUNTRY]
+    return {
+        "total": sum(row["count"] for row in countries),  # Every company has one country
+        "countries": countries,
+        "sectors": groups[CompanyStat.SECTOR],
+    }
+
+
+def reconcile(using: str = "default", dry_run: bool = False) -> List[Tuple[str, str, int, int]]:
+    """
+    Recount the companies and replace the store with the result. Writers
+    to api_company are blocked meanwhile so no change slips in between.
+    Returns the drift found as (dimension, value, stored, actual) rows.
+    """
+    with transaction.atomic(using=using):
+        if connections[using].vendor == "postgresql":
+            with connections[using].cursor() as cursor:
+                cursor.execute("LOCK TABLE api_company IN SHARE MODE")
+
+        stored = {
+            (dimension, value): count
+            for dimension, value, count in CompanyStat.objects.using(using).values_list(
+                "dimension", "value", "count"
+            )
+        }
+        actual = {}
+        for dimension, field in FIELDS.items():
+            for value, count in (
+                Company.objects.using(using).order_by().values_list(field).annotate(count=Count("id"))
+            ):
+                actual[(dimension, value)] = count
+
+        drift = sorted(
+            (dimension, value, stored.get((dimension, value), 0), actual.get((dimension, value), 0))
+            for dimension, value in stored.keys() | actual.keys()
+            if stored.get((dimension, value), 0) != actual.get((dimension, value), 0)
+        )
+        if not dry_run:
+            CompanyStat.objects.using(using).all().delete()
+            CompanyStat.objects.using(using).bulk_create(
+                CompanyStat(dimension=dimension, value=value, count=count)
+                for (dimension, value), count in sorted(actual.items())
+            )
+    if drift:
+        logger.warning(f"Company statistics drifted on {len(drift)} values")
+    return drift
@@ -1,3 +1,257 @@
-from django.test import TestCase
+from unittest import mock
 
-# Create your tests here.
+from django.test import SimpleTestCase, TestCase
+from rest_framework.test import APIClient
+
+from .models import Company, CompanyStat, ResourceVersion
+from .name_index import CompanyNameIndex, SortedNames, name_index, normalize
+from .stats import company_stats, reconcile
+from .views import CompanyAutocompleteAPI, has_trigram
+
+
+class ResourceVersionTest(TestCase):
+    """Writes to api_company bump its version, statements that change nothing do not"""
+
+    def version(self):
+        return ResourceVersion.objects.get(name="api_company").version
+
+    def test_only_row_changing_statements_bump(self):
+        start = self.version()
+        company = Company.objects.create(name="Acme", country_of_origin="Testland", economic_sector="Tech")
+        self.assertEqual(self.version(), start + 1)
+
+        Company.objects.filter(pk=company.pk).update(name="Acme Holdings")
+        self.assertEqual(self.version(), start + 2)
+
+        Company.objects.filter(pk=-1).update(name="Nobody")
+        Company.objects.filter(pk=-1).delete()
+        self.assertEqual(self.version(), start + 2)
+
+        company.delete()
+        self.assertEqual(self.version(), start + 3)
+
+
+class CompanySearchTest(TestCase):
+    """Full-text search ranks name matches first and returns escaped highlights"""
+
+    def setUp(self):
+        self.client = APIClient(SERVER_NAME="localhost")
+        self.named = Company.objects.create(
+            name="Acme <script>alert(1)</script>", description="Rockets & anvils",
+            country_of_origin="Testland", economic_sector="Industrials",
+        )
+        self.described = Company.objects.create(
+            name="Roadrunner Supply", description="Reseller of Acme & Co. products",
+            country_of_origin="Testland", economic_sector="Retail",
+        )
+
+    def test_highlights_are_escaped(self):
+        response = self.client.get("/api/companies/search/", {"q": "acme"})
+        self.assertEqual(response.status_code, 200)
+        results = response.json()["results"]
+        self.assertEqual([result["id"] for result in results], [self.named.pk, self.described.pk])
+        self.assertEqual(
+            results[0]["highlight"]["name"],
+            "<mark>Acme</mark> &lt;script&gt;alert(1)&lt;/script&gt;",
+        )
+        self.assertEqual(
+            results[1]["highlight"]["description"],
+            "Reseller of <mark>Acme</mark> &amp; Co. products",
+        )
+
+    def ids(self, params):
+        response = self.client.get("/api/companies/search/", params)
+        self.assertEqual(response.status_code, 200)
+        return [result["id"] for result in response.json()["results"]]
+
+    def test_name_ranks_above_sector_country_and_description(self):
+        Company.objects.all().delete()
+        described = Company.objects.create(
+            name="Gamma", description="Orbital launch services",
+            country_of_origin="Testland", economic_sector="Industrials",
+        )
+        country = Company.objects.create(name="Delta", country_of_origin="Orbital", economic_sector="Retail")
+        sector = Company.objects.create(name="Beta", country_of_origin="Testland", economic_sector="Orbital")
+        named = Company.objects.create(name="Orbital Works", country_of_origin="Testland", economic_sector="Retail")
+        self.assertEqual(self.ids({"q": "orbital"}), [named.pk, sector.pk, country.pk, described.pk])
+
+    def test_websearch_syntax_filters(self):
+        self.assertEqual(self.ids({"q": "acme -roadrunner"}), [self.named.pk])
+        self.assertEqual(self.ids({"q": '"acme products"'}), [])
+        self.assertEqual(self.ids({"q": '"acme co products"'}), [self.described.pk])
+        self.assertEqual(self.ids({"q": "anvils or reseller"}), [self.named.pk, self.described.pk])
+
+    def test_pages_carry_the_total(self):
+        for number in range(3):
+            Company.objects.create(name=f"Acme Branch {number}", country_of_origin="Testland", economic_sector="Retail")
+        ranked = self.ids({"q": "acme", "page_size": 10})
+        self.assertEqual(len(ranked), 5)
+
+        response = self.client.get("/api/companies/search/", {"q": "acme", "page": 2, "page_size": 2})
+        body = response.json()
+        self.assertEqual(body["count"], 5)
+        self.assertEqual([result["id"] for result in body["results"]], ranked[2:4])
+        self.assertIsNotNone(body["next"])
+
+        body = self.client.get("/api/companies/search/", {"q": "acme", "page": 4, "page_size": 2}).json()
+        self.assertEqual((body["count"], body["results"], body["next"]), (5, [], None))
+        body = self.client.get("/api/companies/search/", {"q": "nothing"}).json()
+        self.assertEqual((body["count"], body["results"]), (0, []))
+
+
+class CompanyAutocompleteTest(TestCase):
+    """Prefix matches first, then trigram matches where pg_trgm is installed"""
+
+    def setUp(self):
+        self.client = APIClient(SERVER_NAME="localhost")
+        for name in ["Acme Rockets", "Acme Anvils", "The Acme Works", "Roadrunner Supply"]:
+            Company.objects.create(name=name, country_of_origin="Testland", economic_sector="Industrials")
+        name_index.build()
+
+    def names(self, response):
+        self.assertEqual(response.status_code, 200)
+        return [(result["name"], result["prefix"]) for result in response.json()["results"]]
+
+    def test_prefix_matches_alphabetically(self):
+        with mock.patch("api.views.has_trigram", return_value=False):
+            response = self.client.get("/api/companies/autocomplete/", {"q": "acme"})
+        self.assertEqual(self.names(response), [("Acme Anvils", True), ("Acme Rockets", True)])
+
+    def test_trigram_ordering(self):
+        if not has_trigram():
+            self.skipTest("pg_trgm is not installed on this server")
+        response = self.client.get("/api/companies/autocomplete/", {"q": "acme", "limit": 3})
+        self.assertEqual(
+            self.names(response), [("Acme Anvils", True), ("Acme Rockets", True), ("The Acme Works", False)]
+        )
+        self.assertEqual(response.json()["results"][2]["similarity"], 1.0)  # A whole word matches
+
+        # A typo still finds the company by its closest word
+        response = self.client.get("/api/companies/autocomplete/", {"q": "roadruner"})
+        self.assertEqual(self.names(response), [("Roadrunner Supply", False)])
+        self.assertGreaterEqual(
+            response.json()["results"][0]["similarity"], CompanyAutocompleteAPI.min_similarity
+        )
+
+
+class CompanyNameIndexTest(SimpleTestCase):
+    """The sorted names and the overlay of later changes answer prefixes together"""
+
+    rows = [(1, "Acme Corp"), (2, "acme  Labs"), (3, "Beta"), (4, "ＡＣＭＥ Zeta"), (5, "Acorn")]
+
+    def index(self, **kwargs):
+        index = CompanyNameIndex(max_age=0, **kwargs)
+        index.build(rows=self.rows)
+        return index
+
+    def test_normalized_prefixes(self):
+        self.assertEqual(normalize("  ＡＣＭＥ\tZeta "), "acme zeta")
+        index = self.index()
+        self.assertEqual(index.lookup("ACME"), [(1, "Acme Corp"), (2, "acme  Labs"), (4, "ＡＣＭＥ Zeta")])
+        self.assertEqual(index.lookup("acme l"), [(2, "acme  Labs")])
+        self.assertEqual(index.lookup("ac", limit=2), [(1, "Acme Corp"), (2, "acme  Labs")])
+        self.assertEqual(index.lookup("gamma"), [])
+
+    def test_overlay_changes(self):
+        index = self.index()
+        index.change(3, "Acme Beta")  # Renamed into the prefix
+        index.change(1, None)  # Deleted
+        index.change(6, "Acme Alpha")  # Added
+        self.assertEqual(
+            index.lookup("acme"), [(6, "Acme Alpha"), (3, "Acme Beta"), (2, "acme  Labs"), (4, "ＡＣＭＥ Zeta")]
+        )
+        self.assertEqual(index.lookup("beta"), [])
+        names, changes, _overlay = index.state
+        self.assertEqual(len(names), 5)
+        self.assertEqual(len(changes), 3)
+
+    def test_overlay_folds_into_sorted_names(self):
+        index = self.index(max_changes=2)
+        index.change(6, "Acme Alpha")
+        index.change(1, None)
+        index.change(5, "Zebra")
+        names, changes, overlay = index.state
+        self.assertEqual((len(names), changes, overlay), (5, {}, []))
+        self.assertEqual(index.lookup("a"), [(6, "Acme Alpha"), (2, "acme  Labs"), (4, "ＡＣＭＥ Zeta")])
+        self.assertEqual(index.lookup("z"), [(5, "Zebra")])
+
+    def test_changes_during_a_build_are_kept(self):
+        index = self.index()
+
+        def rows():
+            yield 1, "Acme Corp"
+            index.change(7, "Acme New")  # Committed while the build reads
+            yield 2, "acme  Labs"
+
+        index.build(rows=rows())
+        self.assertEqual(index.lookup("acme"), [(1, "Acme Corp"), (2, "acme  Labs"), (7, "Acme New")])
+
+    def test_sorted_names_merge(self):
+        names = SortedNames.from_rows(self.rows)
+        merged = names.merge({3: None, 8: (b"acme 0", b"Acme 0")})
+        self.assertEqual([pk for _key, pk, _name in merged.prefix(b"acme")], [8, 1, 2, 4])
+        self.assertEqual(len(merged), 5)
+        self.assertGreater(merged.nbytes(), 0)
+
+
+class CompanyNameIndexSignalTest(TestCase):
+    """Saved and deleted companies reach the process index after commit"""
+
+    def test_saves_and_deletes(self):
+        name_index.build()
+        with self.captureOnCommitCallbacks(execute=True):
+            company = Company.objects.create(name="Zyzzyva Mills", country_of_origin="Testland", economic_sector="Food")
+        self.assertEqual(name_index.lookup("zyzzyva"), [(company.pk, "Zyzzyva Mills")])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            company.name = "Zyzzyva Works"
+            company.save()
+        self.assertEqual(name_index.lookup("zyzzyva"), [(company.pk, "Zyzzyva Works")])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            company.delete()
+        self.assertEqual(name_index.lookup("zyzzyva"), [])
+
+
+class CompanyStatTest(TestCase):
+    """Triggers keep the per-country and per-sector counters exact; reconcile repairs drift"""
+
+    def counters(self):
+        rows = CompanyStat.objects.exclude(count=0).values_list("dimension", "value", "count")
+        return {(dimension, value): count for dimension, value, count in rows}
+
+    def test_triggers_follow_every_write(self):
+        Company.objects.bulk_create(
+            Company(name=f"Company {i}", country_of_origin=country, economic_sector=sector)
+            for i, (country, sector) in enumerate([("DE", "Tech"), ("DE", "Food"), ("US", "Tech")])
+        )
+        self.assertEqual(
+            self.counters(),
+            {("country", "DE"): 2, ("country", "US"): 1, ("sector", "Tech"): 2, ("sector", "Food"): 1},
+        )
+
+        Company.objects.filter(country_of_origin="DE").update(country_of_origin="FR")
+        Company.objects.filter(economic_sector="Food").delete()
+        self.assertEqual(
+            self.counters(),
+            {("country", "FR"): 1, ("country", "US"): 1, ("sector", "Tech"): 2},
+        )
+        stats = company_stats()
+        self.assertEqual(stats["total"], 2)
+        self.assertEqual(stats["sectors"], [{"economic_sector": "Tech", "count": 2}])
+
+        response = APIClient(SERVER_NAME="localhost").get("/api/companies/stats/")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.data["total_companies"], response.data["unique_countries"]), (2, 2))
+
+    def test_reconcile_repairs_drift(self):
+        Company.objects.create(name="Acme", country_of_origin="DE", economic_sector="Tech")
+        CompanyStat.objects.filter(dimension="country").update(count=5)
+        CompanyStat.objects.create(dimension="sector", value="Ghost", count=3)
+
+        expected = [("country", "DE", 5, 1), ("sector", "Ghost", 3, 0)]
+        self.assertEqual(reconcile(dry_run=True), expected)
+        self.assertEqual(self.counters()[("country", "DE")], 5)
+        self.assertEqual(reconcile(), expected)
+        self.assertEqual(self.counters(), {("country", "DE"): 1, ("sector", "Tech"): 1})
+        self.assertEqual(reconcile(), [])
@@ -6,6 +6,7 @@ from .views import (
     CompanyDetailAPI,
     CompanyStatsAPI,
     CompanySearchAPI,
+    CompanyAutocompleteAPI,
     CompanyScraperAPI,
     CompanyDataSourcesAPI,
 )
@@ -23,6 +24,11 @@ urlpatterns = [
     path("companies/<int:pk>/", CompanyDetailAPI.as_view(), name="company_detail"),
     path("companies/stats/", CompanyStatsAPI.as_view(), name="company_stats"),
     path("companies/search/", CompanySearchAPI.as_view(), name="company_search"),
+    path(
+        "companies/autocomplete/",
+        CompanyAutocompleteAPI.as_view(),
+        name="company_autocomplete",
+    ),
     path("companies/scrape/", CompanyScraperAPI.as_view(), name="company_scraper"),
     path(
         "companies/data-sources/",
@@ -2,7 +2,16 @@ from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import generics
 from rest_framework.filters import SearchFilter, OrderingFilter
+from rest_framework.utils.urls import replace_query_param
+from django.contrib.postgres.search import SearchHeadline, SearchQuery, SearchRank, TrigramWordDistance
+from django.db import connections
+from django.db.models import Count, F, Window
+from django.utils.html import escape
+from django.db.models.functions import Collate, Lower
+from core.conditional import ConditionalGetMixin
 from .models import Company
+from .name_index import name_index
+from .stats import company_stats
 from .serializers import CompanySerializer, CompanyListSerializer
 from .scrapers import ScraperManager
 
@@ -34,14 +43,15 @@ class CurrentTimeAPI(APIView):
         )
 
 
-class CompanyListCreateAPI(generics.ListCreateAPIView):
+class CompanyListCreateAPI(ConditionalGetMixin, generics.ListCreateAPIView):
     """
     API view to list all companies or create a new company
-    Supports searching and ordering
+    Supports searching, ordering and conditional GET (ETag/Last-Modified)
     """
 
     queryset = Company.objects.all()
     permission_classes = []  # Allow anyone to access
+    version_tables = ("api_company",)
 
     # Add searching and ordering
     filter_backends = [SearchFilter, OrderingFilter]
@@ -58,42 +68,30 @@ class CompanyListCreateAPI(generics.ListCreateAPIView):
         return CompanySerializer
 
 
-class CompanyDetailAPI(generics.RetrieveUpdateDestroyAPIView):
+class CompanyDetailAPI(ConditionalGetMixin, generics.RetrieveUpdateDestroyAPIView):
     """
     API view to retrieve, update or delete a specific company
+    Supports conditional GET (ETag/Last-Modified)
     """
 
     queryset = Company.objects.all()
     serializer_class = CompanySerializer
     permission_classes = []  # Allow anyone to access
+    row_versions = True
 
 
 class CompanyStatsAPI(APIView):
     """
     API view to get company statistics and summaries
+
+    Counts come from the statistics store (see ``api.stats``): one query
+    for the counters plus one for the latest companies.
     """
 
     permission_classes = []  # Allow anyone to access
 
     def get(self, request):
-        from django.db.models import Count
-
-        # Basic counts
-        total_companies = Company.objects.count()
-
-        # Count by country
-        countries = (
-            Company.objects.values("country_of_origin")
-            .annotate(count=Count("id"))
-            .order_by("-count")
-        )
-
-        # Count by sector
-        sectors = (
-            Company.objects.values("economic_sector")
-            .annotate(count=Count("id"))
-            .order_by("-count")
-        )
+        stats = company_stats()
 
         # Recent companies (latest 5)
         recent_companies = Company.objects.all().order_by("-id")[:5]
@@ -101,33 +99,45 @@ class CompanyStatsAPI(APIView):
 
         return Response(
             {
-                "total_companies": total_companies,
-                "companies_by_country": list(countries),
-                "companies_by_sector": list(sectors),
+                "total_companies": stats["total"],
+                "companies_by_country": stats["countries"],
+                "companies_by_sector": stats["sectors"],
                 "recent_companies": recent_data,
-                "unique_countries": Company.objects.values_list(
-                    "country_of_origin", flat=True
-                )
-                .distinct()
-                .count(),
-                "unique_sectors": Company.objects.values_list(
-                    "economic_sector", flat=True
-                )
-                .distinct()
-                .count(),
+                "unique_countries": len(stats["countries"]),
+                "unique_sectors": len(stats["sectors"]),
             }
         )
 
 
+# Match delimiters for SearchHeadline: control characters that never occur in
+# company text, so they survive HTML escaping and are swapped for tags after
+MARK_START, MARK_STOP = "\x02", "\x03"
+
+
+def highlight_html(headline: str) -> str:
+    """A SearchHeadline with MARK_START/MARK_STOP as HTML: the text escaped, matches in <mark>"""
+    return escape(headline).replace(MARK_START, "<mark>").replace(MARK_STOP, "</mark>")
+
+
 class CompanySearchAPI(APIView):
     """
-    Advanced search API for companies
+    Full-text search API for companies, best matches first
+
+    ``q`` takes web search syntax ("quoted phrases", or, -excluded words).
+    Matches in the name rank above the sector, the country and then the
+    description (see the ``search_vector`` trigger). Results are paginated
+    with ``page`` and ``page_size`` and carry their rank and highlighted
+    name and description snippets: HTML-escaped text with the matches
+    wrapped in ``<mark>``.
     """
 
     permission_classes = []  # Allow anyone to access
+    search_config = "english"  # Must match the search_vector trigger
+    page_size = 20
+    max_page_size = 100
 
     def get(self, request):
-        query = request.query_params.get("q", "")
+        query = request.query_params.get("q", "").strip()
 
         if not query:
             return Response(
@@ -135,21 +145,148 @@ class CompanySearchAPI(APIView):
                 status=400,
             )
 
-        # Search across multiple fields
-        from django.db.models import Q
+        try:
+            page = int(request.query_params.get("page", 1))
+            page_size = int(request.query_params.get("page_size", self.page_size))
+        except ValueError:
+            return Response({"error": "'page' and 'page_size' must be integers"}, status=400)
+        if page < 1 or page_size < 1:
+            return Response({"error": "'page' and 'page_size' must be positive"}, status=400)
+        page_size = min(page_size, self.max_page_size)
+
+        search = SearchQuery(query, search_type="websearch", config=self.search_config)
+        matches = Company.objects.filter(search_vector=search)
+
+        # Rank with the GIN index match, then build snippets for this page only.
+        # The total comes with the page (COUNT(*) OVER ()), so a search is one scan.
+        offset = (page - 1) * page_size
+        ranked = list(
+            matches.annotate(rank=SearchRank(F("search_vector"), search), total=Window(Count("*")))
+            .order_by("-rank", "id")
+            .values_list("id", "rank", "total")[offset:offset + page_size]
+        )
+        if ranked:
+            count = ranked[0][2]
+        else:
+            count = matches.count() if page > 1 else 0  # Past the last page: no row to carry it
+        highlighted = {
+            company.pk: company
+            for company in Company.objects.filter(pk__in=[pk for pk, _rank, _total in ranked]).annotate(
+                name_highlight=SearchHeadline(
+                    "name", search, config=self.search_config,
+                    start_sel=MARK_START, stop_sel=MARK_STOP, highlight_all=True,
+                ),
+                description_highlight=SearchHeadline(
+                    "description", search, config=self.search_config,
+                    start_sel=MARK_START, stop_sel=MARK_STOP, max_words=35, min_words=15, max_fragments=2,
+                ),
+            )
+        }
+
+        results = []
+        for pk, rank, _total in ranked:
+            company = highlighted.get(pk)
+            if company is None:
+                continue  # Deleted since it was ranked
+            data = CompanyListSerializer(company).data
+            data["rank"] = rank
+            data["highlight"] = {
+                "name": highlight_html(company.name_highlight),
+                "description": highlight_html(company.description_highlight),
+            }
+            results.append(data)
 
-        companies = Company.objects.filter(
-            Q(name__icontains=query)
-            | Q(description__icontains=query)
-            | Q(country_of_origin__icontains=query)
-            | Q(economic_sector__icontains=query)
-        ).distinct()
+        url = request.build_absolute_uri()
+        return Response(
+            {
+                "query": query,
+                "count": count,
+                "page": page,
+                "page_size": page_size,
+                "next": replace_query_param(url, "page", page + 1) if offset + page_size < count else None,
+                "previous": replace_query_param(url, "page", page - 1) if page > 1 else None,
+                "results": results,
+            }
+        )
 
-        serializer = CompanyListSerializer(companies, many=True)
 
-        return Response(
-            {"query": query, "count": companies.count(), "results": serializer.data}
+_trigram = {}
+
+
+def has_trigram(using: str = "default") -> bool:
+    """Whether the pg_trgm extension is installed (checked once per process)"""
+    if using not in _trigram:
+        with connections[using].cursor() as cursor:
+            cursor.execute("SELECT EXISTS (SELECT FROM pg_extension WHERE extname = 'pg_trgm')")
+            _trigram[using] = cursor.fetchone()[0]
+    return _trigram[using]
+
+
+class CompanyAutocompleteAPI(APIView):
+    """
+    Typeahead API for company names, best matches first
+
+    Names starting with ``q`` (case-insensitive) come first, alphabetically,
+    then names that contain a word close to ``q`` by trigram word
+    similarity, so typos still match. Prefix matches come from the
+    in-memory name index (see ``api.name_index``), so a query with enough
+    of them never reaches the database; with ``use_name_index`` off they
+    are a range scan of the lower(name) index. Fuzzy matches are a
+    nearest-neighbour scan of the trigram GiST index, and are left out
+    where the pg_trgm extension is not installed. Results carry whether
+    they matched the prefix and, for fuzzy ones, their word similarity.
+    """
+
+    permission_classes = []  # Allow anyone to access
+    use_name_index = True
+    limit = 10
+    max_limit = 50
+    min_similarity = 0.3  # Fuzzy matches below this are noise
+
+    def get(self, request):
+        query = request.query_params.get("q", "").strip()
+
+        if not query:
+            return Response(
+                {"error": "Please provide a search query using 'q' parameter"},
+                status=400,
+            )
+
+        try:
+            limit = int(request.query_params.get("limit", self.limit))
+        except ValueError:
+            return Response({"error": "'limit' must be an integer"}, status=400)
+        if limit < 1:
+            return Response({"error": "'limit' must be positive"}, status=400)
+        limit = min(limit, self.max_limit)
+
+        if self.use_name_index:
+            prefixed = name_index.lookup(query, limit)
+        else:
+            prefixed = list(
+                Company.objects.annotate(lower_name=Collate(Lower("name"), "C"))
+                .filter(lower_name__startswith=query.lower())
+                .order_by("lower_name")
+                .values_list("id", "name")[:limit]
+            )
+        results = [{"id": pk, "name": name, "similarity": None, "prefix": True} for pk, name in prefixed]
+
+        # Fuzzy matches only fill what the prefix matches leave
+        if len(results) == limit or not has_trigram():
+            return Response({"query": query, "results": results})
+        nearest = (
+            Company.objects.annotate(distance=TrigramWordDistance(query, "name"))
+            .order_by("distance")
+            .values_list("id", "name", "distance")[:limit]
         )
+        seen = {pk for pk, _name in prefixed}
+        for pk, name, distance in nearest:
+            if len(results) == limit or 1 - distance < self.min_similarity:
+                break
+            if pk not in seen:
+                results.append({"id": pk, "name": name, "similarity": round(1 - distance, 3), "prefix": False})
+
+        return Response({"query": query, "results": results})
 
 
 class CompanyScraperAPI(APIView):
@@ -237,27 +374,15 @@ class CompanyDataSourcesAPI(APIView):
 
     def get(self, request):
         """Get data source statistics"""
-        from django.db.models import Count
-
-        # Get companies created in the last 24 hours (assuming they're from scrapers)
-        recent_companies = Company.objects.filter(
-            id__gte=1  # This is a simple way, you might want to add a 'created_at' field
-        )
+        stats = company_stats()
 
         return Response(
             {
-                "total_companies": Company.objects.count(),
-                "recent_companies": recent_companies.count(),
-                "companies_by_country": list(
-                    Company.objects.values("country_of_origin")
-                    .annotate(count=Count("id"))
-                    .order_by("-count")[:10]
-                ),
-                "companies_by_sector": list(
-                    Company.objects.values("economic_sector")
-                    .annotate(count=Count("id"))
-                    .order_by("-count")[:10]
-                ),
+                "total_companies": stats["total"],
+                # Every company so far; add a 'created_at' field to narrow this down
+                "recent_companies": stats["total"],
+                "companies_by_country": stats["countries"][:10],
+                "companies_by_sector": stats["sectors"][:10],
                 "scraper_info": {
                     "last_run": "Not tracked yet (add timestamp fields to track this)",
                     "available_sources": ["mock", "crunchbase", "opencorporates"],
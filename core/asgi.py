@@ -3,6 +3,13 @@ ASGI config for core project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+Besides plain HTTP (handled by Django, including the ``market/stream/``
+Server-Sent Events feed), the callable answers the ASGI lifespan protocol so
+the market event listener is started once per worker process at startup and
+stopped cleanly at shutdown. Run it with an ASGI server, for example::
+
+    uvicorn core.asgi:application
+
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
 """
@@ -13,4 +20,21 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "core.settings")
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+from market.streaming import broadcaster  # noqa: E402  (needs Django set up)
+
+
+async def application(scope, receive, send):
+    if scope["type"] != "lifespan":
+        return await django_application(scope, receive, send)
+
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            broadcaster.start()
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            await broadcaster.stop()
+            await send({"type": "lifespan.shutdown.complete"})
+            return
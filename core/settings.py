@@ -67,6 +67,7 @@ INSTALLED_APPS = [
     "django.contrib.messages",
     "django.contrib.staticfiles",
     "django.contrib.sites",  # Required for allauth
+    "django.contrib.postgres",  # Full-text search
     # Third-party apps
     "rest_framework",  # Add REST Framework
     "corsheaders",  # Add CORS Headers
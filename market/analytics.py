@@ -0,0 +1,176 @@
+"""
+VWAP, TWAP, volatility and volume over arbitrary windows, answered in SQL from
+the pre-aggregated candle stores (never from the raw history tables)
+"""
+
+import math
+from datetime import datetime, timedelta
+from typing import List, Optional
+
+from django.db import connections
+
+from .candles import INTERVALS, SOURCES, bucket_start
+from .models import Candle
+
+SECONDS_PER_YEAR = 365 * 86400
+
+# Finest interval whose bar count over the window stays within this budget
+# is used when the caller does not pick one; the view holds an explicit
+# interval to the same budget
+MAX_BARS = 5000
+
+# A bar's close stands until the next bar, or for the bar's width after the
+# last one, but never past the end of the requested window
+BARS_SQL = """
+    SELECT bucket, open, high, low, close, volume, turnover,
+           EXTRACT(epoch FROM LEAST(COALESCE(LEAD(bucket) OVER w, bucket + %(width)s), %(until)s)
+                              - bucket) AS held,
+           LN(NULLIF(close, 0) / NULLIF(LAG(close) OVER w, 0)) AS log_return
+    FROM {table}
+    WHERE {key} = %(key)s AND interval = %(interval)s
+      AND bucket >= %(start)s AND bucket < %(end)s
+    WINDOW w AS (ORDER BY bucket)
+"""
+
+STATS_SQL = """
+    SELECT COUNT(*),
+           COALESCE(SUM(volume), 0),
+           SUM(turnover) / NULLIF(SUM(volume), 0),
+           SUM(close * held) / NULLIF(SUM(held), 0),
+           STDDEV_SAMP(log_return),
+           MIN(low),
+           MAX(high),
+           (array_agg(open ORDER BY bucket))[1],
+           (array_agg(close ORDER BY bucket DESC))[1]
+    FROM ({bars}) AS bars
+"""
+
+SERIES_SQL = """
+    SELECT bucket, close, volume,
+           SUM(volume) OVER r,
+           SUM(turnover) OVER r / NULLIF(SUM(volume) OVER r, 0),
+           STDDEV_SAMP(log_return) OVER r
+    FROM ({bars}) AS bars
+    WINDOW r AS (ORDER BY bucket ROWS BETWEEN {preceding} PRECEDING AND CURRENT ROW)
+    ORDER BY bucket DESC
+    LIMIT %(limit)s
+"""
+
+
+def bar_count(start: datetime, end: datetime, interval: str) -> int:
+    """Bars of ``interval`` needed to cover the window"""
+    return math.ceil((end - start).total_seconds() / INTERVALS[interval])
+
+
+def choose_interval(start: datetime, end: datetime) -> str:
+    """Finest candle interval that covers the window in at most MAX_BARS bars"""
+    for name in INTERVALS:
+        if bar_count(start, end, name) <= MAX_BARS:
+            return name
+    return "1d"
+
+
+def _window(key, start: datetime, end: datetime, interval: str) -> dict:
+    """Query parameters for a window widened to whole buckets"""
+    seconds = INTERVALS[interval]
+    aligned_end = bucket_start(end, seconds)
+    if aligned_end < end:
+        aligned_end += timedelta(seconds=seconds)
+    return {
+        "key": key,
+        "interval": interval,
+        "start": bucket_start(start, seconds),
+        "end": aligned_end,
+        "until": end,
+        "width": timedelta(seconds=seconds),
+    }
+
+
+def _float(value) -> Optional[float]:
+    return None if value is None else float(value)
+
+
+def window_stats(
+    key: int,
+    start: datetime,
+    end: datetime,
+    interval: Optional[str] = None,
+    model=Candle,
+    using: str = "default",
+) -> dict:
+    """
+    Summary statistics of one stock (``model=Candle``) or product
+    (``model=ProductCandle``) between ``start`` and ``end``.
+
+    The window is widened to whole ``interval`` buckets. VWAP is exact over
+    those buckets; TWAP weights each bar's close by how long it stood, up to
+    ``end``; volatility is the standard deviation of bar-to-bar log returns,
+    also given annualized.
+    """
+    interval = interval or choose_interval(start, end)
+    _source, key_column, _quantity, _price, _key = SOURCES[model]
+    params = _window(key, start, end, interval)
+    bars = BARS_SQL.format(table=model._meta.db_table, key=key_column)
+
+    with connections[using].cursor() as cursor:
+        cursor.execute(STATS_SQL.format(bars=bars), params)
+        count, volume, vwap, twap, volatility, low, high, open_, close = cursor.fetchone()
+
+    annualized = None
+    if volatility is not None:
+        annualized = float(volatility) * math.sqrt(SECONDS_PER_YEAR / INTERVALS[interval])
+    return {
+        "interval": interval,
+        "from": params["start"],
+        "to": params["end"],
+        "bars": count,
+        "volume": volume,
+        "vwap": _float(vwap),
+        "twap": _float(twap),
+        "volatility": _float(volatility),
+        "annualized_volatility": annualized,
+        "open": open_,
+        "high": high,
+        "low": low,
+        "close": close,
+    }
+
+
+def rolling_series(
+    key: int,
+    start: datetime,
+    end: datetime,
+    bars: int,
+    interval: Optional[str] = None,
+    model=Candle,
+    limit: int = MAX_BARS,
+    using: str = "default",
+) -> List[dict]:
+    """
+    Rolling volume, VWAP and volatility over the last ``bars`` bars at each
+    bucket of the window, oldest first (at most ``limit`` most recent points).
+    """
+    interval = interval or choose_interval(start, end)
+    _source, key_column, _quantity, _price, _key = SOURCES[model]
+    params = _window(key, start, end, interval)
+    params["limit"] = limit
+    sql = SERIES_SQL.format(
+        bars=BARS_SQL.format(table=model._meta.db_table, key=key_column),
+        preceding=max(int(bars), 1) - 1,
+    )
+
+    with connections[using].cursor() as cursor:
+        cursor.execute(sql, params)
+        rows = cursor.fetchall()
+    rows.reverse()
+    return [
+        {
+            "bucket": bucket,
+            "close": close,
+            "volume": volume,
+            "rolling_volume": rolling_volume,
+            "vwap": _float(vwap),
+            "volatility": _float(volatility),
+        }
+        for bucket, close, volume, rolling_volume, vwap, volatility in rows
+    ]
@@ -0,0 +1,210 @@
+"""
+Incremental OHLCV candle maintenance for stock transactions and product trades
+"""
+
+import logging
+from datetime import datetime, timezone as dt_timezone
+from decimal import Decimal
+from typing import Dict, Iterable, Tuple
+
+from django.db import connections, transaction
+
+from .models import Candle, ProductCandle
+from .partitions import archived_until
+from .prices import from_cents
+
+logger = logging.getLogger(__name__)
+
+# Interval name -> bucket width in seconds
+INTERVALS = {
+    "1m": 60,
+    "5m": 300,
+    "1h": 3600,
+    "1d": 86400,
+}
+
+UPSERT_SQL = """
+    INSERT INTO {table} ({key}, interval, bucket, open, high, low, close, volume, turnover)
+    VALUES {values}
+    ON CONFLICT ({key}, interval, bucket) DO UPDATE SET
+        high = GREATEST({table}.high, EXCLUDED.high),
+        low = LEAST({table}.low, EXCLUDED.low),
+        close = EXCLUDED.close,
+        volume = {table}.volume + EXCLUDED.volume,
+        turnover = {table}.turnover + EXCLUDED.turnover
+"""
+
+# Rebuilds one interval's bars from the raw history; rows sharing a timestamp
+# are ordered by id, matching the fill order used by the incremental path
+REBUILD_SQL = """
+    INSERT INTO {table} ({key}, interval, bucket, open, high, low, close, volume, turnover)
+    SELECT {key}, %(interval)s, bucket,
+           (array_agg(price ORDER BY "timestamp", id))[1],
+           MAX(price), MIN(price),
+           (array_agg(price ORDER BY "timestamp" DESC, id DESC))[1],
+           SUM(quantity), SUM(quantity * price)
+    FROM (
+        SELECT {key}, id, "timestamp",
+               {quantity} AS quantity, {price} AS price,
+               to_timestamp(floor(extract(epoch FROM "timestamp") / %(seconds)s) * %(seconds)s) AS bucket
+        FROM {source}
+        {where}
+    ) AS fills
+    GROUP BY {key}, bucket
+"""
+
+# model -> (source table, key column, quantity column, price column, index of the key in a row)
+SOURCES = {
+    Candle: ("market_stocktransaction", "stock_id", "shares", "price_per_share", 0),
+    ProductCandle: ("market_trade", "product_id", "quantity", "price_per_unit", 2),
+}
+
+
+def bucket_start(timestamp: datetime, seconds: int) -> datetime:
+    """Start of the ``seconds``-wide bucket containing ``timestamp`` (UTC aligned)"""
+    epoch = int(timestamp.timestamp())
+    return datetime.fromtimestamp(epoch - epoch % seconds, tz=dt_timezone.utc)
+
+
+def aggregate(rows: Iterable[tuple], timestamp: datetime, key: int = 0) -> Dict[Tuple, list]:
+    """
+    Fold rows written at ``timestamp`` into one [open, high, low, close,
+    volume, turnover] bar per (row[key], interval, bucket). Rows are
+    (stock_id, buyer_id, seller_id, shares, price) transactions (key 0) or
+    (seller_id, buyer_id, product_id, quantity, price) trades (key 2), in
+    fill order. Prices and turnover stay in integer cents.
+    """
+    buckets = {name: bucket_start(timestamp, seconds) for name, seconds in INTERVALS.items()}
+    per_key = {}
+    for row in rows:
+        quantity, price = row[3], row[4]
+        bar = per_key.get(row[key])
+        if bar is None:
+            per_key[row[key]] = [price, price, price, price, quantity, quantity * price]
+        else:
+            if price > bar[1]:
+                bar[1] = price
+            if price < bar[2]:
+                bar[2] = price
+            bar[3] = price
+            bar[4] += quantity
+            bar[5] += quantity * price
+
+    bars = {}
+    for key_id, bar in per_key.items():
+        for name, bucket in buckets.items():
+            bars[(key_id, name, bucket)] = bar
+    return bars
+
+
+def _decimal_bar(bar: list) -> tuple:
+    """A bar from ``aggregate`` with its prices and turnover as Decimal"""
+    open_, high, low, close, volume, turnover = bar
+    return (
+        from_cents(open_), from_cents(high), from_cents(low), from_cents(close),
+        volume, Decimal(turnover).scaleb(-2),
+    )
+
+
+def update_candles(
+    rows: Iterable[tuple], timestamp: datetime, using: str = "default", model=Candle
+):
+    """
+    Merge freshly written stock transactions (or, with ``model=ProductCandle``,
+    product trades) into the candle store.
+
+    Call this inside the transaction that writes the rows so candles never
+    disagree with the history tables. Each (key, interval, bucket) is a
+    single upsert, so concurrent writers merge instead of overwriting.
+    """
+    _source, key_column, _quantity, _price, key = SOURCES[model]
+    bars = aggregate(rows, timestamp, key)
+    if not bars:
+        return
+
+    connection = connections[using]
+    if connection.vendor != "postgresql":
+        _update_candles_orm(model, key_column, bars, using)
+        return
+
+    items = sorted(bars.items(), key=lambda item: item[0][:2])
+    with connection.cursor() as cursor:
+        for start in range(0, len(items), 1000):
+            chunk = items[start:start + 1000]
+            params = []
+            for (key_id, interval, bucket), bar in chunk:
+                params.extend((key_id, interval, bucket, *_decimal_bar(bar)))
+            values = ", ".join(["(%s, %s, %s, %s, %s, %s, %s, %s, %s)"] * len(chunk))
+            cursor.execute(
+                UPSERT_SQL.format(table=model._meta.db_table, key=key_column, values=values),
+                params,
+            )
+
+
+def update_product_candles(rows: Iterable[tuple], timestamp: datetime, using: str = "default"):
+    """Merge freshly written (seller, buyer, product, quantity, price) trades into the product candles"""
+    update_candles(rows, timestamp, using, model=ProductCandle)
+
+
+def rebuild_candles(model=Candle, keys=None, using: str = "default"):
+    """
+    Recompute every bar of ``model`` (optionally only for the given stock or
+    product ids) from the raw history, in SQL.
+
+    Bars of archived months (see ``archive_partitions``) cannot be rebuilt
+    and are kept: only bars from the end of the newest archived month on
+    are recomputed. Month starts are aligned with every interval's buckets.
+    """
+    source, key_column, quantity, price, _key = SOURCES[model]
+    table = model._meta.db_table
+    conditions, params = [], {}
+    if keys is not None:
+        conditions.append(f"{key_column} = ANY(%(keys)s)")
+        params["keys"] = list(keys)
+    since = archived_until(source, using)
+    if since:
+        params["since"] = datetime(since.year, since.month, since.day, tzinfo=dt_timezone.utc)
+
+    def where(column):
+        clauses = conditions + ([f"{column} >= %(since)s"] if since else [])
+        return "WHERE " + " AND ".join(clauses) if clauses else ""
+
+    with transaction.atomic(using=using), connections[using].cursor() as cursor:
+        cursor.execute(f"DELETE FROM {table} {where('bucket')}", params)
+        for interval, seconds in INTERVALS.items():
+            cursor.execute(
+                REBUILD_SQL.format(
+                    table=table,
+                    key=key_column,
+                    source=source,
+                    quantity=quantity,
+                    price=price,
+                    where=where('"timestamp"'),
+                ),
+                {**params, "interval": interval, "seconds": seconds},
+            )
+
+
+def _update_candles_orm(model, key_column, bars, using):
+    for (key_id, interval, bucket), bar in bars.items():
+        open_, high, low, close, volume, turnover = _decimal_bar(bar)
+        candle, created = model.objects.using(using).select_for_update().get_or_create(
+            interval=interval,
+            bucket=bucket,
+            defaults={
+                "open": open_,
+                "high": high,
+                "low": low,
+                "close": close,
+                "volume": volume,
+                "turnover": turnover,
+            },
+            **{key_column: key_id},
+        )
+        if not created:
+            candle.high = max(candle.high, high)
+            candle.low = min(candle.low, low)
+            candle.close = close
+            candle.volume += volume
+            candle.turnover += turnover
+            candle.save(update_fields=["high", "low", "close", "volume", "turnover"])
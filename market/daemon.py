@@ -0,0 +1,268 @@
+"""
+Long-running market ticker: in-memory tick loop with background database sync
+"""
+
+import logging
+import queue
+import signal
+import threading
+import time
+from collections import Counter, deque
+from typing import Callable, List, Optional
+
+from django.db import connections
+
+from .persistence import StepWriter
+
+logger = logging.getLogger(__name__)
+
+
+class TickClock:
+    """
+    Fixed-rate schedule: tick ``n`` is due at ``start + n * interval``.
+
+    Deadlines come from the start time rather than from the previous tick, so
+    time spent generating a tick (or oversleeping) does not accumulate into
+    drift. When the loop falls more than a whole tick behind, the missed
+    ticks are skipped instead of being run back to back.
+    """
+
+    def __init__(self, interval: float, stop: threading.Event):
+        self.interval = interval
+        self.stop = stop
+        self.start = time.monotonic()
+        self.tick = 0
+        self.missed = 0
+
+    def wait(self) -> Optional[float]:
+        """Sleep until the next tick is due; returns its lag in seconds, or None if stopped"""
+        self.tick += 1
+        deadline = self.start + self.tick * self.interval
+        delay = deadline - time.monotonic()
+        if delay > 0 and self.stop.wait(delay):
+            return None
+        now = time.monotonic()
+        behind = int((now - deadline) // self.interval)
+        if behind > 0:
+            self.missed += behind
+            self.tick += behind
+            deadline += behind * self.interval
+        return now - deadline
+
+
+class SyncFailed(RuntimeError):
+    """The background sync gave up on a batch; the daemon stops instead of dropping ticks"""
+
+
+class BackgroundSync(threading.Thread):
+    """
+    Writes queued ticks to the database. Ticks that queued up while the
+    previous flush ran are coalesced into one StepWriter flush. A failed
+    flush keeps its rows and is retried; once the retries are exhausted the
+    thread stops and ``submit`` raises SyncFailed.
+
+    Rows are stamped when the flush that writes them starts (each retry
+    stamps them again), not when they were generated, so a row's timestamp
+    is at most one flush duration older than its commit. Readers that stay
+    further than that behind now (the ``--lag`` of ``settle_trades`` and
+    ``export_market_history``) see every row of the range they read.
+
+    After each flush the settled stock state and the number of the last
+    tick it covered are published for the tick loop (``take_settled``).
+    """
+
+    retries = 5  # Flush attempts per batch
+    backoff = 1.0  # Seconds before the first retry, doubled for each one (up to 30)
+
+    def __init__(self, batch_size: int = 5000, max_pending: int = 100, event_log=None):
+        super().__init__(name="market-sync", daemon=True)
+        self.queue: queue.Queue = queue.Queue(maxsize=max_pending)
+        self.writer = StepWriter(batch_size=batch_size, event_log=event_log)
+        self.flushes = 0
+        self.done = threading.Event()
+        self.lock = threading.Lock()
+        self.settled_tick = 0
+        self.settled = {}  # {stock_id: [available_shares, price]} not yet taken
+        self.error: Optional[Exception] = None
+
+    def submit(self, tick: int, trades: List[tuple], transactions: List[tuple]):
+        """Queue tick number ``tick``'s rows; blocks when ``max_pending`` ticks are waiting"""
+        self._put((tick, trades, transactions))
+
+    def close(self):
+        self._put(None)
+
+    def _put(self, item):
+        while not self.done.is_set():
+            try:
+                self.queue.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+        if self.error is not None:
+            raise SyncFailed(f"Market sync stopped: {self.error}") from self.error
+
+    def take_settled(self):
+        """(last tick synced, stock state settled since the previous call)"""
+        with self.lock:
+            settled, self.settled = self.settled, {}
+            return self.settled_tick, settled
+
+    def run(self):
+        try:
+            closing = False
+            while not closing:
+                item = self.queue.get()
+                tick = None
+                while item is not None:
+                    tick, trades, transactions = item
+                    self.writer.add_trades(trades)
+                    self.writer.add_transactions(transactions)
+                    try:
+                        item = self.queue.get_nowait()
+                    except queue.Empty:
+                        break
+                else:
+                    closing = True
+                if tick is not None or self.writer.trades or self.writer.transactions:
+                    self._flush()
+                    if tick is not None:
+                        with self.lock:
+                            self.settled_tick = tick
+                            self.settled.update(self.writer.settled)
+        except Exception as e:
+            self.error = e
+        finally:
+            pending = len(self.writer.trades) + len(self.writer.transactions)
+            if pending:
+                logger.error(f"Market sync stopped with {pending} unsaved rows")
+            connections.close_all()
+            self.done.set()
+
+    def _flush(self):
+        retries, backoff = self.retries, self.backoff
+        for attempt in range(retries):
+            try:
+                self.writer.flush()  # Stamped now, see the class docstring
+                self.flushes += 1
+                return
+            except Exception as e:
+                logger.error(f"Market sync flush failed (attempt {attempt + 1}): {e}")
+                connections.close_all()
+                if attempt + 1 == retries:
+                    raise
+                time.sleep(min(backoff * 2 ** attempt, 30))
+
+
+class MarketDaemon:
+    """
+    Runs ``generate(collector)`` every ``tick_seconds`` against in-memory
+    market state and hands each tick's rows to a BackgroundSync thread.
+    Reports tick lag every ``report_seconds`` and stops cleanly on SIGTERM or
+    SIGINT, syncing everything generated before exiting.
+
+    Stocks that ``generate`` registers with ``collector.update_stock`` are
+    kept in step with the database: before each tick they get the settled
+    price and share count of the last synced tick, less the shares of the
+    ticks still waiting to be synced.
+    """
+
+    def __init__(
+        self,
+        generate: Callable[[StepWriter], None],
+        tick_seconds: float,
+        batch_size: int = 5000,
+        max_pending: int = 100,
+        report_seconds: float = 10.0,
+        report: Callable[[str], None] = logger.info,
+        event_log=None,
+    ):
+        self.generate = generate
+        self.tick_seconds = tick_seconds
+        self.report_seconds = report_seconds
+        self.report = report
+        self.stop = threading.Event()
+        self.sync = BackgroundSync(batch_size, max_pending, event_log)
+        self.lags: List[float] = []
+        self.ticks = 0
+        self.stocks = {}  # Tracked in-memory stocks by id
+        self.unsynced = deque()  # (tick, {stock_id: shares}) submitted but not yet synced
+        self.unsynced_shares = Counter()
+
+    def request_stop(self, signum=None, frame=None):
+        self.stop.set()
+
+    def run(self, max_ticks: Optional[int] = None):
+        """Tick until stopped (or ``max_ticks``); raises SyncFailed if rows could not be synced"""
+        previous = {
+            sig: signal.signal(sig, self.request_stop) for sig in (signal.SIGTERM, signal.SIGINT)
+        }
+        # The tick loop itself never touches the database; release the
+        # connection used to load the market state
+        connections.close_all()
+        self.sync.start()
+        clock = TickClock(self.tick_seconds, self.stop)
+        next_report = time.monotonic() + self.report_seconds
+        try:
+            while not self.stop.is_set() and (max_ticks is None or self.ticks < max_ticks):
+                lag = clock.wait()
+                if lag is None:
+                    break
+                self.apply_settled()
+                collector = StepWriter()
+                self.generate(collector)
+                self.ticks += 1
+                self.track(collector)
+                self.sync.submit(self.ticks, collector.trades, collector.transactions)
+                self.lags.append(lag)
+                if time.monotonic() >= next_report:
+                    self.report(self.stats(clock))
+                    next_report += self.report_seconds
+        finally:
+            for sig, handler in previous.items():
+                signal.signal(sig, handler)
+            try:
+                self.sync.close()
+            except SyncFailed:
+                pass  # Raised below, or already raised by submit
+            self.sync.done.wait()
+            self.apply_settled()
+            self.report(self.stats(clock, final=True))
+        if self.sync.error is not None:
+            raise SyncFailed(f"Market sync stopped: {self.sync.error}") from self.sync.error
+
+    def track(self, collector: StepWriter):
+        """Remember a generated tick's stocks and the shares it takes from them"""
+        self.stocks.update(collector.stocks)
+        shares = Counter()
+        for row in collector.transactions:
+            shares[row[0]] += row[3]
+        self.unsynced.append((self.ticks, shares))
+        self.unsynced_shares.update(shares)
+
+    def apply_settled(self):
+        """Refresh the tracked stocks from the state settled by the sync thread"""
+        synced, settled = self.sync.take_settled()
+        while self.unsynced and self.unsynced[0][0] <= synced:
+            _tick, shares = self.unsynced.popleft()
+            self.unsynced_shares.subtract(shares)
+        for pk, (available, price) in settled.items():
+            stock = self.stocks.get(pk)
+            if stock is not None:
+                stock.available_shares = available - self.unsynced_shares[pk]
+                stock.price = price
+
+    def stats(self, clock: TickClock, final: bool = False) -> str:
+        lags = sorted(self.lags)
+        self.lags = []
+        writer = self.sync.writer
+        summary = (
+            f"ticks={self.ticks} missed={clock.missed} pending={self.sync.queue.qsize()} "
+            f"rows={writer.rows_written} rejected={writer.rejected} "
+            f"sync={writer.rows_per_second:,.0f} rows/sec"
+        )
+        if lags:
+            p50 = lags[len(lags) // 2] * 1000
+            p99 = lags[min(len(lags) - 1, int(len(lags) * 0.99))] * 1000
+            summary += f" lag p50={p50:.2f}ms p99={p99:.2f}ms max={lags[-1] * 1000:.2f}ms"
+        return ("Stopped: " if final else "") + summary
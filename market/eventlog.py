@@ -0,0 +1,231 @@
+"""
+Compact append-only event log of simulated market steps, and its replay
+
+A log is a sequence of length-prefixed records::
+
+    <type: 1 byte> <payload length: uint32 LE> <payload>
+
+``H`` (header) and ``R`` (reference data: the companies, products and stocks
+the steps refer to, as they were when the log was created) carry JSON. Each
+``S`` (step) record is one committed StepWriter flush in binary: a
+``<qII`` header (timestamp in microseconds since the epoch, trade count,
+transaction count) followed by fixed-width rows
+
+    trade        <IIIIq  seller_id, buyer_id, product_id, quantity, price in cents
+    transaction  <IIIIq  stock_id, buyer_id, seller_id (0 = none), shares, price in cents
+
+Only rows that were actually settled are logged, so replaying a log in order
+rebuilds exactly the same trades, transactions, stock prices and share
+counts, holdings, candles and indices.
+"""
+
+import fcntl
+import json
+import os
+import struct
+from datetime import datetime, timezone as dt_timezone
+from typing import Iterator, List, Optional, Tuple
+
+from django.core.management.color import no_style
+from django.db import connections, transaction
+
+from .models import Company, Product, Stock
+from .partitions import ensure_partitions
+from .prices import from_cents, to_cents
+
+VERSION = 1
+
+HEADER, REFERENCE, STEP = b"H", b"R", b"S"
+
+RECORD = struct.Struct("<cI")
+STEP_HEADER = struct.Struct("<qII")
+TRADE_ROW = struct.Struct("<IIIIq")
+TRANSACTION_ROW = struct.Struct("<IIIIq")
+
+
+def _micros(timestamp: datetime) -> int:
+    delta = timestamp - datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+    return (delta.days * 86400 + delta.seconds) * 1_000_000 + delta.microseconds
+
+
+def reference_data(using: str = "default") -> dict:
+    """Current companies, products and stocks in the log's JSON form"""
+    return {
+        "companies": list(
+            Company.objects.using(using).order_by("pk").values_list("pk", "name", "country")
+        ),
+        "products": [
+            [pk, company_id, name, to_cents(price)]
+            for pk, company_id, name, price in Product.objects.using(using)
+            .order_by("pk")
+            .values_list("pk", "company_id", "name", "price")
+        ],
+        "stocks": [
+            [pk, company_id, total, available, to_cents(price)]
+            for pk, company_id, total, available, price in Stock.objects.using(using)
+            .order_by("pk")
+            .values_list("pk", "company_id", "total_shares", "available_shares", "price")
+        ],
+    }
+
+
+class EventLog:
+    """
+    Appends step records to a log file. A new (empty) log starts with a
+    header and a snapshot of the reference data.
+
+    Each record is written with a single ``write`` on a file opened in append
+    mode, so several worker processes can share one log. Writers hold an
+    exclusive lock on the file while checking for and writing the header,
+    so only one of them starts a new log; workers of one run should still
+    open it in the parent first, so the reference data is taken before any
+    of them writes.
+    """
+
+    def __init__(self, path: str, seed=None, using: str = "default"):
+        self.path = path
+        self.fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        self.steps = 0
+        self.bytes_written = 0
+        fcntl.flock(self.fd, fcntl.LOCK_EX)
+        try:
+            if os.fstat(self.fd).st_size == 0:
+                self._write(HEADER, json.dumps({"version": VERSION, "seed": seed}).encode())
+                self._write(REFERENCE, json.dumps(reference_data(using), separators=(",", ":")).encode())
+        finally:
+            fcntl.flock(self.fd, fcntl.LOCK_UN)
+
+    def _write(self, kind: bytes, payload: bytes):
+        record = RECORD.pack(kind, len(payload)) + payload
+        os.write(self.fd, record)
+        self.bytes_written += len(record)
+
+    def write_step(self, timestamp: datetime, trades: List[tuple], transactions: List[tuple]):
+        parts = [STEP_HEADER.pack(_micros(timestamp), len(trades), len(transactions))]
+        parts.extend(
+            TRADE_ROW.pack(seller_id, buyer_id, product_id, quantity, price)
+            for seller_id, buyer_id, product_id, quantity, price in trades
+        )
+        parts.extend(
+            TRANSACTION_ROW.pack(stock_id, buyer_id, seller_id or 0, shares, price)
+            for stock_id, buyer_id, seller_id, shares, price in transactions
+        )
+        self._write(STEP, b"".join(parts))
+        self.steps += 1
+
+    def close(self):
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def read_records(path: str) -> Iterator[Tuple[bytes, memoryview]]:
+    """(type, payload) for every complete record; a truncated tail is ignored"""
+    with open(path, "rb") as handle:
+        data = memoryview(handle.read())
+    offset = 0
+    while offset + RECORD.size <= len(data):
+        kind, length = RECORD.unpack_from(data, offset)
+        offset += RECORD.size
+        if offset + length > len(data):
+            break
+        yield kind, data[offset:offset + length]
+        offset += length
+
+
+def decode_step(payload: memoryview):
+    """Decode a step payload into (timestamp, trade rows, transaction rows), prices in cents"""
+    micros, trade_count, transaction_count = STEP_HEADER.unpack_from(payload)
+    timestamp = datetime.fromtimestamp(micros // 1_000_000, tz=dt_timezone.utc).replace(
+        microsecond=micros % 1_000_000
+    )
+
+    start = STEP_HEADER.size
+    end = start + trade_count * TRADE_ROW.size
+    trades = [
+        (seller_id, buyer_id, product_id, quantity, cents)
+        for seller_id, buyer_id, product_id, quantity, cents in TRADE_ROW.iter_unpack(payload[start:end])
+    ]
+    transactions = [
+        (stock_id, buyer_id, seller_id or None, shares, cents)
+        for stock_id, buyer_id, seller_id, shares, cents in TRANSACTION_ROW.iter_unpack(
+            payload[end:end + transaction_count * TRANSACTION_ROW.size]
+        )
+    ]
+    return timestamp, trades, transactions
+
+
+def step_range(path: str) -> Optional[Tuple[datetime, datetime]]:
+    """Timestamps of the earliest and latest logged steps, or None for a log without steps"""
+    micros = [STEP_HEADER.unpack_from(payload)[0] for kind, payload in read_records(path) if kind == STEP]
+    if not micros:
+        return None
+    return tuple(
+        datetime.fromtimestamp(value // 1_000_000, tz=dt_timezone.utc) for value in (min(micros), max(micros))
+    )
+
+
+def load_reference(reference: dict, using: str = "default"):
+    """Create the logged companies, products and stocks with their original ids"""
+    with transaction.atomic(using=using):
+        Company.objects.using(using).bulk_create(
+            Company(pk=pk, name=name, country=country)
+            for pk, name, country in reference["companies"]
+        )
+        Product.objects.using(using).bulk_create(
+            Product(pk=pk, company_id=company_id, name=name, price=from_cents(cents))
+            for pk, company_id, name, cents in reference["products"]
+        )
+        Stock.objects.using(using).bulk_create(
+            Stock(
+                pk=pk,
+                company_id=company_id,
+                total_shares=total,
+                available_shares=available,
+                price=from_cents(cents),
+            )
+            for pk, company_id, total, available, cents in reference["stocks"]
+        )
+        connection = connections[using]
+        with connection.cursor() as cursor:
+            for sql in connection.ops.sequence_reset_sql(no_style(), [Company, Product, Stock]):
+                cursor.execute(sql)
+
+
+def replay(path: str, writer, load_reference_data: bool = True, using: str = "default") -> dict:
+    """
+    Re-apply a log through ``writer`` (a StepWriter), one flush per logged
+    step with the step's original timestamp. Returns replay counters.
+
+    The monthly partitions of the logged period are created first, so old
+    steps do not land in the default partition.
+    """
+    logged = step_range(path)
+    if logged:
+        ensure_partitions(using=using, since=logged[0].date(), until=logged[1].date())
+
+    stats = {"steps": 0, "trades": 0, "transactions": 0, "seed": None}
+    for kind, payload in read_records(path):
+        if kind == HEADER:
+            header = json.loads(bytes(payload))
+            if header.get("version") != VERSION:
+                raise ValueError(f"Unsupported event log version: {header.get('version')}")
+            stats["seed"] = header.get("seed")
+        elif kind == REFERENCE:
+            if load_reference_data:
+                load_reference(json.loads(bytes(payload)), using)
+        elif kind == STEP:
+            timestamp, trades, transactions = decode_step(payload)
+            writer.add_trades(trades)
+            writer.add_transactions(transactions)
+            writer.flush(timestamp)
+            stats["steps"] += 1
+            stats["trades"] += len(trades)
+            stats["transactions"] += len(transactions)
+    return stats
@@ -0,0 +1,119 @@
+"""
+Publishing of live market events (fills, trades and last prices) over PostgreSQL NOTIFY
+"""
+
+import json
+import logging
+from datetime import datetime
+from typing import Iterable, List, Optional
+
+from django.db import connections
+
+from .prices import format_cents
+
+logger = logging.getLogger(__name__)
+
+CHANNEL = "market_events"
+
+# NOTIFY payloads must stay below 8000 bytes
+MAX_PAYLOAD_BYTES = 7500
+
+# Per step, individual events are capped; the price event always carries totals
+MAX_TRANSACTIONS_PER_STOCK = 10
+MAX_TRADES = 50
+
+
+def build_events(
+    transactions: Iterable[tuple], trades: Iterable[tuple], timestamp: Optional[datetime] = None
+) -> List[dict]:
+    """
+    Turn a step's (stock_id, buyer_id, seller_id, shares, price) transaction
+    rows and (seller_id, buyer_id, product_id, quantity, price) trade rows,
+    prices in cents, into stream events: one "price" event per stock with the
+    last price, the step's high, low and volume (and the rows' ``timestamp``,
+    if given), followed by the most recent individual "transaction" and
+    "trade" events.
+    """
+    per_stock = {}
+    for row in transactions:
+        per_stock.setdefault(row[0], []).append(row)
+
+    events = []
+    for stock_id, rows in per_stock.items():
+        event = {
+            "type": "price",
+            "stock": stock_id,
+            "price": format_cents(rows[-1][4]),
+            "high": format_cents(max(row[4] for row in rows)),
+            "low": format_cents(min(row[4] for row in rows)),
+            "volume": sum(row[3] for row in rows),
+            "count": len(rows),
+        }
+        if timestamp is not None:
+            event["timestamp"] = timestamp.isoformat()
+        events.append(event)
+        for _stock, buyer_id, seller_id, shares, price in rows[-MAX_TRANSACTIONS_PER_STOCK:]:
+            events.append(
+                {
+                    "type": "transaction",
+                    "stock": stock_id,
+                    "buyer": buyer_id,
+                    "seller": seller_id,
+                    "shares": shares,
+                    "price": format_cents(price),
+                }
+            )
+
+    for seller_id, buyer_id, product_id, quantity, price in list(trades)[-MAX_TRADES:]:
+        events.append(
+            {
+                "type": "trade",
+                "product": product_id,
+                "buyer": buyer_id,
+                "seller": seller_id,
+                "quantity": quantity,
+                "price": format_cents(price),
+            }
+        )
+    return events
+
+
+def _payloads(events: List[dict]) -> List[str]:
+    """Pack events into JSON arrays that each fit in one NOTIFY payload"""
+    payloads, chunk, size = [], [], 2
+    for event in events:
+        encoded = json.dumps(event, separators=(",", ":"))
+        if chunk and size + len(encoded) + 1 > MAX_PAYLOAD_BYTES:
+            payloads.append("[" + ",".join(chunk) + "]")
+            chunk, size = [], 2
+        chunk.append(encoded)
+        size += len(encoded) + 1
+    if chunk:
+        payloads.append("[" + ",".join(chunk) + "]")
+    return payloads
+
+
+def publish(
+    transactions: Iterable[tuple] = (),
+    trades: Iterable[tuple] = (),
+    using: str = "default",
+    timestamp: Optional[datetime] = None,
+):
+    """
+    Queue live events for the rows written in the current transaction.
+
+    NOTIFY is transactional: subscribers only see the events once the rows
+    are committed, and never see them if the transaction rolls back.
+    """
+    connection = connections[using]
+    if connection.vendor != "postgresql":
+        return
+
+    events = build_events(transactions, trades, timestamp)
+    if not events:
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT pg_notify(%s, payload) FROM unnest(%s::text[]) AS payload",
+            [CHANNEL, _payloads(events)],
+        )
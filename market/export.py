@@ -0,0 +1,200 @@
+"""
+Columnar export of market history: one NumPy ``.npy`` file per column
+
+Every file can be opened with ``numpy.load(path, mmap_mode="r")`` and used
+without copying. Rows are read through a server-side cursor in chunks and
+written straight into memory-mapped output files, so memory use does not
+grow with the size of the exported range.
+"""
+
+import json
+import os
+from datetime import datetime, timezone as dt_timezone
+from typing import Dict, List, Optional, Sequence
+
+from django.db import connections, transaction
+
+try:
+    import numpy as np
+    from numpy.lib.format import open_memmap
+
+    HAS_NUMPY = True
+except ImportError:  # NumPy is only required for exports
+    HAS_NUMPY = False
+
+# Dataset -> (table, [(column, dtype, SQL expression)]). Rows are exported in
+# (timestamp, id) order; timestamps are microseconds since the epoch, a missing
+# seller is 0 and prices are int64 cents, as everywhere else in the market.
+DATASETS: Dict[str, tuple] = {
+    "trades": (
+        "market_trade",
+        [
+            ("id", "<i8", "id"),
+            ("timestamp", "<M8[us]", "(EXTRACT(epoch FROM \"timestamp\") * 1000000)::bigint"),
+            ("seller_id", "<i8", "seller_id"),
+            ("buyer_id", "<i8", "buyer_id"),
+            ("product_id", "<i8", "product_id"),
+            ("quantity", "<i8", "quantity"),
+            ("price_per_unit", "<i8", "(price_per_unit * 100)::bigint"),
+        ],
+    ),
+    "stock_transactions": (
+        "market_stocktransaction",
+        [
+            ("id", "<i8", "id"),
+            ("timestamp", "<M8[us]", "(EXTRACT(epoch FROM \"timestamp\") * 1000000)::bigint"),
+            ("stock_id", "<i8", "stock_id"),
+            ("buyer_id", "<i8", "buyer_id"),
+            ("seller_id", "<i8", "COALESCE(seller_id, 0)"),
+            ("shares", "<i8", "shares"),
+            ("price_per_share", "<i8", "(price_per_share * 100)::bigint"),
+        ],
+    ),
+}
+
+CHUNK_SIZE = 10000
+MANIFEST = "manifest.json"
+
+
+def columns(dataset: str, names: Optional[Sequence[str]] = None) -> List[tuple]:
+    """The (name, dtype, expression) columns of a dataset, optionally only ``names``"""
+    _table, spec = DATASETS[dataset]
+    if names is None:
+        return spec
+    by_name = {column[0]: column for column in spec}
+    return [by_name[name] for name in names]
+
+
+def _where(start, end):
+    clauses, params = [], []
+    if start is not None:
+        clauses.append('"timestamp" >= %s')
+        params.append(start)
+    if end is not None:
+        clauses.append('"timestamp" < %s')
+        params.append(end)
+    return (f"WHERE {' AND '.join(clauses)}" if clauses else ""), params
+
+
+def _begin_snapshot(connection):
+    """
+    Make the count and the data read see the same rows. Inside a caller's
+    transaction its isolation level stands; the read is then cut at the count.
+    """
+    if connection.vendor == "postgresql":
+        with connection.cursor() as cursor:
+            cursor.execute("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ")
+
+
+def write_columns(
+    dataset: str,
+    directory: str,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    names: Optional[Sequence[str]] = None,
+    chunk_size: int = CHUNK_SIZE,
+    using: str = "default",
+) -> int:
+    """
+    Export the rows of ``dataset`` with start <= timestamp < end into
+    ``directory/<column>.npy``. Returns the number of rows.
+    """
+    table, _spec = DATASETS[dataset]
+    selected = columns(dataset, names)
+    where, params = _where(start, end)
+    os.makedirs(directory, exist_ok=True)
+
+    connection = connections[using]
+    outermost = not connection.in_atomic_block
+    with transaction.atomic(using=using):
+        if outermost:
+            _begin_snapshot(connection)
+        with connection.cursor() as cursor:
+            cursor.execute(f"SELECT COUNT(*) FROM {table} {where}", params)
+            count = cursor.fetchone()[0]
+
+        outputs = [
+            open_memmap(os.path.join(directory, f"{name}.npy"), mode="w+", dtype=dtype, shape=(count,))
+            for name, dtype, _expression in selected
+        ]
+        # On PostgreSQL this is a named (server-side) cursor
+        cursor = connection.chunked_cursor()
+        try:
+            cursor.execute(
+                f"SELECT {', '.join(expression for _name, _dtype, expression in selected)} "
+                f"FROM {table} {where} ORDER BY \"timestamp\", id",
+                params,
+            )
+            offset = 0
+            while offset < count:
+                rows = cursor.fetchmany(chunk_size)
+                if not rows:
+                    break
+                rows = rows[:count - offset]
+                for output, values in zip(outputs, zip(*rows)):
+                    output[offset:offset + len(rows)] = np.fromiter(
+                        values, dtype=np.int64 if output.dtype.kind == "M" else output.dtype,
+                        count=len(rows),
+                    ).view(output.dtype)
+                offset += len(rows)
+        finally:
+            cursor.close()
+
+    for output in outputs:
+        output.flush()
+    del outputs
+    return count
+
+
+def _stamp(value: datetime) -> str:
+    return value.astimezone(dt_timezone.utc).strftime("%Y%m%dT%H%M%S%fZ")
+
+
+def read_manifest(directory: str) -> dict:
+    path = os.path.join(directory, MANIFEST)
+    if not os.path.exists(path):
+        return {"chunks": []}
+    with open(path) as handle:
+        return json.load(handle)
+
+
+def export_range(
+    dataset: str,
+    output_dir: str,
+    start: datetime,
+    end: datetime,
+    chunk_size: int = CHUNK_SIZE,
+    using: str = "default",
+) -> dict:
+    """
+    Export one [start, end) chunk of a dataset to
+    ``output_dir/<dataset>/<start>--<end>/`` and record it in the dataset's
+    manifest. Returns the manifest entry.
+    """
+    dataset_dir = os.path.join(output_dir, dataset)
+    name = f"{_stamp(start)}--{_stamp(end)}"
+    rows = write_columns(dataset, os.path.join(dataset_dir, name), start, end, None, chunk_size, using)
+
+    manifest = read_manifest(dataset_dir)
+    entry = {"from": start.isoformat(), "to": end.isoformat(), "rows": rows, "path": name}
+    manifest["chunks"] = [chunk for chunk in manifest["chunks"] if chunk["path"] != name] + [entry]
+    manifest["columns"] = {column: dtype for column, dtype, _expression in columns(dataset)}
+    path = os.path.join(dataset_dir, MANIFEST)
+    with open(path + ".tmp", "w") as handle:
+        json.dump(manifest, handle, indent=2)
+    os.replace(path + ".tmp", path)
+    return entry
+
+
+def next_start(dataset: str, output_dir: Optional[str] = None, using: str = "default") -> Optional[datetime]:
+    """
+    Where an export starts: the end of the last chunk in ``output_dir``'s
+    manifest (incremental exports), else the oldest row.
+    """
+    chunks = read_manifest(os.path.join(output_dir, dataset))["chunks"] if output_dir else []
+    if chunks:
+        return max(datetime.fromisoformat(chunk["to"]) for chunk in chunks)
+    table, _spec = DATASETS[dataset]
+    with connections[using].cursor() as cursor:
+        cursor.execute(f'SELECT MIN("timestamp") FROM {table}')
+        return cursor.fetchone()[0]
@@ -0,0 +1,100 @@
+"""
+Materialized company share positions, kept in step with stock transactions
+"""
+
+import logging
+from collections import defaultdict
+from typing import Iterable
+
+from django.db import connections, transaction
+from django.db.models import F
+
+from .models import Holding
+from .partitions import HistoryArchived, archived_until
+
+logger = logging.getLogger(__name__)
+
+UPSERT_SQL = """
+    INSERT INTO market_holding (company_id, stock_id, shares)
+    VALUES {values}
+    ON CONFLICT (company_id, stock_id) DO UPDATE SET
+        shares = market_holding.shares + EXCLUDED.shares
+"""
+
+REBUILD_SQL = """
+    INSERT INTO market_holding (company_id, stock_id, shares)
+    SELECT company_id, stock_id, SUM(delta)
+    FROM (
+        SELECT buyer_id AS company_id, stock_id, shares AS delta
+        FROM market_stocktransaction
+        UNION ALL
+        SELECT seller_id, stock_id, -shares
+        FROM market_stocktransaction
+        WHERE seller_id IS NOT NULL
+    ) AS fills
+    GROUP BY company_id, stock_id
+    HAVING SUM(delta) <> 0
+"""
+
+
+def position_deltas(rows: Iterable[tuple]) -> dict:
+    """Net share change per (company_id, stock_id) for (stock, buyer, seller, shares, price) rows"""
+    deltas = defaultdict(int)
+    for stock_id, buyer_id, seller_id, shares, _price in rows:
+        deltas[(buyer_id, stock_id)] += shares
+        if seller_id is not None:
+            deltas[(seller_id, stock_id)] -= shares
+    return {key: delta for key, delta in deltas.items() if delta}
+
+
+def update_holdings(rows: Iterable[tuple], using: str = "default"):
+    """
+    Apply fills to the positions table. Call inside the transaction that
+    writes the fills. Keys are written in sorted order so concurrent writers
+    lock positions in the same order and cannot deadlock.
+    """
+    deltas = sorted(position_deltas(rows).items())
+    if not deltas:
+        return
+
+    connection = connections[using]
+    if connection.vendor != "postgresql":
+        for (company_id, stock_id), delta in deltas:
+            updated = Holding.objects.using(using).filter(
+                company_id=company_id, stock_id=stock_id
+            ).update(shares=F("shares") + delta)
+            if not updated:
+                Holding.objects.using(using).create(
+                    company_id=company_id, stock_id=stock_id, shares=delta
+                )
+        return
+
+    with connection.cursor() as cursor:
+        for start in range(0, len(deltas), 1000):
+            chunk = deltas[start:start + 1000]
+            params = []
+            for (company_id, stock_id), delta in chunk:
+                params.extend((company_id, stock_id, delta))
+            values = ", ".join(["(%s, %s, %s)"] * len(chunk))
+            cursor.execute(UPSERT_SQL.format(values=values), params)
+
+
+def rebuild_holdings(using: str = "default") -> int:
+    """
+    Recompute every position from the full transaction history in one pass.
+    Positions sum the whole history, so this raises ``HistoryArchived`` once
+    stock transaction partitions have been archived.
+    """
+    until = archived_until("market_stocktransaction", using)
+    if until:
+        raise HistoryArchived(
+            f"Stock transactions before {until} are archived; holdings cannot be rebuilt from what is left"
+        )
+    connection = connections[using]
+    with transaction.atomic(using=using), connection.cursor() as cursor:
+        if connection.vendor == "postgresql":
+            # Writers queue behind the rebuild, then apply their deltas on top of it
+            cursor.execute("LOCK TABLE market_holding IN EXCLUSIVE MODE")
+        cursor.execute("DELETE FROM market_holding")
+        cursor.execute(REBUILD_SQL)
+        return cursor.rowcount
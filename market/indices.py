@@ -0,0 +1,191 @@
+"""
+Incremental cap-weighted market index and per-country sub-indices
+
+Settling writers append their market cap changes to IndexDelta; each
+commit then folds the pending deltas into the MarketIndex rows in a
+separate short transaction (``fold_index_deltas``). The level history
+keeps one point per index per LEVEL_SECONDS, for LEVEL_RETENTION.
+"""
+
+import logging
+from collections import defaultdict
+from datetime import timedelta
+from decimal import Decimal
+from typing import Iterable
+
+from django.db import connections, transaction
+from django.db.models import DecimalField, ExpressionWrapper, F, Sum
+from django.utils import timezone
+
+from .candles import bucket_start
+from .models import IndexDelta, IndexLevel, MarketIndex, Stock
+
+logger = logging.getLogger(__name__)
+
+BASE_LEVEL = 1000.0
+MARKET = ""  # country key of the whole-market index
+LEVEL_SECONDS = 60  # One level per index per minute: the minute's latest
+LEVEL_RETENTION = timedelta(days=7)  # Older levels are pruned as new minutes start
+
+
+class _NeedsLock(Exception):
+    """A fold claimed deltas of a country that has no index yet"""
+
+
+def market_cap(country=None, using: str = "default") -> Decimal:
+    """Full recompute of sum(total_shares * price) for a country (or the market)"""
+    stocks = Stock.objects.using(using)
+    if country:
+        stocks = stocks.filter(company__country=country)
+    cap = stocks.aggregate(
+        cap=Sum(
+            ExpressionWrapper(
+                F("total_shares") * F("price"),
+                output_field=DecimalField(max_digits=24, decimal_places=2),
+            )
+        )
+    )["cap"]
+    return cap or Decimal("0")
+
+
+def _create_index(country: str, using: str) -> MarketIndex:
+    cap = market_cap(country, using)
+    divisor = float(cap) / BASE_LEVEL if cap else 1.0
+    index, _ = MarketIndex.objects.using(using).get_or_create(
+        country=country, defaults={"market_cap": cap, "divisor": divisor}
+    )
+    return index
+
+
+def update_indices(price_changes: Iterable[tuple], using: str = "default"):
+    """
+    Record (country, total_shares, old_price, new_price) stock price changes
+    as market cap deltas of the market index and the affected country
+    indices. Call inside the transaction that writes the new prices: it only
+    appends IndexDelta rows, so concurrent writers never wait on the shared
+    index rows. The deltas are folded into the indices once it commits.
+    """
+    deltas = defaultdict(Decimal)
+    for country, total_shares, old_price, new_price in price_changes:
+        delta = total_shares * (Decimal(new_price) - Decimal(old_price))
+        if delta:
+            deltas[MARKET] += delta
+            deltas[country] += delta
+    if not deltas:
+        return
+
+    IndexDelta.objects.using(using).bulk_create(
+        IndexDelta(country=country, delta=delta) for country, delta in sorted(deltas.items()) if delta
+    )
+    transaction.on_commit(lambda: fold_index_deltas(using), using=using)
+
+
+def fold_index_deltas(using: str = "default") -> int:
+    """
+    Apply the pending IndexDelta rows to the indices and record their new
+    levels, in a short transaction of its own. Concurrent folds claim
+    disjoint rows (SKIP LOCKED) and update the indices in a fixed order, so
+    they cannot deadlock. Returns the number of rows folded.
+
+    A country's first deltas create its index from a full recompute, which
+    already includes every committed price change. That fold locks out
+    writers and other folds first, so no delta is counted twice.
+    """
+    lock = False
+    while True:
+        try:
+            return _fold(using, lock)
+        except _NeedsLock:
+            lock = True
+
+
+def _fold(using: str, lock: bool) -> int:
+    connection = connections[using]
+    exclusive = lock or connection.vendor != "postgresql"
+    with transaction.atomic(using=using):
+        if lock and connection.vendor == "postgresql":
+            # Taken before any row lock, so folds queue instead of deadlocking
+            with connection.cursor() as cursor:
+                cursor.execute("LOCK TABLE market_indexdelta IN EXCLUSIVE MODE")
+        pending = list(
+            IndexDelta.objects.using(using)
+            .select_for_update(skip_locked=True)
+            .order_by("pk")
+            .values_list("pk", "country", "delta")
+        )
+        if not pending:
+            return 0
+        deltas = defaultdict(Decimal)
+        for _pk, country, delta in pending:
+            deltas[country] += delta
+
+        indices = MarketIndex.objects.using(using)
+        existing = set(indices.filter(country__in=deltas).values_list("country", flat=True))
+        if not exclusive and len(existing) < len(deltas):
+            raise _NeedsLock()  # Rolls back the claim
+        IndexDelta.objects.using(using).filter(pk__in=[pk for pk, _country, _delta in pending]).delete()
+
+        now = timezone.now()
+        for country in sorted(deltas):
+            if country in existing:
+                indices.filter(country=country).update(
+                    market_cap=F("market_cap") + deltas[country], updated_at=now
+                )
+            else:
+                # Seeded from a full recompute, which already includes these deltas
+                _create_index(country, using)
+
+        for index in indices.filter(country__in=deltas):
+            record_level(index, now, using)
+    return len(pending)
+
+
+def record_level(index: MarketIndex, now, using: str = "default"):
+    """
+    Record ``index``'s level at ``now``: the latest level of a LEVEL_SECONDS
+    bucket replaces the earlier ones, and starting a bucket prunes the
+    levels older than LEVEL_RETENTION.
+    """
+    level = index.level
+    levels = IndexLevel.objects.using(using).filter(index=index)
+    if levels.filter(timestamp__gte=bucket_start(now, LEVEL_SECONDS)).update(timestamp=now, level=level):
+        return
+    IndexLevel.objects.using(using).create(index=index, timestamp=now, level=level)
+    levels.filter(timestamp__lt=now - LEVEL_RETENTION).delete()
+
+
+def rebuild_indices(using: str = "default") -> int:
+    """
+    Recompute every index's market cap from scratch (e.g. after stocks are
+    listed or total_shares change). The divisor is rescaled so each existing
+    index level stays continuous across the rebuild.
+    """
+    countries = set(
+        Stock.objects.using(using).values_list("company__country", flat=True).distinct()
+    )
+    countries.add(MARKET)
+    now = timezone.now()
+    with transaction.atomic(using=using):
+        connection = connections[using]
+        if connection.vendor == "postgresql":
+            # Writers and folds queue behind the rebuild, which covers their deltas so far
+            with connection.cursor() as cursor:
+                cursor.execute("LOCK TABLE market_indexdelta IN EXCLUSIVE MODE")
+        IndexDelta.objects.using(using).all().delete()
+        for country in sorted(countries):
+            index = (
+                MarketIndex.objects.using(using)
+                .select_for_update()
+                .filter(country=country)
+                .first()
+            )
+            if index is None:
+                _create_index(country, using)
+                continue
+            level = index.level
+            index.market_cap = market_cap(country, using)
+            if level and index.market_cap:
+                index.divisor = float(index.market_cap) / level
+            index.save(update_fields=["market_cap", "divisor", "updated_at"])
+            record_level(index, now, using)
+    return len(countries)
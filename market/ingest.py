@@ -0,0 +1,301 @@
+"""
+Bulk ingest of trades and stock transactions: column-wise validation, COPY load
+
+JSON decimals are decoded as ``Decimal`` and prices converted to integer
+cents exactly. Validation goes column by column. Each value is classified
+in Python, one value at a time (its type and, for prices, the exact
+conversion to cents); the range and id existence checks then run on the
+whole column, and only failing rows are visited to record their errors.
+"""
+
+import json
+import logging
+import threading
+import time
+from decimal import Decimal
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from django.db import IntegrityError, connections, transaction
+
+from .models import Company, Product, Stock
+from .persistence import StepWriter
+
+try:
+    import numpy as np
+
+    HAS_NUMPY = True
+except ImportError:  # Membership checks fall back to sets
+    HAS_NUMPY = False
+
+logger = logging.getLogger(__name__)
+
+MAX_ROWS = 100000
+MAX_PRICE_CENTS = 10 ** 10  # DecimalField(max_digits=10, decimal_places=2)
+MAX_INTEGER = 2147483647  # PositiveIntegerField
+
+REQUIRED = "This field is required."
+
+# Field -> kind, in the row tuple order used by StepWriter
+TRADE_FIELDS = (
+    ("seller", "company"),
+    ("buyer", "company"),
+    ("product", "product"),
+    ("quantity", "integer"),
+    ("price_per_unit", "price"),
+)
+TRANSACTION_FIELDS = (
+    ("stock", "stock"),
+    ("buyer", "company"),
+    ("seller", "optional_company"),
+    ("shares", "integer"),
+    ("price_per_share", "price"),
+)
+
+
+class IdCache:
+    """
+    Per-process cache of the primary keys of a model, for membership checks.
+    An id that is not in the cache triggers one reload, at most every
+    ``min_refresh`` seconds, so newly created rows are picked up.
+    """
+
+    def __init__(self, model, min_refresh: float = 1.0):
+        self.model = model
+        self.min_refresh = min_refresh
+        self.ids = None
+        self.loaded_at = 0.0
+        self.lock = threading.Lock()
+
+    def load(self):
+        ids = list(self.model.objects.values_list("pk", flat=True))
+        self.ids = np.array(sorted(ids), dtype=np.int64) if HAS_NUMPY else frozenset(ids)
+        self.loaded_at = time.monotonic()
+
+    def contains(self, ids: Sequence[int]):
+        """Boolean mask of which ``ids`` exist"""
+        with self.lock:
+            if self.ids is None:
+                self.load()
+            mask = self._lookup(ids)
+            if not all(mask) and time.monotonic() - self.loaded_at >= self.min_refresh:
+                self.load()
+                mask = self._lookup(ids)
+        return mask
+
+    def _lookup(self, ids):
+        if HAS_NUMPY:
+            return np.isin(np.asarray(ids, dtype=np.int64), self.ids).tolist()
+        return [pk in self.ids for pk in ids]
+
+
+_companies = IdCache(Company)
+caches = {
+    "company": _companies,
+    "optional_company": _companies,
+    "product": IdCache(Product),
+    "stock": IdCache(Stock),
+}
+
+
+def parse_rows(body: bytes) -> List:
+    """Decode a JSON array or newline-delimited JSON objects; JSON decimals become Decimal, exactly"""
+    text = body.decode("utf-8").strip()
+    if text.startswith("["):
+        rows = json.loads(text, parse_float=Decimal)
+    else:
+        rows = [json.loads(line, parse_float=Decimal) for line in text.splitlines() if line.strip()]
+    return rows
+
+
+# Per-value classification codes; the checks that follow work on whole columns
+VALID, MISSING, WRONG_TYPE, TOO_MANY_PLACES = 0, 1, 2, 3
+
+
+def _where(mask) -> List[int]:
+    """Row indices where ``mask`` is true"""
+    if HAS_NUMPY:
+        return np.flatnonzero(mask).tolist()
+    return [index for index, flag in enumerate(mask) if flag]
+
+
+def _reject(errors, field, indices, message):
+    """Record ``message`` for ``field`` of the rows in ``indices``; a row keeps its first error"""
+    for index in indices:
+        errors.setdefault(index, {}).setdefault(field, [message])
+
+
+def _int_codes(values) -> Tuple[list, list]:
+    """(classification codes, ints clamped to the int64-safe range with 0 for invalid values)"""
+    codes, numbers = [], []
+    for value in values:
+        if type(value) is int:
+            codes.append(VALID)
+            numbers.append(max(-MAX_INTEGER - 1, min(value, MAX_INTEGER + 1)))
+        else:
+            codes.append(MISSING if value is None else WRONG_TYPE)
+            numbers.append(0)
+    return codes, numbers
+
+
+def _validate_ids(values, kind, errors, field):
+    """Check one id column; returns the ids with invalid entries set to None"""
+    codes, ids = _int_codes(values)
+    if HAS_NUMPY:
+        codes, ids = np.asarray(codes), np.asarray(ids, dtype=np.int64)
+        missing = codes == MISSING
+        wrong = (codes == WRONG_TYPE) | ((codes == VALID) & (ids < 1))
+        ids = np.where(wrong, 0, ids)
+        candidates = _where(ids > 0)
+        ids = ids.tolist()
+    else:
+        missing = [code == MISSING for code in codes]
+        wrong = [code == WRONG_TYPE or (code == VALID and pk < 1) for code, pk in zip(codes, ids)]
+        ids = [0 if bad else pk for bad, pk in zip(wrong, ids)]
+        candidates = _where([pk > 0 for pk in ids])
+    if kind != "optional_company":
+        _reject(errors, field, _where(missing), REQUIRED)
+    for index in _where(wrong):
+        errors.setdefault(index, {})[field] = [
+            f"Incorrect type. Expected pk value, received {type(values[index]).__name__}."
+        ]
+
+    exists = caches[kind].contains([ids[index] for index in candidates])
+    for index, found in zip(candidates, exists):
+        if not found:
+            errors.setdefault(index, {})[field] = [f'Invalid pk "{values[index]}" - object does not exist.']
+            ids[index] = 0
+    return [pk or None for pk in ids]
+
+
+def _codes_equal(codes, code):
+    if HAS_NUMPY:
+        return np.asarray(codes) == code
+    return [value == code for value in codes]
+
+
+def _validate_integers(values, errors, field):
+    codes, numbers = _int_codes(values)
+    if HAS_NUMPY:
+        numbers = np.asarray(numbers, dtype=np.int64)
+        negative, too_big = numbers < 0, numbers > MAX_INTEGER
+    else:
+        negative, too_big = [n < 0 for n in numbers], [n > MAX_INTEGER for n in numbers]
+    _reject(errors, field, _where(_codes_equal(codes, MISSING)), REQUIRED)
+    _reject(errors, field, _where(_codes_equal(codes, WRONG_TYPE)), "A valid integer is required.")
+    _reject(errors, field, _where(negative), "Ensure this value is greater than or equal to 0.")
+    _reject(errors, field, _where(too_big), f"Ensure this value is less than or equal to {MAX_INTEGER}.")
+    return list(values)
+
+
+def _price_code(value) -> Tuple[int, int]:
+    """(classification code, price in cents clamped to +/-MAX_PRICE_CENTS) of one JSON value"""
+    if value is None:
+        return MISSING, 0
+    if type(value) is bool or not isinstance(value, (int, str, Decimal)):
+        return WRONG_TYPE, 0
+    try:
+        cents = Decimal(value).scaleb(2)
+    except ArithmeticError:  # Not a number, or an exponent out of range
+        return WRONG_TYPE, 0
+    if not cents.is_finite():
+        return WRONG_TYPE, 0
+    if abs(cents) >= MAX_PRICE_CENTS:
+        return VALID, MAX_PRICE_CENTS
+    if cents != cents.to_integral_value():
+        return TOO_MANY_PLACES, 0
+    return VALID, int(cents)
+
+
+def _validate_prices(values, errors, field):
+    """Convert a price column to integer cents, exactly, rejecting values a DecimalField(10, 2) would"""
+    codes, cents = zip(*map(_price_code, values)) if values else ((), ())
+    if HAS_NUMPY:
+        too_long = np.abs(np.asarray(cents, dtype=np.int64)) >= MAX_PRICE_CENTS
+    else:
+        too_long = [abs(cent) >= MAX_PRICE_CENTS for cent in cents]
+    _reject(errors, field, _where(_codes_equal(codes, MISSING)), REQUIRED)
+    _reject(errors, field, _where(_codes_equal(codes, WRONG_TYPE)), "A valid number is required.")
+    _reject(errors, field, _where(_codes_equal(codes, TOO_MANY_PLACES)),
+            "Ensure that there are no more than 2 decimal places.")
+    _reject(errors, field, _where(too_long), "Ensure that there are no more than 10 digits in total.")
+    return list(cents)
+
+
+def validate(rows: List, fields: Tuple) -> Tuple[List[Optional[tuple]], Dict[int, dict]]:
+    """
+    Validate decoded rows one column at a time. Returns the row tuples (None
+    for invalid rows) and {row index: {field: [errors]}}.
+    """
+    errors: Dict[int, dict] = {}
+    records, not_objects = [], []
+    for index, row in enumerate(rows):
+        if isinstance(row, dict):
+            records.append(row)
+        else:
+            not_objects.append(index)
+            records.append({})
+
+    columns = []
+    for field, kind in fields:
+        values = [record.get(field) for record in records]
+        if kind == "integer":
+            columns.append(_validate_integers(values, errors, field))
+        elif kind == "price":
+            columns.append(_validate_prices(values, errors, field))
+        else:
+            columns.append(_validate_ids(values, kind, errors, field))
+    for index in not_objects:
+        errors[index] = {"non_field_errors": ["Invalid data. Expected a dictionary."]}
+
+    tuples = [None if index in errors else row for index, row in enumerate(zip(*columns))]
+    return tuples, errors
+
+
+def _load(tuples: List[Optional[tuple]], fields: Tuple, batch_size: int) -> Tuple[list, StepWriter]:
+    """
+    Load the valid rows in one transaction; returns [(row index, row)] and the writer.
+    Foreign keys are checked before the transaction ends, so a referenced row
+    deleted since the id caches were loaded raises ``IntegrityError`` here,
+    even inside an outer transaction.
+    """
+    valid = [(index, row) for index, row in enumerate(tuples) if row is not None]
+    writer = StepWriter(batch_size=batch_size)
+    if fields is TRADE_FIELDS:
+        writer.add_trades(row for _index, row in valid)
+    else:
+        writer.add_transactions(row for _index, row in valid)
+    if valid:
+        with transaction.atomic(using=writer.using):
+            writer.flush()
+            connections[writer.using].check_constraints()
+    return valid, writer
+
+
+def ingest(rows: List, fields: Tuple, batch_size: int = 5000) -> dict:
+    """
+    Validate and load trades (``TRADE_FIELDS``) or stock transactions
+    (``TRANSACTION_FIELDS``) in one transaction. Stock transactions are
+    settled like simulated ones; rows the stocks cannot cover are reported.
+    """
+    started = time.perf_counter()
+    tuples, errors = validate(rows, fields)
+    try:
+        valid, writer = _load(tuples, fields, batch_size)
+    except IntegrityError:
+        # An id the caches still held was deleted: reload them and report those rows
+        logger.info("Bulk ingest referenced deleted rows; reloading the id caches")
+        for cache in set(caches.values()):
+            with cache.lock:
+                cache.load()
+        tuples, errors = validate(rows, fields)
+        valid, writer = _load(tuples, fields, batch_size)
+
+    for position in writer.rejected_indices:
+        errors[valid[position][0]] = {"shares": ["Not enough available shares for this stock."]}
+
+    return {
+        "accepted": len(rows) - len(errors),
+        "rejected": len(errors),
+        "elapsed": round(time.perf_counter() - started, 4),
+        "errors": [{"row": index, "errors": errors[index]} for index in sorted(errors)],
+    }
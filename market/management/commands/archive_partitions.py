@@ -0,0 +1,95 @@
+"""
+Retention for the market trade tables: detach, export and drop old monthly partitions
+
+Archived months are recorded (market.ArchivedPartition). Afterwards
+rebuild_holdings refuses to run, and candle rebuilds keep the bars of the
+archived months instead of recomputing them from rows that are gone.
+"""
+from django.core.management.base import BaseCommand, CommandError
+from market.partitions import (
+    PARTITIONED_TABLES,
+    archive_partition,
+    is_partitioned,
+    ensure_partitions,
+    list_partitions,
+    month_start,
+    oldest_default_row,
+)
+from datetime import datetime, timezone
+
+
+class Command(BaseCommand):
+    help = 'Detach and export Trade/StockTransaction partitions older than the retention window'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--retention-months',
+            type=int,
+            default=12,
+            help='Keep this many months of history online (default: 12)'
+        )
+
+        parser.add_argument(
+            '--export-dir',
+            type=str,
+            help='Directory to export detached partitions to as gzipped CSV'
+        )
+
+        parser.add_argument(
+            '--keep-tables',
+            action='store_true',
+            help='Leave detached partitions in the database instead of dropping them'
+        )
+
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Only list the partitions that would be archived'
+        )
+
+    def handle(self, *args, **options):
+        if options['retention_months'] < 1:
+            raise CommandError('--retention-months must be at least 1')
+        if not options['export_dir'] and not options['keep_tables'] and not options['dry_run']:
+            raise CommandError(
+                'Refusing to drop partitions without exporting them; '
+                'pass --export-dir or --keep-tables'
+            )
+
+        today = datetime.now(timezone.utc).date()
+        cutoff = month_start(today, -options['retention_months'])
+        archived = 0
+
+        for table in PARTITIONED_TABLES:
+            if not is_partitioned(table):
+                self.stdout.write(self.style.WARNING(f'{table} is not partitioned, skipping'))
+                continue
+
+            # Expired rows caught by the default partition get their monthly
+            # partitions first, so they are archived with the rest
+            oldest = oldest_default_row(table)
+            if oldest and oldest < cutoff:
+                if options['dry_run']:
+                    self.stdout.write(f'  Would move {table}_default rows back to {oldest} into monthly partitions')
+                else:
+                    ensure_partitions(since=oldest)
+
+            for name, month in list_partitions(table):
+                if month is None or month >= cutoff:
+                    continue
+                if options['dry_run']:
+                    self.stdout.write(f'  Would archive {name}')
+                    continue
+
+                path = archive_partition(
+                    table,
+                    name,
+                    options['export_dir'],
+                    drop=not options['keep_tables'],
+                )
+                archived += 1
+                self.stdout.write(f'  Archived {name}' + (f' -> {path}' if path else ''))
+
+        self.stdout.write(
+            self.style.SUCCESS(f'Archived {archived} partitions older than {cutoff}.')
+        )
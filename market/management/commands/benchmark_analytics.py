@@ -0,0 +1,145 @@
+"""
+Benchmark the stock and product analytics endpoints over a year of simulated history
+"""
+from datetime import timedelta
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.utils import timezone
+from rest_framework.test import APIRequestFactory, force_authenticate
+from market.candles import rebuild_candles
+from market.models import Company, Product, Stock, Candle, ProductCandle
+from market.views import ProductAnalyticsView, StockAnalyticsView
+import random
+import time
+
+# Random-walk fills, one every `step` seconds, ending now
+HISTORY_SQL = """
+    INSERT INTO {table} ({key}, buyer_id, seller_id, {quantity}, {price}, "timestamp")
+    SELECT %(key)s, %(buyer)s, %(seller)s, 1 + (random() * 500)::int,
+           round((100 * exp(SUM((random() - 0.5) * 0.002) OVER (ORDER BY n)))::numeric, 2),
+           %(end)s - n * %(step)s
+    FROM generate_series(1, %(rows)s) AS n
+"""
+
+WINDOWS = [
+    ('1 hour', timedelta(hours=1)),
+    ('1 day', timedelta(days=1)),
+    ('1 week', timedelta(weeks=1)),
+    ('30 days', timedelta(days=30)),
+    ('1 year', timedelta(days=365)),
+]
+
+BUDGET_MS = 100
+
+
+class Command(BaseCommand):
+    help = 'Benchmark analytics response times over a year of history (rolled back afterwards)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days',
+            type=int,
+            default=365,
+            help='Days of history to generate (default: 365)'
+        )
+
+        parser.add_argument(
+            '--step',
+            type=int,
+            default=60,
+            help='Seconds between generated fills (default: 60)'
+        )
+
+        parser.add_argument(
+            '--requests',
+            type=int,
+            default=50,
+            help='Requests per window size and endpoint (default: 50)'
+        )
+
+        parser.add_argument(
+            '--seed',
+            type=int,
+            default=42,
+            help='Random seed for the request windows (default: 42)'
+        )
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            self.stderr.write('The analytics benchmark requires PostgreSQL.')
+            return
+
+        # Everything is generated inside a transaction that is rolled back
+        with transaction.atomic():
+            self.run(options)
+            transaction.set_rollback(True)
+
+    def run(self, options):
+        end = timezone.now()
+        rows = options['days'] * 86400 // options['step']
+        buyer = Company.objects.create(name='Benchmark buyer', country='Benchmark')
+        seller = Company.objects.create(name='Benchmark seller', country='Benchmark')
+        stock = Stock.objects.create(company=seller, price=100)
+        product = Product.objects.create(company=seller, name='Benchmark product', price=100)
+        user = get_user_model().objects.create(username='analytics-benchmark', email='analytics-benchmark@example.com')
+
+        started = time.perf_counter()
+        with connection.cursor() as cursor:
+            for table, key, quantity, price, key_id in (
+                ('market_stocktransaction', 'stock_id', 'shares', 'price_per_share', stock.pk),
+                ('market_trade', 'product_id', 'quantity', 'price_per_unit', product.pk),
+            ):
+                cursor.execute(
+                    HISTORY_SQL.format(table=table, key=key, quantity=quantity, price=price),
+                    {
+                        'key': key_id,
+                        'buyer': buyer.pk,
+                        'seller': seller.pk,
+                        'end': end,
+                        'step': timedelta(seconds=options['step']),
+                        'rows': rows,
+                    },
+                )
+        rebuild_candles(Candle, keys=[stock.pk])
+        rebuild_candles(ProductCandle, keys=[product.pk])
+        self.stdout.write(
+            f'Generated {rows:,} transactions and {rows:,} trades over {options["days"]} days '
+            f'in {time.perf_counter() - started:.1f}s'
+        )
+
+        rng = random.Random(options['seed'])
+        factory = APIRequestFactory()
+        worst = 0.0
+        for name, view, pk in (
+            ('stock', StockAnalyticsView.as_view(), stock.pk),
+            ('product', ProductAnalyticsView.as_view(), product.pk),
+        ):
+            for label, span in WINDOWS:
+                latencies = []
+                for i in range(options['requests']):
+                    window_end = end - timedelta(seconds=rng.uniform(0, max(0, options['days'] * 86400 - span.total_seconds())))
+                    params = {'from': (window_end - span).isoformat(), 'to': window_end.isoformat()}
+                    if i % 2:
+                        params['window'] = 20
+                    request = factory.get(f'/market/{name}s/{pk}/analytics/', params)
+                    force_authenticate(request, user)
+
+                    t0 = time.perf_counter()
+                    response = view(request, pk=pk)
+                    response.render()
+                    latencies.append((time.perf_counter() - t0) * 1000)
+                    assert response.status_code == 200, response.content
+
+                latencies.sort()
+                p50 = latencies[len(latencies) // 2]
+                p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+                worst = max(worst, latencies[-1])
+                self.stdout.write(
+                    f'{name:<8} {label:<8} p50 {p50:6.1f}ms  p99 {p99:6.1f}ms  max {latencies[-1]:6.1f}ms'
+                )
+
+        if worst < BUDGET_MS:
+            self.stdout.write(self.style.SUCCESS(f'All responses under {BUDGET_MS}ms (max {worst:.1f}ms)'))
+        else:
+            self.stdout.write(self.style.WARNING(f'Slowest response {worst:.1f}ms exceeds {BUDGET_MS}ms'))
@@ -0,0 +1,124 @@
+"""
+Benchmark the in-memory matching engine: orders/sec and match latency percentiles
+
+``--prices`` compares the integer-cent price path used by the simulator with
+the former Decimal one: each order's limit price is derived from the book's
+last price (a +/-2% step) and then matched, so both the price arithmetic and
+the comparisons inside the books are measured.
+"""
+from django.core.management.base import BaseCommand
+from market.orderbook import BUY, SELL, Exchange
+from market.prices import scale
+from decimal import Decimal
+import random
+import time
+
+CENT = Decimal("0.01")
+
+
+def cents_price(rng, reference):
+    return scale(reference, rng.randint(9800, 10200))
+
+
+def decimal_price(rng, reference):
+    return (reference * Decimal(rng.uniform(0.98, 1.02))).quantize(CENT)
+
+
+# --prices -> (opening price, next limit price from the reference price)
+PRICE_MODELS = {
+    'cents': (10000, cents_price),
+    'decimal': (Decimal('100.00'), decimal_price),
+}
+
+
+class Command(BaseCommand):
+    help = 'Benchmark order book throughput and match latency (no database access)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--orders',
+            type=int,
+            default=200000,
+            help='Number of orders to submit (default: 200000)'
+        )
+
+        parser.add_argument(
+            '--stocks',
+            type=int,
+            default=100,
+            help='Number of order books to spread orders over (default: 100)'
+        )
+
+        parser.add_argument(
+            '--seed',
+            type=int,
+            default=42,
+            help='Random seed for the generated order flow (default: 42)'
+        )
+
+        parser.add_argument(
+            '--prices',
+            choices=[*PRICE_MODELS, 'both'],
+            default='both',
+            help='Price representation: integer cents, Decimal, or both to compare (default: both)'
+        )
+
+    def handle(self, *args, **options):
+        models = list(PRICE_MODELS) if options['prices'] == 'both' else [options['prices']]
+        throughput = {}
+        for model in models:
+            self.stdout.write(f'== {model} prices')
+            throughput[model] = self.run(options, *PRICE_MODELS[model])
+        if len(throughput) == 2:
+            self.stdout.write(
+                self.style.SUCCESS(
+                    f'Integer cents vs Decimal: {throughput["cents"] / throughput["decimal"]:.2f}x'
+                )
+            )
+
+    def run(self, options, opening, next_price):
+        order_count = options['orders']
+        rng = random.Random(options['seed'])
+        exchange = Exchange()
+
+        # Pre-generate everything but the prices; each limit price depends on
+        # the book's last fill, so generating it is part of the timed loop
+        flow = [
+            (
+                rng.randrange(options['stocks']),
+                BUY if rng.random() < 0.5 else SELL,
+                rng.randrange(1000),
+                rng.randint(1, 500),
+            )
+            for _ in range(order_count)
+        ]
+
+        latencies = []
+        fill_count = 0
+        clock = time.perf_counter_ns
+        started = clock()
+        for stock_id, side, company_id, quantity in flow:
+            t0 = clock()
+            book = exchange.book(stock_id)
+            price = next_price(rng, book.last_price or opening)
+            fill_count += len(exchange.submit(stock_id, side, company_id, quantity, price))
+            latencies.append(clock() - t0)
+        elapsed = (clock() - started) / 1e9
+
+        latencies.sort()
+
+        def percentile(p):
+            return latencies[min(len(latencies) - 1, int(len(latencies) * p))] / 1000
+
+        resting = sum(len(book) for book in exchange.books())
+        self.stdout.write(f'Orders:        {order_count}')
+        self.stdout.write(f'Fills:         {fill_count}')
+        self.stdout.write(f'Resting:       {resting}')
+        self.stdout.write(f'Elapsed:       {elapsed:.3f}s')
+        self.stdout.write(
+            self.style.SUCCESS(f'Throughput:    {order_count / elapsed:,.0f} orders/sec')
+        )
+        for label, p in (('p50', 0.50), ('p90', 0.90), ('p99', 0.99), ('p99.9', 0.999)):
+            self.stdout.write(f'Latency {label:<6} {percentile(p):.1f}us')
+        self.stdout.write(f'Latency max    {latencies[-1] / 1000:.1f}us')
+        return order_count / elapsed
@@ -0,0 +1,115 @@
+"""
+Benchmark a price model on synthetic stocks: per-tick latency and shock correlations
+"""
+from django.core.management.base import BaseCommand, CommandError
+from market.price_models import HAS_NUMPY, PRICE_MODELS, CorrelatedGBM, country_loadings
+from market.simulation import VectorizedMarket
+import time
+
+
+class Command(BaseCommand):
+    help = 'Time one-tick steps of a price model (and a whole vectorized market tick) without the database'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--model',
+            choices=list(PRICE_MODELS),
+            default='gbm',
+            help='Price model to benchmark (default: gbm)'
+        )
+
+        parser.add_argument(
+            '--stocks',
+            type=int,
+            default=10000,
+            help='Number of synthetic stocks (default: 10000)'
+        )
+
+        parser.add_argument(
+            '--countries',
+            type=int,
+            default=20,
+            help='Number of countries the stocks are spread over (default: 20)'
+        )
+
+        parser.add_argument(
+            '--ticks',
+            type=int,
+            default=2000,
+            help='Number of one-tick steps to time (default: 2000)'
+        )
+
+        parser.add_argument(
+            '--seed',
+            type=int,
+            default=42,
+            help='Random seed (default: 42)'
+        )
+
+    def handle(self, *args, **options):
+        if not HAS_NUMPY:
+            raise CommandError('NumPy is required for price models (pip install numpy)')
+        import numpy as np
+
+        n = options['stocks']
+        rng = np.random.default_rng(options['seed'])
+        countries = [f'C{i % options["countries"]}' for i in range(n)]
+        prices = rng.integers(1000, 100000, size=n)
+
+        def build():
+            if options['model'] == 'gbm':
+                _names, loadings, idiosyncratic = country_loadings(countries)
+                return CorrelatedGBM(prices, rng, loadings=loadings, idiosyncratic=idiosyncratic)
+            return PRICE_MODELS[options['model']](prices, rng)
+
+        model = build()
+        self.report('Price model tick', self.time_ticks(lambda: model.path(1), options['ticks']))
+
+        market = VectorizedMarket(
+            company_ids=list(range(1, n + 1)),
+            product_ids=[],
+            product_prices=[],
+            stock_ids=list(range(1, n + 1)),
+            stock_prices=prices,
+            stock_available=[10 ** 12] * n,
+            seed=options['seed'],
+            stock_model=build(),
+        )
+        self.report('Market tick', self.time_ticks(lambda: market.run(1), options['ticks']))
+
+        if options['model'] == 'gbm':
+            self.check_correlation(build(), countries, np)
+
+    def time_ticks(self, step, ticks):
+        step()  # Warm up
+        clock = time.perf_counter_ns
+        latencies = []
+        for _ in range(ticks):
+            t0 = clock()
+            step()
+            latencies.append(clock() - t0)
+        latencies.sort()
+        return latencies
+
+    def report(self, label, latencies):
+        def percentile(p):
+            return latencies[min(len(latencies) - 1, int(len(latencies) * p))] / 1000
+
+        mean = sum(latencies) / len(latencies) / 1000
+        self.stdout.write(
+            self.style.SUCCESS(f'{label}: {1e6 / mean:,.0f} ticks/sec')
+            + f' (mean {mean:.0f}us, p50 {percentile(0.5):.0f}us, p99 {percentile(0.99):.0f}us)'
+        )
+
+    def check_correlation(self, model, countries, np):
+        """Compare realized shock correlations with the ones implied by the loadings"""
+        log_returns = np.diff(np.log(model.path(2001).astype(np.float64)), axis=0)
+        same = [i for i in range(1, len(countries)) if countries[i] == countries[0]][:1]
+        other = [i for i in range(1, len(countries)) if countries[i] != countries[0]][:1]
+        for label, pair in (('same country', same), ('cross country', other)):
+            if pair:
+                j = pair[0]
+                realized = np.corrcoef(log_returns[:, 0], log_returns[:, j])[0, 1]
+                self.stdout.write(
+                    f'Correlation {label}: realized {realized:.3f}, implied {model.correlation(0, j):.3f}'
+                )
@@ -0,0 +1,35 @@
+"""
+Create monthly partitions for the market trade tables ahead of time
+"""
+from datetime import date
+from django.core.management.base import BaseCommand
+from market.partitions import ensure_partitions
+
+
+class Command(BaseCommand):
+    help = 'Create monthly Trade/StockTransaction partitions ahead of time (PostgreSQL)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--months-ahead',
+            type=int,
+            default=3,
+            help='How many future months to create partitions for (default: 3)'
+        )
+
+        parser.add_argument(
+            '--since',
+            type=date.fromisoformat,
+            default=None,
+            help='Also create partitions back to the month of this date (YYYY-MM-DD), e.g. before loading history'
+        )
+
+    def handle(self, *args, **options):
+        names = ensure_partitions(months_ahead=options['months_ahead'], since=options['since'])
+        if not names:
+            self.stdout.write(self.style.WARNING('No partitioned tables found.'))
+            return
+
+        for name in names:
+            self.stdout.write(f'  - {name}')
+        self.stdout.write(self.style.SUCCESS(f'{len(names)} partitions are in place.'))
@@ -0,0 +1,103 @@
+"""
+Export Trade and StockTransaction history as memory-mappable NumPy columns
+"""
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from market.export import CHUNK_SIZE, DATASETS, HAS_NUMPY, export_range, next_start
+from datetime import timedelta, timezone as dt_timezone
+import os
+import time
+
+
+class Command(BaseCommand):
+    help = 'Export market history to one .npy file per column (load with numpy.load(..., mmap_mode="r"))'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--output-dir',
+            required=True,
+            help='Directory to write <dataset>/<from>--<to>/<column>.npy chunks to'
+        )
+
+        parser.add_argument(
+            '--dataset',
+            choices=[*DATASETS, 'all'],
+            default='all',
+            help='Dataset to export (default: all)'
+        )
+
+        parser.add_argument(
+            '--from',
+            dest='start',
+            help='Start of the range (ISO 8601, inclusive; default: the oldest row)'
+        )
+
+        parser.add_argument(
+            '--to',
+            dest='end',
+            help='End of the range (ISO 8601, exclusive; default: now minus --lag)'
+        )
+
+        parser.add_argument(
+            '--incremental',
+            action='store_true',
+            help='Continue from the end of the last exported chunk in the manifest'
+        )
+
+        parser.add_argument(
+            '--lag',
+            type=int,
+            default=60,
+            help='Seconds to stay behind now so in-flight transactions are not missed (default: 60)'
+        )
+
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=CHUNK_SIZE,
+            help=f'Rows fetched from the server-side cursor at a time (default: {CHUNK_SIZE})'
+        )
+
+    def parse(self, value, name):
+        if not value:
+            return None
+        parsed = parse_datetime(value)
+        if parsed is None:
+            raise CommandError(f'--{name} must be an ISO 8601 datetime')
+        if timezone.is_naive(parsed):
+            parsed = timezone.make_aware(parsed, dt_timezone.utc)
+        return parsed
+
+    def handle(self, *args, **options):
+        if not HAS_NUMPY:
+            raise CommandError('NumPy is required for exports (pip install numpy)')
+        if options['incremental'] and options['start']:
+            raise CommandError('Use either --incremental or --from, not both')
+
+        start = self.parse(options['start'], 'from')
+        end = self.parse(options['end'], 'to') or timezone.now() - timedelta(seconds=options['lag'])
+        datasets = list(DATASETS) if options['dataset'] == 'all' else [options['dataset']]
+
+        for dataset in datasets:
+            chunk_start = start
+            if chunk_start is None:
+                chunk_start = next_start(
+                    dataset, options['output_dir'] if options['incremental'] else None
+                )
+            if chunk_start is None or chunk_start >= end:
+                self.stdout.write(f'{dataset}: nothing to export')
+                continue
+
+            started = time.perf_counter()
+            entry = export_range(
+                dataset, options['output_dir'], chunk_start, end, options['chunk_size']
+            )
+            elapsed = time.perf_counter() - started
+            self.stdout.write(
+                self.style.SUCCESS(
+                    f'{dataset}: {entry["rows"]:,} rows [{entry["from"]}, {entry["to"]}) -> '
+                    f'{os.path.join(options["output_dir"], dataset, entry["path"])} '
+                    f'in {elapsed:.2f}s'
+                )
+            )
@@ -0,0 +1,27 @@
+"""
+Recompute every company's share positions from the stock transaction history
+
+Positions sum the whole history, so once archive_partitions has archived
+stock transaction months the command refuses to run: a rebuild from the
+rows left online would silently drop the archived trades from every
+position. The holdings maintained by the writers stay correct regardless.
+"""
+from django.core.management.base import BaseCommand, CommandError
+from market.holdings import rebuild_holdings
+from market.partitions import HistoryArchived
+import time
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the holdings table from all stock transactions'
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        try:
+            positions = rebuild_holdings()
+        except HistoryArchived as error:
+            raise CommandError(str(error))
+        elapsed = time.perf_counter() - started
+        self.stdout.write(
+            self.style.SUCCESS(f'Rebuilt {positions} positions in {elapsed:.2f}s.')
+        )
@@ -0,0 +1,16 @@
+"""
+Recompute the market and country indices from the current stock table
+"""
+from django.core.management.base import BaseCommand
+from market.indices import rebuild_indices
+from market.models import MarketIndex
+
+
+class Command(BaseCommand):
+    help = 'Rebuild market index caps (keeps index levels continuous)'
+
+    def handle(self, *args, **options):
+        count = rebuild_indices()
+        for index in MarketIndex.objects.order_by('country'):
+            self.stdout.write(f'  {index.name}: {index.level:,.2f}')
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {count} indices.'))
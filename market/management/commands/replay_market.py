@@ -0,0 +1,61 @@
+"""
+Re-apply a simulation event log (see simulate_market --event-log) as fast as possible
+"""
+from django.core.management.base import BaseCommand, CommandError
+from market.eventlog import replay
+from market.models import Company
+from market.persistence import StepWriter
+import os
+
+
+class Command(BaseCommand):
+    help = 'Replay a market event log into a fresh database'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Event log written by simulate_market --event-log')
+
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=5000,
+            help='Rows per COPY / bulk insert statement (default: 5000)'
+        )
+
+        parser.add_argument(
+            '--skip-reference',
+            action='store_true',
+            help="Don't create the logged companies, products and stocks (they already exist)"
+        )
+
+    def handle(self, *args, **options):
+        path = options['path']
+        if not os.path.exists(path):
+            raise CommandError(f'No event log at {path}')
+        load_reference = not options['skip_reference']
+        if load_reference and Company.objects.exists():
+            raise CommandError(
+                'The database already has companies; replay into a fresh database '
+                'or pass --skip-reference to replay the steps onto the existing ones.'
+            )
+
+        writer = StepWriter(batch_size=options['batch_size'])
+        stats = replay(path, writer, load_reference_data=load_reference)
+
+        rows = stats['trades'] + stats['transactions']
+        self.stdout.write(f'Seed:          {stats["seed"]}')
+        self.stdout.write(f'Steps:         {stats["steps"]}')
+        self.stdout.write(f'Trades:        {stats["trades"]}')
+        self.stdout.write(f'Transactions:  {stats["transactions"]}')
+        if writer.rejected:
+            self.stdout.write(
+                self.style.WARNING(
+                    f'{writer.rejected} transactions were rejected: the database '
+                    f'did not start from the logged state'
+                )
+            )
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Replayed {rows} rows in {writer.elapsed:.3f}s '
+                f'({rows / writer.elapsed if writer.elapsed else 0:,.0f} rows/sec)'
+            )
+        )
@@ -0,0 +1,83 @@
+"""
+Batch job: net company-to-company trades into settlement batches, one per window
+"""
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from market.candles import INTERVALS, bucket_start
+from market.settlements import pending_windows, settle_window
+from datetime import timedelta, timezone as dt_timezone
+import time
+
+
+class Command(BaseCommand):
+    help = 'Net trades between every company pair into one settlement per pair and window'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--window',
+            choices=list(INTERVALS),
+            default='1d',
+            help='Settlement window width (default: 1d)'
+        )
+
+        parser.add_argument(
+            '--from',
+            dest='start',
+            help='Start of the first window (ISO 8601; default: the end of the last batch)'
+        )
+
+        parser.add_argument(
+            '--to',
+            dest='end',
+            help='Settle windows that end by then (ISO 8601; default: now minus --lag)'
+        )
+
+        parser.add_argument(
+            '--lag',
+            type=int,
+            default=60,
+            help='Seconds to stay behind now so in-flight trades are not missed (default: 60)'
+        )
+
+        parser.add_argument(
+            '--replace',
+            action='store_true',
+            help='Recompute windows that already have a batch instead of skipping them'
+        )
+
+    def parse(self, value, name):
+        if not value:
+            return None
+        parsed = parse_datetime(value)
+        if parsed is None:
+            raise CommandError(f'--{name} must be an ISO 8601 datetime')
+        if timezone.is_naive(parsed):
+            parsed = timezone.make_aware(parsed, dt_timezone.utc)
+        return parsed
+
+    def handle(self, *args, **options):
+        seconds = INTERVALS[options['window']]
+        start = self.parse(options['start'], 'from')
+        if start is not None:
+            start = bucket_start(start, seconds)
+        end = self.parse(options['end'], 'to') or timezone.now() - timedelta(seconds=options['lag'])
+
+        settled = 0
+        for window_start, window_end in pending_windows(seconds, end, start):
+            started = time.perf_counter()
+            try:
+                batch = settle_window(window_start, window_end, replace=options['replace'])
+            except ValueError as e:
+                raise CommandError(str(e))
+            if batch is None:
+                self.stdout.write(f'[{window_start.isoformat()}, {window_end.isoformat()}): already settled')
+                continue
+            settled += 1
+            self.stdout.write(
+                f'[{window_start.isoformat()}, {window_end.isoformat()}): '
+                f'{batch.trade_count:,} trades -> {batch.pair_count:,} settlements, '
+                f'gross {batch.gross_amount:,} net {batch.net_amount:,} '
+                f'in {time.perf_counter() - started:.2f}s'
+            )
+        self.stdout.write(self.style.SUCCESS(f'Settled {settled} windows.'))
@@ -1,51 +1,387 @@
-from django.core.management.base import BaseCommand
-from market.models import Company, Product, Stock, Trade, StockTransaction
-from django.utils import timezone
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.db.models import F
+from market.daemon import MarketDaemon, SyncFailed
+from market.eventlog import EventLog
+from market.models import Company, Product, Stock
+from market.orderbook import BUY, SELL, exchange
+from market.persistence import StepWriter
+from market.price_models import PRICE_MODELS, price_model
+from market.prices import from_cents, scale, to_cents
+from market.simulation import HAS_NUMPY, VectorizedMarket
+import multiprocessing
 import random
+import time
+
+
+def simulate_shard(shard, workers, options):
+    """Process pool entry point: simulate one shard of the market"""
+    try:
+        return Command().run_step(options, shard=shard, workers=workers)
+    finally:
+        connections.close_all()
+
 
 class Command(BaseCommand):
     help = 'Simulate the market: company trades and stock transactions.'
 
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--orders',
+            type=int,
+            default=500,
+            help='Number of stock orders to send to the order books per run (default: 500)'
+        )
+
+        parser.add_argument(
+            '--vectorized',
+            action='store_true',
+            help='Generate whole tick batches for every stock and product with NumPy'
+        )
+
+        parser.add_argument(
+            '--ticks',
+            type=int,
+            default=100,
+            help='Number of ticks to simulate in vectorized mode (default: 100)'
+        )
+
+        parser.add_argument(
+            '--price-model',
+            choices=list(PRICE_MODELS),
+            default=None,
+            help='Stock price model: "walk" (independent +/-2%% steps) or "gbm" (correlated '
+                 'geometric Brownian motion, loaded on the market and each company\'s country). '
+                 'Default: random walk in --vectorized mode, book prices otherwise'
+        )
+
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=5000,
+            help='Rows per COPY / bulk insert statement (default: 5000)'
+        )
+
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=1,
+            help='Simulate disjoint stock shards in N worker processes (default: 1)'
+        )
+
+        parser.add_argument(
+            '--seed',
+            type=int,
+            default=None,
+            help='Seed the simulation so the generated workload is reproducible (shard k uses seed + k)'
+        )
+
+        parser.add_argument(
+            '--event-log',
+            default=None,
+            help='Append every committed step to this event log (see replay_market)'
+        )
+
+        parser.add_argument(
+            '--daemon',
+            action='store_true',
+            help='Keep running: tick every --tick-ms against in-memory state until SIGTERM'
+        )
+
+        parser.add_argument(
+            '--tick-ms',
+            type=int,
+            default=1000,
+            help='Milliseconds between ticks in daemon mode (default: 1000)'
+        )
+
+        parser.add_argument(
+            '--max-pending-ticks',
+            type=int,
+            default=100,
+            help='Ticks that may wait for the database before the tick loop blocks (default: 100)'
+        )
+
+        parser.add_argument(
+            '--report-seconds',
+            type=float,
+            default=10.0,
+            help='Seconds between tick lag reports in daemon mode (default: 10)'
+        )
+
     def handle(self, *args, **options):
-        companies = list(Company.objects.all())
-        products = list(Product.objects.all())
-        stocks = list(Stock.objects.all())
-        if not companies or not products or not stocks:
+        if options['daemon']:
+            if options['workers'] > 1:
+                raise CommandError('--daemon runs a single tick loop; --workers is not supported')
+            self.run_daemon(options)
+            return
+
+        workers = options['workers']
+        if options.get('event_log'):
+            # Start the log (header and reference data) before any shard writes to it
+            EventLog(options['event_log'], seed=options.get('seed')).close()
+        started = time.perf_counter()
+        if workers > 1:
+            results = self.run_parallel(workers, options)
+        else:
+            results = [self.run_step(options)]
+        wall = time.perf_counter() - started
+
+        results = [result for result in results if result]
+        if not results:
             self.stdout.write(self.style.WARNING('Not enough data to simulate.'))
             return
 
-        # Simulate company-to-company trades
-        for _ in range(10):  # Simulate 10 trades per run
-            seller, buyer = random.sample(companies, 2)
-            product = random.choice(products)
-            quantity = random.randint(1, 100)
-            price_per_unit = float(product.price) * random.uniform(0.95, 1.05)
-            Trade.objects.create(
-                seller=seller,
-                buyer=buyer,
-                product=product,
-                quantity=quantity,
-                price_per_unit=price_per_unit,
-                timestamp=timezone.now()
+        trades = sum(result['trades'] for result in results)
+        transactions = sum(result['transactions'] for result in results)
+        rows = sum(result['rows'] for result in results)
+        elapsed = max(result['elapsed'] for result in results)
+        # Throughput over the whole run (wall clock, including generation and
+        # the process pool), not just the slowest shard's flush
+        rate = rows / wall if wall else 0.0
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Market simulation step completed ({trades} trades, '
+                f'{transactions} stock transactions, '
+                f'{rows} rows in {wall:.3f}s, {rate:,.0f} rows/sec'
+                f'{f" across {len(results)} shards" if workers > 1 else ""}; '
+                f'longest flush {elapsed:.3f}s).'
             )
+        )
+
+    def run_parallel(self, workers, options):
+        """
+        Simulate disjoint shards of stocks and products in a process pool.
+
+        Shard ``k`` owns every stock and product whose id is ``k`` modulo
+        ``workers``, so no two workers ever write the same Stock row. Each
+        worker commits its own shard.
+        """
+        # Forked workers must not share the parent's database connection
+        connections.close_all()
+        context = multiprocessing.get_context('fork')
+        with context.Pool(workers) as pool:
+            return pool.starmap(
+                simulate_shard, [(shard, workers, options) for shard in range(workers)]
+            )
+
+    def load_market(self, shard=0, workers=1):
+        """Companies plus the shard's products and stocks, in id order"""
+        # A fixed order keeps seeded runs reproducible
+        companies = list(Company.objects.order_by('pk'))
+        products = Product.objects.order_by('pk')
+        stocks = Stock.objects.select_related('company').order_by('pk')
+        if workers > 1:
+            products = products.annotate(shard=F('id') % workers).filter(shard=shard)
+            stocks = stocks.annotate(shard=F('id') % workers).filter(shard=shard)
+        return companies, list(products), list(stocks)
+
+    def run_step(self, options, shard=0, workers=1):
+        """Simulate and persist one step for a shard (the whole market if workers=1)"""
+        companies, products, stocks = self.load_market(shard, workers)
+        if len(companies) < 2 or not (products or stocks):
+            return None
 
-        # Simulate stock transactions
-        for _ in range(5):  # Simulate 5 stock trades per run
-            stock = random.choice(stocks)
-            buyer, seller = random.sample(companies, 2)
-            shares = random.randint(1, 1000)
-            price_per_share = float(stock.price) * random.uniform(0.98, 1.02)
-            if stock.available_shares >= shares:
-                StockTransaction.objects.create(
-                    stock=stock,
-                    buyer=buyer,
-                    seller=seller,
-                    shares=shares,
-                    price_per_share=price_per_share,
-                    timestamp=timezone.now()
+        # Each shard gets its own generator; forked workers would otherwise
+        # share the parent's random state
+        seed = options.get('seed')
+        self.rng = random.Random(None if seed is None else seed + shard)
+        event_log = None
+        if options.get('event_log'):
+            event_log = EventLog(options['event_log'], seed=seed)
+        writer = StepWriter(batch_size=options['batch_size'], event_log=event_log)
+
+        shard_seed = None if seed is None else seed + shard
+        model = self.price_model(options, stocks, shard_seed)
+        if options['vectorized']:
+            self.simulate_vectorized(
+                writer, companies, products, stocks, options['ticks'], seed=shard_seed, model=model
+            )
+        else:
+            self.simulate_trades(writer, companies, products)
+            if stocks:
+                self.simulate_order_flow(writer, companies, stocks, options['orders'], model)
+
+        trades, transactions = len(writer.trades), len(writer.transactions)
+        try:
+            writer.flush()
+        finally:
+            if event_log is not None:
+                event_log.close()
+        return {
+            'shard': shard,
+            'trades': trades,
+            'transactions': transactions,
+            'rows': writer.rows_written,
+            'elapsed': writer.elapsed,
+        }
+
+    def run_daemon(self, options):
+        """
+        Tick forever (until SIGTERM/SIGINT) against market state loaded once
+        and kept in memory; rows are synced to the database in the background.
+        """
+        if options['tick_ms'] < 1:
+            raise CommandError('--tick-ms must be at least 1')
+        companies, products, stocks = self.load_market()
+        if len(companies) < 2 or not (products or stocks):
+            self.stdout.write(self.style.WARNING('Not enough data to simulate.'))
+            return
+
+        seed = options.get('seed')
+        self.rng = random.Random(seed)
+        model = self.price_model(options, stocks, seed)
+        if options['vectorized']:
+            market = self.vectorized_market(companies, products, stocks, seed, model)
+
+            def generate(collector):
+                self.vectorized_tick(collector, market, stocks)
+        else:
+            def generate(collector):
+                self.simulate_trades(collector, companies, products)
+                if stocks:
+                    self.simulate_order_flow(collector, companies, stocks, options['orders'], model)
+
+        event_log = None
+        if options.get('event_log'):
+            event_log = EventLog(options['event_log'], seed=seed)
+        daemon = MarketDaemon(
+            generate,
+            tick_seconds=options['tick_ms'] / 1000,
+            batch_size=options['batch_size'],
+            max_pending=options['max_pending_ticks'],
+            report_seconds=options['report_seconds'],
+            report=self.stdout.write,
+            event_log=event_log,
+        )
+        self.stdout.write(
+            f'Market daemon started: {len(companies)} companies, {len(products)} products, '
+            f'{len(stocks)} stocks, one tick every {options["tick_ms"]}ms'
+        )
+        try:
+            daemon.run()
+        except SyncFailed as e:
+            raise CommandError(str(e))
+        finally:
+            if event_log is not None:
+                event_log.close()
+
+    def price_model(self, options, stocks, seed=None):
+        """The --price-model for the stocks, or None for the default behaviour"""
+        name = options.get('price_model')
+        if not name or not stocks:
+            return None
+        if not HAS_NUMPY:
+            raise CommandError('NumPy is required for --price-model (pip install numpy)')
+        import numpy as np
+
+        # A stream of its own: seeded like the market's generator, it would repeat its draws
+        return price_model(name, stocks, np.random.default_rng(np.random.SeedSequence(seed).spawn(1)[0]))
+
+    def simulate_trades(self, writer, companies, products, count=10):
+        """Simulate company-to-company trades (10 per step by default)"""
+        for _ in range(count if products else 0):
+            seller, buyer = self.rng.sample(companies, 2)
+            product = self.rng.choice(products)
+            quantity = self.rng.randint(1, 100)
+            price_per_unit = scale(to_cents(product.price), self.rng.randint(9500, 10500))
+            writer.add_trade(seller.id, buyer.id, product.id, quantity, price_per_unit)
+
+    def simulate_order_flow(self, writer, companies, stocks, order_count, model=None):
+        """
+        Send random limit orders around each stock's last price to the in-memory
+        order books and record the resulting fills as stock transactions.
+
+        With a price ``model``, the model moves every stock one tick per call
+        and orders are placed around the model's prices instead.
+        """
+        company_ids = [company.id for company in companies]
+        fair = {}
+        if model is not None:
+            fair = dict(zip((stock.id for stock in stocks), model.path(1)[-1].tolist()))
+
+        for _ in range(order_count):
+            stock = self.rng.choice(stocks)
+            book = exchange.book(stock.id)
+            reference = fair.get(stock.id) or book.last_price or to_cents(stock.price)
+            side = self.rng.choice((BUY, SELL))
+            price = scale(reference, self.rng.randint(9800, 10200))
+            # An order's fills never exceed its quantity, so capping it keeps every
+            # fill the book makes coverable; the writer re-checks the locked row
+            shares = min(self.rng.randint(1, 1000), stock.available_shares)
+            if not shares:
+                continue
+
+            for fill in exchange.submit(
+                stock.id, side, self.rng.choice(company_ids), shares, price
+            ):
+                # The price is tracked by the order book in cents; the writer
+                # refreshes stock.price from the settled row on flush
+                stock.available_shares -= fill.shares
+                writer.update_stock(stock)
+                writer.add_transaction(
+                    fill.stock_id, fill.buyer_id, fill.seller_id, fill.shares, fill.price
                 )
-                stock.available_shares -= shares
-                stock.price = price_per_share  # Update price to last transaction
-                stock.save()
 
-        self.stdout.write(self.style.SUCCESS('Market simulation step completed.'))
+    def vectorized_market(self, companies, products, stocks, seed=None, model=None):
+        if not HAS_NUMPY:
+            raise CommandError('NumPy is required for --vectorized runs (pip install numpy)')
+        return VectorizedMarket(
+            company_ids=[company.id for company in companies],
+            product_ids=[product.id for product in products],
+            product_prices=[to_cents(product.price) for product in products],
+            stock_ids=[stock.id for stock in stocks],
+            stock_prices=[to_cents(stock.price) for stock in stocks],
+            stock_available=[stock.available_shares for stock in stocks],
+            seed=seed,
+            stock_model=model,
+        )
+
+    def simulate_vectorized(self, writer, companies, products, stocks, ticks, seed=None, model=None):
+        """Simulate every product and stock for ``ticks`` ticks as array operations"""
+        market = self.vectorized_market(companies, products, stocks, seed, model)
+        self.add_batch(writer, stocks, market.run(ticks))
+
+    def vectorized_tick(self, writer, market, stocks):
+        """
+        One daemon tick of a vectorized market. The daemon refreshes the
+        tracked stocks from what the database settled, so the market's
+        arrays are reloaded from them before the tick.
+        """
+        market.update_stocks(
+            [to_cents(stock.price) for stock in stocks],
+            [stock.available_shares for stock in stocks],
+        )
+        self.add_batch(writer, stocks, market.run(1))
+
+    def add_batch(self, writer, stocks, batch):
+        """Add a vectorized SimulationBatch's rows to the writer"""
+        writer.add_trades(
+            zip(
+                batch.trade_seller.tolist(),
+                batch.trade_buyer.tolist(),
+                batch.trade_product.tolist(),
+                batch.trade_quantity.tolist(),
+                batch.trade_price.tolist(),
+            )
+        )
+        writer.add_transactions(
+            zip(
+                batch.tx_stock.tolist(),
+                batch.tx_buyer.tolist(),
+                batch.tx_seller.tolist(),
+                batch.tx_shares.tolist(),
+                batch.tx_price.tolist(),
+            )
+        )
+
+        # The stocks follow the batch until the flush settles them against the database
+        for stock, changed, price, available in zip(
+            stocks,
+            batch.stock_changed.tolist(),
+            batch.stock_prices.tolist(),
+            batch.stock_available.tolist(),
+        ):
+            if changed:
+                stock.price, stock.available_shares = from_cents(price), available
+                writer.update_stock(stock)
@@ -0,0 +1,117 @@
+# Generated by Django 5.2.1 on 2026-10-18 00:30
+
+from datetime import date, datetime, timezone as dt_timezone
+
+from django.db import migrations, models
+
+# The partitioning code is frozen here as it was when this migration was
+# written; market.partitions may change after it.
+
+
+def month_start(value, offset=0):
+    months = value.year * 12 + value.month - 1 + offset
+    return date(months // 12, months % 12 + 1, 1)
+
+
+def _bound(month):
+    return datetime(month.year, month.month, 1, tzinfo=dt_timezone.utc).isoformat()
+
+
+def create_partition(cursor, table, month):
+    name = f"{table}_p{month.year:04d}{month.month:02d}"
+    cursor.execute(
+        f"CREATE TABLE IF NOT EXISTS {name} PARTITION OF {table} "
+        f"FOR VALUES FROM (%s) TO (%s)",
+        [_bound(month), _bound(month_start(month, 1))],
+    )
+
+
+def partition_table(schema_editor, table, months_ahead=3):
+    """
+    Convert an existing table into a table partitioned by month on
+    "timestamp", keeping its columns, identity, indexes, foreign keys and rows.
+    The primary key becomes (id, timestamp) as PostgreSQL requires the
+    partition key to be part of every unique constraint.
+    """
+    legacy = f"{table}_legacy"
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint "
+            "WHERE conrelid = %s::regclass AND contype = 'f'",
+            [table],
+        )
+        foreign_keys = cursor.fetchall()
+        cursor.execute(
+            "SELECT indexname, indexdef FROM pg_indexes "
+            "WHERE tablename = %s AND indexname NOT LIKE %s",
+            [table, "%_pkey"],
+        )
+        indexes = cursor.fetchall()
+        cursor.execute(f'SELECT min("timestamp") FROM {table}')
+        oldest = cursor.fetchone()[0]
+
+        cursor.execute(f"ALTER TABLE {table} RENAME TO {legacy}")
+        cursor.execute(f"ALTER TABLE {legacy} RENAME CONSTRAINT {table}_pkey TO {legacy}_pkey")
+        for name, _ in foreign_keys:
+            cursor.execute(f"ALTER TABLE {legacy} DROP CONSTRAINT {name}")
+        for name, _ in indexes:
+            cursor.execute(f"DROP INDEX {name}")
+        cursor.execute(f"ALTER TABLE {legacy} ALTER COLUMN id DROP IDENTITY IF EXISTS")
+
+        cursor.execute(
+            f'CREATE TABLE {table} (LIKE {legacy} INCLUDING DEFAULTS, '
+            f'PRIMARY KEY (id, "timestamp")) PARTITION BY RANGE ("timestamp")'
+        )
+        cursor.execute(
+            f"ALTER TABLE {table} ALTER COLUMN id ADD GENERATED BY DEFAULT AS IDENTITY"
+        )
+        for name, definition in foreign_keys:
+            cursor.execute(f"ALTER TABLE {table} ADD CONSTRAINT {name} {definition}")
+        for _, definition in indexes:
+            cursor.execute(definition)
+
+        # Monthly partitions from the oldest row through the look-ahead window,
+        # plus a default partition so an unexpected timestamp never fails an insert
+        today = datetime.now(dt_timezone.utc).date()
+        month = month_start(oldest.date() if oldest else today)
+        last = month_start(today, months_ahead)
+        while month <= last:
+            create_partition(cursor, table, month)
+            month = month_start(month, 1)
+        cursor.execute(f"CREATE TABLE {table}_default PARTITION OF {table} DEFAULT")
+
+        cursor.execute(f"INSERT INTO {table} SELECT * FROM {legacy}")
+        # Check the copied rows' deferred foreign keys now rather than at commit
+        cursor.execute("SET CONSTRAINTS ALL IMMEDIATE")
+        cursor.execute(
+            f"SELECT setval(pg_get_serial_sequence(%s, 'id'), "
+            f"COALESCE((SELECT max(id) FROM {table}), 0) + 1, false)",
+            [table],
+        )
+        cursor.execute(f"DROP TABLE {legacy}")
+
+
+def partition_tables(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for model in ('Trade', 'StockTransaction'):
+        partition_table(schema_editor, apps.get_model('market', model)._meta.db_table)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('market', '0002_candle'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='stocktransaction',
+            index=models.Index(fields=['timestamp'], name='market_stocktx_ts_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='trade',
+            index=models.Index(fields=['timestamp'], name='market_trade_ts_idx'),
+        ),
+        migrations.RunPython(partition_tables, migrations.RunPython.noop),
+    ]
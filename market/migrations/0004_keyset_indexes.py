@@ -0,0 +1,53 @@
+# Generated by Django 5.2.1 on 2026-10-18 00:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('market', '0003_partition_trades_by_month'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='stocktransaction',
+            name='market_stocktx_ts_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='trade',
+            name='market_trade_ts_idx',
+        ),
+        migrations.AddIndex(
+            model_name='stocktransaction',
+            index=models.Index(fields=['timestamp', 'id'], name='market_stocktx_ts_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='stocktransaction',
+            index=models.Index(fields=['buyer', 'timestamp', 'id'], name='market_stocktx_buyer_ts_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='stocktransaction',
+            index=models.Index(fields=['seller', 'timestamp', 'id'], name='market_stocktx_seller_ts_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='stocktransaction',
+            index=models.Index(fields=['stock', 'timestamp', 'id'], name='market_stocktx_stock_ts_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='trade',
+            index=models.Index(fields=['timestamp', 'id'], name='market_trade_ts_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='trade',
+            index=models.Index(fields=['buyer', 'timestamp', 'id'], name='market_trade_buyer_ts_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='trade',
+            index=models.Index(fields=['seller', 'timestamp', 'id'], name='market_trade_seller_ts_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='trade',
+            index=models.Index(fields=['product', 'timestamp', 'id'], name='market_trade_product_ts_idx'),
+        ),
+    ]
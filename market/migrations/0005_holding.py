@@ -0,0 +1,27 @@
+# Generated by Django 5.2.1 on 2026-10-18 00:36
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('market', '0004_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Holding',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('shares', models.BigIntegerField(default=0)),
+                ('company', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='holdings', to='market.company')),
+                ('stock', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='holdings', to='market.stock')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['stock', 'shares'], name='market_holding_stock_idx')],
+                'constraints': [models.UniqueConstraint(fields=('company', 'stock'), name='market_holding_unique_position')],
+            },
+        ),
+    ]
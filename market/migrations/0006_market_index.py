@@ -0,0 +1,36 @@
+# Generated by Django 5.2.1 on 2026-10-18 00:39
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('market', '0005_holding'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MarketIndex',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('country', models.CharField(blank=True, max_length=100, unique=True)),
+                ('market_cap', models.DecimalField(decimal_places=2, default=0, max_digits=24)),
+                ('divisor', models.FloatField(default=1.0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='IndexLevel',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('timestamp', models.DateTimeField()),
+                ('level', models.FloatField()),
+                ('index', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='levels', to='market.marketindex')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['index', 'timestamp'], name='market_indexlevel_ts_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,80 @@
+# Generated by Django 5.2.1 on 2026-10-18 00:40
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+# Rebuilds every interval's bars of one candle table from the raw history,
+# frozen as it was when this migration was written
+REBUILD_SQL = """
+    INSERT INTO {table} ({key}, interval, bucket, open, high, low, close, volume, turnover)
+    SELECT {key}, interval, bucket,
+           (array_agg(price ORDER BY "timestamp", id))[1],
+           MAX(price), MIN(price),
+           (array_agg(price ORDER BY "timestamp" DESC, id DESC))[1],
+           SUM(quantity), SUM(quantity * price)
+    FROM (
+        SELECT {key}, id, "timestamp", {quantity} AS quantity, {price} AS price, interval,
+               to_timestamp(floor(extract(epoch FROM "timestamp") / seconds) * seconds) AS bucket
+        FROM {source}
+        CROSS JOIN (VALUES ('1m', 60), ('5m', 300), ('1h', 3600), ('1d', 86400)) AS intervals (interval, seconds)
+    ) AS fills
+    GROUP BY {key}, interval, bucket
+"""
+
+
+def backfill_candles(apps, schema_editor):
+    """Fill in candle turnover and product candles from the existing history"""
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    sources = [
+        ('Candle', 'StockTransaction', 'stock_id', 'shares', 'price_per_share'),
+        ('ProductCandle', 'Trade', 'product_id', 'quantity', 'price_per_unit'),
+    ]
+    with schema_editor.connection.cursor() as cursor:
+        for candle, source, key, quantity, price in sources:
+            table = apps.get_model('market', candle)._meta.db_table
+            cursor.execute(f'DELETE FROM {table}')
+            cursor.execute(
+                REBUILD_SQL.format(
+                    table=table,
+                    key=key,
+                    source=apps.get_model('market', source)._meta.db_table,
+                    quantity=quantity,
+                    price=price,
+                )
+            )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('market', '0006_market_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='candle',
+            name='turnover',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=24),
+        ),
+        migrations.CreateModel(
+            name='ProductCandle',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('interval', models.CharField(choices=[('1m', '1 minute'), ('5m', '5 minutes'), ('1h', '1 hour'), ('1d', '1 day')], max_length=2)),
+                ('bucket', models.DateTimeField()),
+                ('open', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('high', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('low', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('close', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('volume', models.PositiveBigIntegerField(default=0)),
+                ('turnover', models.DecimalField(decimal_places=2, default=0, max_digits=24)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='candles', to='market.product')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('product', 'interval', 'bucket'), name='market_productcandle_unique_bucket')],
+            },
+        ),
+        migrations.RunPython(backfill_candles, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 5.2.1 on 2026-10-18 01:01
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('market', '0007_product_candles'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SettlementBatch',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('window_start', models.DateTimeField()),
+                ('window_end', models.DateTimeField()),
+                ('trade_count', models.PositiveBigIntegerField(default=0)),
+                ('pair_count', models.PositiveIntegerField(default=0)),
+                ('gross_amount', models.DecimalField(decimal_places=2, default=0, max_digits=24)),
+                ('net_amount', models.DecimalField(decimal_places=2, default=0, max_digits=24)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['window_end'], name='market_settlementbatch_end_idx')],
+                'constraints': [models.UniqueConstraint(fields=('window_start', 'window_end'), name='market_settlementbatch_unique_window')],
+            },
+        ),
+        migrations.CreateModel(
+            name='Settlement',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=24)),
+                ('payer_gross', models.DecimalField(decimal_places=2, max_digits=24)),
+                ('payee_gross', models.DecimalField(decimal_places=2, max_digits=24)),
+                ('trade_count', models.PositiveIntegerField()),
+                ('timestamp', models.DateTimeField()),
+                ('payee', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='settlements_received', to='market.company')),
+                ('payer', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='settlements_paid', to='market.company')),
+                ('batch', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='settlements', to='market.settlementbatch')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['timestamp', 'id'], name='market_settlement_ts_id_idx'), models.Index(fields=['payer', 'timestamp', 'id'], name='market_settlement_payer_ts_idx'), models.Index(fields=['payee', 'timestamp', 'id'], name='market_settlement_payee_ts_idx')],
+                'constraints': [models.UniqueConstraint(fields=('batch', 'payer', 'payee'), name='market_settlement_unique_pair')],
+            },
+        ),
+    ]
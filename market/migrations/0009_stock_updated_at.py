@@ -0,0 +1,53 @@
+# Generated by Django 5.2.1 on 2026-10-18 01:25
+
+import django.db.models.functions.datetime
+from django.db import migrations, models
+
+# Versions the stock list for conditional GETs (see core.conditional).
+# One trigger per event with its transition table, which
+# api_resource_version_bump() reads since api migration 0006; the function
+# before it ignores them, so this applies on either side of that migration.
+TRIGGER_SQL = """
+CREATE TRIGGER market_stock_version_insert
+AFTER INSERT ON market_stock REFERENCING NEW TABLE AS new_rows
+FOR EACH STATEMENT EXECUTE FUNCTION api_resource_version_bump();
+
+CREATE TRIGGER market_stock_version_update
+AFTER UPDATE ON market_stock REFERENCING NEW TABLE AS new_rows
+FOR EACH STATEMENT EXECUTE FUNCTION api_resource_version_bump();
+
+CREATE TRIGGER market_stock_version_delete
+AFTER DELETE ON market_stock REFERENCING OLD TABLE AS old_rows
+FOR EACH STATEMENT EXECUTE FUNCTION api_resource_version_bump();
+
+CREATE TRIGGER market_stock_version_truncate
+AFTER TRUNCATE ON market_stock
+FOR EACH STATEMENT EXECUTE FUNCTION api_resource_version_bump();
+
+INSERT INTO api_resourceversion (name, version, updated_at) VALUES ('market_stock', 1, now());
+"""
+
+REVERSE_SQL = """
+DROP TRIGGER IF EXISTS market_stock_version_insert ON market_stock;
+DROP TRIGGER IF EXISTS market_stock_version_update ON market_stock;
+DROP TRIGGER IF EXISTS market_stock_version_delete ON market_stock;
+DROP TRIGGER IF EXISTS market_stock_version_truncate ON market_stock;
+DELETE FROM api_resourceversion WHERE name = 'market_stock';
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0005_resource_versions'),
+        ('market', '0008_settlements'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='stock',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, db_default=django.db.models.functions.datetime.Now()),
+        ),
+        migrations.RunSQL(TRIGGER_SQL, REVERSE_SQL),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.2.1 on 2026-10-18 01:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('market', '0009_stock_updated_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IndexDelta',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('country', models.CharField(blank=True, max_length=100)),
+                ('delta', models.DecimalField(decimal_places=2, max_digits=24)),
+            ],
+        ),
+    ]
@@ -0,0 +1,48 @@
+from django.db import migrations
+
+# Stocks are updated by every settled batch, so a version row bumped in the
+# writer's transaction was a global lock on the hot path. The stock list is
+# now validated by an aggregate over market_stock itself (see
+# core.conditional.ConditionalGetMixin.aggregate_versions).
+FORWARD_SQL = """
+DROP TRIGGER IF EXISTS market_stock_version_trigger ON market_stock;
+DROP TRIGGER IF EXISTS market_stock_version_insert ON market_stock;
+DROP TRIGGER IF EXISTS market_stock_version_update ON market_stock;
+DROP TRIGGER IF EXISTS market_stock_version_delete ON market_stock;
+DROP TRIGGER IF EXISTS market_stock_version_truncate ON market_stock;
+DELETE FROM api_resourceversion WHERE name = 'market_stock';
+"""
+
+# Restored as one trigger per event, as api_resource_version_bump() expects
+# since api migration 0006
+REVERSE_SQL = """
+CREATE TRIGGER market_stock_version_insert
+AFTER INSERT ON market_stock REFERENCING NEW TABLE AS new_rows
+FOR EACH STATEMENT EXECUTE FUNCTION api_resource_version_bump();
+
+CREATE TRIGGER market_stock_version_update
+AFTER UPDATE ON market_stock REFERENCING NEW TABLE AS new_rows
+FOR EACH STATEMENT EXECUTE FUNCTION api_resource_version_bump();
+
+CREATE TRIGGER market_stock_version_delete
+AFTER DELETE ON market_stock REFERENCING OLD TABLE AS old_rows
+FOR EACH STATEMENT EXECUTE FUNCTION api_resource_version_bump();
+
+CREATE TRIGGER market_stock_version_truncate
+AFTER TRUNCATE ON market_stock
+FOR EACH STATEMENT EXECUTE FUNCTION api_resource_version_bump();
+
+INSERT INTO api_resourceversion (name, version, updated_at) VALUES ('market_stock', 1, now());
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0006_skip_empty_version_bumps'),
+        ('market', '0010_index_delta'),
+    ]
+
+    operations = [
+        migrations.RunSQL(FORWARD_SQL, REVERSE_SQL),
+    ]
@@ -0,0 +1,65 @@
+from django.db import migrations
+
+# Versions the stock list without scanning market_stock on every request.
+# One version row would serialize the writers that settle stocks, so the
+# counter is striped: a statement bumps the row 'market_stock:<n>' picked
+# by its backend (pid % 16), writers on different connections rarely share
+# a row, and the list's version is the sum over the rows (see
+# core.conditional.ConditionalGetMixin.version_tables).
+TRIGGER_SQL = """
+CREATE FUNCTION market_stock_version_bump() RETURNS trigger AS $$
+BEGIN
+    -- Only the transition tables of the current event exist
+    IF TG_OP = 'INSERT' OR TG_OP = 'UPDATE' THEN
+        IF NOT EXISTS (SELECT FROM new_rows) THEN
+            RETURN NULL;
+        END IF;
+    ELSIF TG_OP = 'DELETE' THEN
+        IF NOT EXISTS (SELECT FROM old_rows) THEN
+            RETURN NULL;
+        END IF;
+    END IF;
+    INSERT INTO api_resourceversion (name, version, updated_at)
+    VALUES (TG_TABLE_NAME || ':' || pg_backend_pid() % 16, 1, now())
+    ON CONFLICT (name) DO UPDATE
+    SET version = api_resourceversion.version + 1, updated_at = now();
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER market_stock_version_insert
+AFTER INSERT ON market_stock REFERENCING NEW TABLE AS new_rows
+FOR EACH STATEMENT EXECUTE FUNCTION market_stock_version_bump();
+
+CREATE TRIGGER market_stock_version_update
+AFTER UPDATE ON market_stock REFERENCING NEW TABLE AS new_rows
+FOR EACH STATEMENT EXECUTE FUNCTION market_stock_version_bump();
+
+CREATE TRIGGER market_stock_version_delete
+AFTER DELETE ON market_stock REFERENCING OLD TABLE AS old_rows
+FOR EACH STATEMENT EXECUTE FUNCTION market_stock_version_bump();
+
+CREATE TRIGGER market_stock_version_truncate
+AFTER TRUNCATE ON market_stock
+FOR EACH STATEMENT EXECUTE FUNCTION market_stock_version_bump();
+"""
+
+REVERSE_SQL = """
+DROP TRIGGER IF EXISTS market_stock_version_insert ON market_stock;
+DROP TRIGGER IF EXISTS market_stock_version_update ON market_stock;
+DROP TRIGGER IF EXISTS market_stock_version_delete ON market_stock;
+DROP TRIGGER IF EXISTS market_stock_version_truncate ON market_stock;
+DROP FUNCTION IF EXISTS market_stock_version_bump();
+DELETE FROM api_resourceversion WHERE name LIKE 'market\\_stock:%';
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('market', '0011_drop_stock_version_trigger'),
+    ]
+
+    operations = [
+        migrations.RunSQL(TRIGGER_SQL, REVERSE_SQL),
+    ]
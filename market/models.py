@@ -1,4 +1,5 @@
 from django.db import models
+from django.db.models.functions import Now
 
 # Create your models here.
 
@@ -19,6 +20,8 @@ class Stock(models.Model):
     total_shares = models.PositiveIntegerField(default=1000000)
     available_shares = models.PositiveIntegerField(default=1000000)
     price = models.DecimalField(max_digits=10, decimal_places=2)
+    # auto_now only covers save(); bulk updates must set it themselves
+    updated_at = models.DateTimeField(auto_now=True, db_default=Now())
 
 
 class Trade(models.Model):
@@ -29,6 +32,16 @@ class Trade(models.Model):
     price_per_unit = models.DecimalField(max_digits=10, decimal_places=2)
     timestamp = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        # On PostgreSQL the table is range partitioned by month on timestamp
+        indexes = [
+            # Keyset pagination on (timestamp, id), optionally per counterparty/product
+            models.Index(fields=['timestamp', 'id'], name='market_trade_ts_id_idx'),
+            models.Index(fields=['buyer', 'timestamp', 'id'], name='market_trade_buyer_ts_idx'),
+            models.Index(fields=['seller', 'timestamp', 'id'], name='market_trade_seller_ts_idx'),
+            models.Index(fields=['product', 'timestamp', 'id'], name='market_trade_product_ts_idx'),
+        ]
+
 
 class StockTransaction(models.Model):
     stock = models.ForeignKey(Stock, on_delete=models.CASCADE)
@@ -37,3 +50,192 @@ class StockTransaction(models.Model):
     shares = models.PositiveIntegerField()
     price_per_share = models.DecimalField(max_digits=10, decimal_places=2)
     timestamp = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        # On PostgreSQL the table is range partitioned by month on timestamp
+        indexes = [
+            # Keyset pagination on (timestamp, id), optionally per counterparty/stock
+            models.Index(fields=['timestamp', 'id'], name='market_stocktx_ts_id_idx'),
+            models.Index(fields=['buyer', 'timestamp', 'id'], name='market_stocktx_buyer_ts_idx'),
+            models.Index(fields=['seller', 'timestamp', 'id'], name='market_stocktx_seller_ts_idx'),
+            models.Index(fields=['stock', 'timestamp', 'id'], name='market_stocktx_stock_ts_idx'),
+        ]
+
+
+class CandleBase(models.Model):
+    """Pre-aggregated OHLCV bar for one interval and time bucket"""
+
+    INTERVAL_CHOICES = [
+        ('1m', '1 minute'),
+        ('5m', '5 minutes'),
+        ('1h', '1 hour'),
+        ('1d', '1 day'),
+    ]
+
+    interval = models.CharField(max_length=2, choices=INTERVAL_CHOICES)
+    bucket = models.DateTimeField()  # Start of the interval
+    open = models.DecimalField(max_digits=10, decimal_places=2)
+    high = models.DecimalField(max_digits=10, decimal_places=2)
+    low = models.DecimalField(max_digits=10, decimal_places=2)
+    close = models.DecimalField(max_digits=10, decimal_places=2)
+    volume = models.PositiveBigIntegerField(default=0)
+    turnover = models.DecimalField(max_digits=24, decimal_places=2, default=0)  # Sum of volume * price
+
+    class Meta:
+        abstract = True
+
+
+class Candle(CandleBase):
+    """Pre-aggregated OHLCV bar for one stock, interval and time bucket"""
+
+    stock = models.ForeignKey(Stock, related_name='candles', on_delete=models.CASCADE)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['stock', 'interval', 'bucket'], name='market_candle_unique_bucket'
+            )
+        ]
+
+
+class ProductCandle(CandleBase):
+    """Pre-aggregated OHLCV bar of the trades in one product, interval and time bucket"""
+
+    product = models.ForeignKey(Product, related_name='candles', on_delete=models.CASCADE)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['product', 'interval', 'bucket'], name='market_productcandle_unique_bucket'
+            )
+        ]
+
+
+class Holding(models.Model):
+    """
+    Current share position of a company in a stock, maintained in the same
+    transaction as every fill (buys minus sells over the whole history).
+    """
+
+    company = models.ForeignKey(Company, related_name='holdings', on_delete=models.CASCADE)
+    stock = models.ForeignKey(Stock, related_name='holdings', on_delete=models.CASCADE)
+    shares = models.BigIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['company', 'stock'], name='market_holding_unique_position')
+        ]
+        indexes = [models.Index(fields=['stock', 'shares'], name='market_holding_stock_idx')]
+
+
+class MarketIndex(models.Model):
+    """
+    Cap-weighted index over market stocks: the whole market (blank country)
+    or one country's stocks. level = market_cap / divisor, where market_cap is
+    the sum of total_shares * price and is updated incrementally on every
+    price change.
+    """
+
+    country = models.CharField(max_length=100, unique=True, blank=True)
+    market_cap = models.DecimalField(max_digits=24, decimal_places=2, default=0)
+    divisor = models.FloatField(default=1.0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    @property
+    def name(self):
+        return f'{self.country} Index' if self.country else 'Market Index'
+
+    @property
+    def level(self):
+        return float(self.market_cap) / self.divisor if self.divisor else 0.0
+
+
+class IndexDelta(models.Model):
+    """
+    Market cap change of one index from one settled batch, appended by the
+    writer and folded into the MarketIndex row afterwards (see
+    ``market.indices``), so writers never lock the shared index rows.
+    """
+
+    country = models.CharField(max_length=100, blank=True)
+    delta = models.DecimalField(max_digits=24, decimal_places=2)
+
+
+class IndexLevel(models.Model):
+    """Compact time series of index levels, one row per index per update"""
+
+    index = models.ForeignKey(MarketIndex, related_name='levels', on_delete=models.CASCADE)
+    timestamp = models.DateTimeField()
+    level = models.FloatField()
+
+    class Meta:
+        indexes = [models.Index(fields=['index', 'timestamp'], name='market_indexlevel_ts_idx')]
+
+
+class SettlementBatch(models.Model):
+    """
+    One settlement window [window_start, window_end) of company-to-company
+    trades, netted into one Settlement per company pair.
+    """
+
+    window_start = models.DateTimeField()
+    window_end = models.DateTimeField()
+    trade_count = models.PositiveBigIntegerField(default=0)
+    pair_count = models.PositiveIntegerField(default=0)
+    gross_amount = models.DecimalField(max_digits=24, decimal_places=2, default=0)  # Sum of trade values
+    net_amount = models.DecimalField(max_digits=24, decimal_places=2, default=0)  # Sum of net payments
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['window_start', 'window_end'], name='market_settlementbatch_unique_window'
+            )
+        ]
+        indexes = [models.Index(fields=['window_end'], name='market_settlementbatch_end_idx')]
+
+
+class Settlement(models.Model):
+    """
+    Net obligation between two companies over one batch window: ``payer``
+    owes ``payee`` ``amount``, which is what the payer bought from the payee
+    minus what the payee bought from the payer. A pair that nets to zero is
+    recorded with the lower company id as payer.
+    """
+
+    batch = models.ForeignKey(SettlementBatch, related_name='settlements', on_delete=models.CASCADE)
+    payer = models.ForeignKey(Company, related_name='settlements_paid', on_delete=models.CASCADE)
+    payee = models.ForeignKey(Company, related_name='settlements_received', on_delete=models.CASCADE)
+    amount = models.DecimalField(max_digits=24, decimal_places=2)
+    payer_gross = models.DecimalField(max_digits=24, decimal_places=2)  # Bought by payer from payee
+    payee_gross = models.DecimalField(max_digits=24, decimal_places=2)  # Bought by payee from payer
+    trade_count = models.PositiveIntegerField()
+    timestamp = models.DateTimeField()  # Settlement time: the end of the batch window
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['batch', 'payer', 'payee'], name='market_settlement_unique_pair')
+        ]
+        indexes = [
+            # Keyset pagination on (timestamp, id), optionally per counterparty
+            models.Index(fields=['timestamp', 'id'], name='market_settlement_ts_id_idx'),
+            models.Index(fields=['payer', 'timestamp', 'id'], name='market_settlement_payer_ts_idx'),
+            models.Index(fields=['payee', 'timestamp', 'id'], name='market_settlement_payee_ts_idx'),
+        ]
+
+
+class ArchivedPartition(models.Model):
+    """
+    A monthly partition that ``archive_partitions`` detached, so rebuilds
+    from the history tables know which months are no longer online.
+    """
+
+    table = models.CharField(max_length=63)
+    month = models.DateField()  # First day of the partition's month
+    path = models.CharField(max_length=255, blank=True)  # Export, if any
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['table', 'month'], name='market_archivedpartition_unique_month')
+        ]
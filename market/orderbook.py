@@ -0,0 +1,238 @@
+"""
+In-memory limit order books and a price-time-priority matching engine for stocks
+
+Prices are integer cents (see ``market.prices``).
+"""
+
+import heapq
+import itertools
+import logging
+from collections import deque
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+BUY = "buy"
+SELL = "sell"
+
+
+class Order:
+    """A limit order resting in (or submitted to) an order book"""
+
+    __slots__ = ("id", "side", "company_id", "price", "quantity", "remaining")
+
+    def __init__(
+        self,
+        order_id: int,
+        side: str,
+        company_id: int,
+        price: Optional[int],
+        quantity: int,
+    ):
+        self.id = order_id
+        self.side = side
+        self.company_id = company_id
+        self.price = price  # None means a market order
+        self.quantity = quantity
+        self.remaining = quantity
+
+    def __repr__(self):
+        return (
+            f"Order(id={self.id}, side={self.side}, price={self.price}, "
+            f"remaining={self.remaining}/{self.quantity})"
+        )
+
+
+class Fill:
+    """A match between an incoming order and a resting order"""
+
+    __slots__ = ("stock_id", "buyer_id", "seller_id", "shares", "price")
+
+    def __init__(
+        self, stock_id: int, buyer_id: int, seller_id: int, shares: int, price: int
+    ):
+        self.stock_id = stock_id
+        self.buyer_id = buyer_id
+        self.seller_id = seller_id
+        self.shares = shares
+        self.price = price
+
+    def __repr__(self):
+        return (
+            f"Fill(stock={self.stock_id}, buyer={self.buyer_id}, "
+            f"seller={self.seller_id}, shares={self.shares}, price={self.price})"
+        )
+
+
+class OrderBook:
+    """
+    Resting bids and asks for a single stock.
+
+    Each side keeps a dict of price level -> FIFO queue of orders plus a heap of
+    the prices that have a level, so the best price is O(1) to read and
+    O(log levels) to update. A cancelled order leaves its queue at once, and
+    its level goes with it when it was the last order there.
+    """
+
+    def __init__(self, stock_id: int):
+        self.stock_id = stock_id
+        self._bid_levels: Dict[int, deque] = {}
+        self._ask_levels: Dict[int, deque] = {}
+        self._bid_prices: List[int] = []  # max-heap via negated prices
+        self._ask_prices: List[int] = []  # min-heap
+        self._orders: Dict[int, Order] = {}
+        self.last_price: Optional[int] = None
+
+    def __len__(self):
+        return len(self._orders)
+
+    def best_bid(self) -> Optional[int]:
+        """Highest resting bid price, if any"""
+        prices = self._bid_prices
+        while prices and -prices[0] not in self._bid_levels:
+            heapq.heappop(prices)
+        return -prices[0] if prices else None
+
+    def best_ask(self) -> Optional[int]:
+        """Lowest resting ask price, if any"""
+        prices = self._ask_prices
+        while prices and prices[0] not in self._ask_levels:
+            heapq.heappop(prices)
+        return prices[0] if prices else None
+
+    def submit(self, order: Order) -> List[Fill]:
+        """Match an incoming order against the book and rest any remainder"""
+        if order.side == BUY:
+            fills = self._match(order, self._ask_levels, self.best_ask)
+        else:
+            fills = self._match(order, self._bid_levels, self.best_bid)
+
+        if order.remaining and order.price is not None:
+            self._rest(order)
+        return fills
+
+    def cancel(self, order_id: int) -> bool:
+        """Cancel a resting order. Returns False if it is no longer in the book."""
+        order = self._orders.pop(order_id, None)
+        if order is None:
+            return False
+        order.remaining = 0
+        levels = self._bid_levels if order.side == BUY else self._ask_levels
+        queue = levels[order.price]
+        queue.remove(order)
+        if not queue:
+            del levels[order.price]  # The stale heap entry is skipped by best_bid/best_ask
+        return True
+
+    def depth(self, levels: int = 5) -> Dict[str, List[tuple]]:
+        """Aggregated (price, quantity) for the best ``levels`` on each side"""
+
+        def side(book_levels, reverse):
+            rows = []
+            for price in sorted(book_levels, reverse=reverse)[:levels]:
+                quantity = sum(o.remaining for o in book_levels[price])
+                if quantity:
+                    rows.append((price, quantity))
+            return rows
+
+        return {
+            "bids": side(self._bid_levels, True),
+            "asks": side(self._ask_levels, False),
+        }
+
+    def _match(self, order, levels, best) -> List[Fill]:
+        fills = []
+        limit = order.price
+        is_buy = order.side == BUY
+
+        while order.remaining:
+            price = best()
+            if price is None:
+                break
+            if limit is not None and (price > limit if is_buy else price < limit):
+                break
+
+            queue = levels[price]
+            while queue and order.remaining:
+                resting = queue[0]
+                if not resting.remaining:
+                    queue.popleft()
+                    continue
+                if resting.company_id == order.company_id:
+                    # Self-trade prevention: the older resting order is cancelled
+                    self._orders.pop(resting.id, None)
+                    resting.remaining = 0
+                    queue.popleft()
+                    continue
+
+                shares = min(order.remaining, resting.remaining)
+                order.remaining -= shares
+                resting.remaining -= shares
+                if is_buy:
+                    fills.append(
+                        Fill(self.stock_id, order.company_id, resting.company_id, shares, price)
+                    )
+                else:
+                    fills.append(
+                        Fill(self.stock_id, resting.company_id, order.company_id, shares, price)
+                    )
+                self.last_price = price  # Only a fill moves the last price
+
+                if not resting.remaining:
+                    queue.popleft()
+                    self._orders.pop(resting.id, None)
+
+            if not queue:
+                del levels[price]
+
+        return fills
+
+    def _rest(self, order: Order):
+        if order.side == BUY:
+            levels, prices, key = self._bid_levels, self._bid_prices, -order.price
+        else:
+            levels, prices, key = self._ask_levels, self._ask_prices, order.price
+
+        queue = levels.get(order.price)
+        if queue is None:
+            queue = levels[order.price] = deque()
+            heapq.heappush(prices, key)
+        queue.append(order)
+        self._orders[order.id] = order
+
+
+class Exchange:
+    """
+    Registry of order books, one per stock, kept for the lifetime of the process
+    so books are never rebuilt from the database between ticks.
+    """
+
+    def __init__(self):
+        self._books: Dict[int, OrderBook] = {}
+        self._order_ids = itertools.count(1)
+
+    def book(self, stock_id: int) -> OrderBook:
+        """Get (or lazily create) the order book for a stock"""
+        book = self._books.get(stock_id)
+        if book is None:
+            book = self._books[stock_id] = OrderBook(stock_id)
+        return book
+
+    def submit(
+        self,
+        stock_id: int,
+        side: str,
+        company_id: int,
+        quantity: int,
+        price: Optional[int] = None,
+    ) -> List[Fill]:
+        """Create an order for a stock and match it against that stock's book"""
+        order = Order(next(self._order_ids), side, company_id, price, quantity)
+        return self.book(stock_id).submit(order)
+
+    def books(self) -> List[OrderBook]:
+        return list(self._books.values())
+
+
+# Process-wide exchange used by the simulator
+exchange = Exchange()
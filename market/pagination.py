@@ -0,0 +1,134 @@
+"""
+Keyset (cursor) pagination for the append-only market tables
+"""
+
+import base64
+from datetime import datetime
+
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import ValidationError
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+def encode_cursor(timestamp: datetime, pk: int) -> str:
+    raw = f"{timestamp.isoformat()}|{pk}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        timestamp, pk = raw.rsplit("|", 1)
+        parsed = parse_datetime(timestamp)
+        if parsed is None:
+            raise ValueError(timestamp)
+        return parsed, int(pk)
+    except (ValueError, UnicodeDecodeError):
+        raise ValidationError({"cursor": "Invalid cursor."})
+
+
+class KeysetPagination(BasePagination):
+    """
+    Pages through rows newest first on (timestamp, id).
+
+    ``after=<cursor>`` returns the rows that follow the cursor (older rows),
+    ``before=<cursor>`` the rows that precede it (newer rows). Every page is a
+    bounded index range scan that starts at the cursor, so page latency does
+    not depend on how deep into the history the client is.
+
+    ``company=<id>`` selects rows where the company is on either side of the
+    trade. It is answered as a UNION of one bounded scan per counterparty
+    column, so each side can use its own (column, timestamp, id) index.
+    """
+
+    page_size = 100
+    max_page_size = 1000
+    counterparty_fields = ("buyer", "seller")
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params.get("page_size", self.page_size))
+        except ValueError:
+            raise ValidationError({"page_size": "Must be an integer."})
+        return max(1, min(size, self.max_page_size))
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        params = request.query_params
+        size = self.get_page_size(request)
+
+        after, before = params.get("after"), params.get("before")
+        if after and before:
+            raise ValidationError("Use either 'after' or 'before', not both.")
+        self.backwards = bool(before)
+
+        if after:
+            timestamp, pk = decode_cursor(after)
+            queryset = queryset.filter(timestamp__lte=timestamp).exclude(
+                timestamp=timestamp, id__gte=pk
+            )
+        elif before:
+            timestamp, pk = decode_cursor(before)
+            queryset = queryset.filter(timestamp__gte=timestamp).exclude(
+                timestamp=timestamp, id__lte=pk
+            )
+
+        ordering = ("timestamp", "id") if self.backwards else ("-timestamp", "-id")
+        company = params.get("company")
+        if company:
+            sides = [
+                queryset.filter(**{field: company}).order_by(*ordering)[: size + 1]
+                for field in self.counterparty_fields
+            ]
+            queryset = sides[0].union(*sides[1:])
+        rows = list(queryset.order_by(*ordering)[: size + 1])
+
+        has_more = len(rows) > size
+        rows = rows[:size]
+        if self.backwards:
+            rows.reverse()
+        self.has_next = bool(rows) and (has_more or self.backwards)
+        self.has_previous = bool(rows) and (has_more if self.backwards else bool(after))
+        self.page = rows
+        return rows
+
+    def get_paginated_response(self, data):
+        return Response(
+            {
+                "next": self.get_next_link(),
+                "previous": self.get_previous_link(),
+                "results": data,
+            }
+        )
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        last = self.page[-1]
+        url = remove_query_param(self.request.build_absolute_uri(), "before")
+        return replace_query_param(url, "after", encode_cursor(last.timestamp, last.pk))
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        first = self.page[0]
+        url = remove_query_param(self.request.build_absolute_uri(), "after")
+        return replace_query_param(url, "before", encode_cursor(first.timestamp, first.pk))
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            "type": "object",
+            "properties": {
+                "next": {"type": "string", "nullable": True, "format": "uri"},
+                "previous": {"type": "string", "nullable": True, "format": "uri"},
+                "results": schema,
+            },
+        }
+
+
+class SettlementPagination(KeysetPagination):
+    """Keyset pagination over settlements; ``company`` matches the payer or the payee"""
+
+    counterparty_fields = ("payer", "payee")
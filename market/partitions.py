@@ -0,0 +1,204 @@
+"""
+Monthly range partitions on ``timestamp`` for the append-only market tables
+"""
+
+import gzip
+import logging
+import os
+import re
+from datetime import date, datetime, timezone as dt_timezone
+from typing import List, Optional, Tuple
+
+from django.db import connections, transaction
+
+from .models import ArchivedPartition
+
+logger = logging.getLogger(__name__)
+
+# Tables that are partitioned by month on their "timestamp" column
+PARTITIONED_TABLES = ["market_trade", "market_stocktransaction"]
+
+PARTITION_NAME_RE = re.compile(r"_p(\d{4})(\d{2})$")
+
+
+class HistoryArchived(RuntimeError):
+    """A rebuild from a history table would miss the months archived out of it"""
+
+
+def month_start(value: date, offset: int = 0) -> date:
+    """First day of the month ``offset`` months after the month containing ``value``"""
+    months = value.year * 12 + value.month - 1 + offset
+    return date(months // 12, months % 12 + 1, 1)
+
+
+def partition_name(table: str, month: date) -> str:
+    return f"{table}_p{month.year:04d}{month.month:02d}"
+
+
+def _bound(month: date) -> str:
+    return datetime(month.year, month.month, 1, tzinfo=dt_timezone.utc).isoformat()
+
+
+def is_partitioned(table: str, using: str = "default") -> bool:
+    connection = connections[using]
+    if connection.vendor != "postgresql":
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass(%s)",
+            [table],
+        )
+        return cursor.fetchone() is not None
+
+
+def create_partition(cursor, table: str, month: date) -> str:
+    """
+    Create the monthly partition of ``table`` that starts at ``month``.
+    Rows of that month already caught by the default partition are moved
+    into it (PostgreSQL refuses the new partition otherwise).
+    """
+    name = partition_name(table, month)
+    bounds = [_bound(month), _bound(month_start(month, 1))]
+    cursor.execute("SELECT to_regclass(%s), to_regclass(%s)", [name, f"{table}_default"])
+    exists, default = cursor.fetchone()
+    if exists:
+        return name
+
+    stray = False
+    if default:
+        cursor.execute(
+            f'SELECT EXISTS (SELECT 1 FROM {table}_default WHERE "timestamp" >= %s AND "timestamp" < %s)',
+            bounds,
+        )
+        stray = cursor.fetchone()[0]
+    if stray:
+        cursor.execute(f"ALTER TABLE {table} DETACH PARTITION {table}_default")
+    cursor.execute(
+        f"CREATE TABLE IF NOT EXISTS {name} PARTITION OF {table} "
+        f"FOR VALUES FROM (%s) TO (%s)",
+        bounds,
+    )
+    if stray:
+        cursor.execute(
+            f'WITH moved AS (DELETE FROM {table}_default WHERE "timestamp" >= %s AND "timestamp" < %s '
+            f"RETURNING *) INSERT INTO {table} SELECT * FROM moved",
+            bounds,
+        )
+        logger.info(f"Moved {cursor.rowcount} rows of {table} from the default partition to {name}")
+        cursor.execute(f"ALTER TABLE {table} ATTACH PARTITION {table}_default DEFAULT")
+    return name
+
+
+def ensure_partitions(
+    months_ahead: int = 3,
+    using: str = "default",
+    since: Optional[date] = None,
+    until: Optional[date] = None,
+) -> List[str]:
+    """
+    Make sure every partitioned market table has partitions from the current
+    month (or the month of ``since``, if earlier) up to ``months_ahead``
+    months in the future (or the month of ``until``, if later), e.g. before
+    loading historical rows.
+    Returns the names of the partitions that exist afterwards.
+    """
+    connection = connections[using]
+    if connection.vendor != "postgresql":
+        return []
+
+    today = datetime.now(dt_timezone.utc).date()
+    first = month_start(min(since, today) if since else today)
+    last = month_start(today, months_ahead)
+    if until and month_start(until) > last:
+        last = month_start(until)
+    names = []
+    with transaction.atomic(using=using), connection.cursor() as cursor:
+        for table in PARTITIONED_TABLES:
+            if not is_partitioned(table, using):
+                continue
+            month = first
+            while month <= last:
+                names.append(create_partition(cursor, table, month))
+                month = month_start(month, 1)
+    return names
+
+
+def oldest_default_row(table: str, using: str = "default") -> Optional[date]:
+    """Date of the oldest row in the default partition of ``table``, if it holds any"""
+    with connections[using].cursor() as cursor:
+        cursor.execute("SELECT to_regclass(%s)", [f"{table}_default"])
+        if cursor.fetchone()[0] is None:
+            return None
+        cursor.execute(f'SELECT min("timestamp") FROM {table}_default')
+        oldest = cursor.fetchone()[0]
+    return oldest.astimezone(dt_timezone.utc).date() if oldest else None
+
+
+def ensure_partitions_after_migrate(sender, using="default", **kwargs):
+    """post_migrate handler so every deploy tops up the look-ahead partitions"""
+    ensure_partitions(using=using)
+
+
+def list_partitions(table: str, using: str = "default") -> List[Tuple[str, Optional[date]]]:
+    """(partition name, month) for each monthly partition of ``table``, oldest first"""
+    with connections[using].cursor() as cursor:
+        cursor.execute(
+            """
+            SELECT child.relname
+            FROM pg_inherits
+            JOIN pg_class child ON child.oid = pg_inherits.inhrelid
+            WHERE pg_inherits.inhparent = to_regclass(%s)
+            ORDER BY child.relname
+            """,
+            [table],
+        )
+        partitions = []
+        for (name,) in cursor.fetchall():
+            match = PARTITION_NAME_RE.search(name)
+            month = date(int(match.group(1)), int(match.group(2)), 1) if match else None
+            partitions.append((name, month))
+    return partitions
+
+
+def archive_partition(
+    table: str, name: str, export_dir: Optional[str], drop: bool = True, using: str = "default"
+) -> Optional[str]:
+    """
+    Detach a monthly partition, optionally export it as gzipped CSV to
+    ``export_dir`` and drop it, and record its month as archived (see
+    ``archived_until``). Returns the export path, if any.
+    """
+    path = None
+    match = PARTITION_NAME_RE.search(name)
+    with transaction.atomic(using=using), connections[using].cursor() as cursor:
+        cursor.execute(f"ALTER TABLE {table} DETACH PARTITION {name}")
+        if export_dir:
+            os.makedirs(export_dir, exist_ok=True)
+            path = os.path.join(export_dir, f"{name}.csv.gz")
+            with gzip.open(path, "wt", newline="") as handle:
+                cursor.copy_expert(f"COPY {name} TO STDOUT WITH (FORMAT csv, HEADER)", handle)
+        if drop:
+            cursor.execute(f"DROP TABLE {name}")
+        if match:
+            ArchivedPartition.objects.using(using).update_or_create(
+                table=table,
+                month=date(int(match.group(1)), int(match.group(2)), 1),
+                defaults={"path": path or ""},
+            )
+    logger.info(f"Archived partition {name} of {table} to {path or '(no export)'}")
+    return path
+
+
+def archived_until(table: str, using: str = "default") -> Optional[date]:
+    """
+    First day after the newest archived month of ``table``, or None if none
+    was archived: history before it is no longer (completely) online.
+    """
+    newest = (
+        ArchivedPartition.objects.using(using)
+        .filter(table=table)
+        .order_by("-month")
+        .values_list("month", flat=True)
+        .first()
+    )
+    return month_start(newest, 1) if newest else None
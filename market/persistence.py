@@ -0,0 +1,241 @@
+"""
+Bulk, single-transaction persistence for market simulation steps
+
+Row prices are integer cents (see ``market.prices``); they become
+``Decimal`` here, where they are written.
+"""
+
+import io
+import logging
+import time
+from typing import Iterable, List
+
+from django.db import connections, transaction
+from django.utils import timezone
+
+from .candles import update_candles, update_product_candles
+from .events import publish
+from .holdings import update_holdings
+from .indices import update_indices
+from .models import Stock, StockTransaction, Trade
+from .prices import format_cents, from_cents
+
+logger = logging.getLogger(__name__)
+
+TRADE_COLUMNS = ("seller_id", "buyer_id", "product_id", "quantity", "price_per_unit", "timestamp")
+TRANSACTION_COLUMNS = ("stock_id", "buyer_id", "seller_id", "shares", "price_per_share", "timestamp")
+
+
+def _copy_value(value) -> str:
+    return "\\N" if value is None else str(value)
+
+
+def _copy_line(row: tuple, suffix: str) -> str:
+    """COPY text line for a row whose last column is a price in cents"""
+    return "\t".join(map(_copy_value, row[:-1])) + "\t" + format_cents(row[-1]) + suffix
+
+
+def settle_transactions(rows: List[tuple], using: str = "default", batch_size: int = 5000):
+    """
+    Settle (stock_id, buyer_id, seller_id, shares, price_cents) rows against
+    the database. Must run inside a transaction.
+
+    The touched Stock rows are locked in id order, each row is accepted only
+    while the locked stock still has enough available shares, and the new
+    share counts and last prices are written with one ``bulk_update``. The
+    holdings are updated from the accepted rows in the same transaction, and
+    the market index deltas recorded for folding after commit.
+
+    Returns the accepted rows and {stock_id: [available_shares, price]}.
+    """
+    accepted, state = _settle(rows, using, batch_size)
+    return [rows[index] for index in accepted], state
+
+
+def _settle(rows: List[tuple], using: str, batch_size: int):
+    """``settle_transactions``, returning the positions of the accepted rows"""
+    if not rows:
+        return [], {}
+
+    stock_ids = sorted({row[0] for row in rows})
+    locked = (
+        Stock.objects.using(using)
+        .select_for_update(of=("self",))
+        .filter(pk__in=stock_ids)
+        .order_by("pk")
+        .values_list("pk", "available_shares", "price", "total_shares", "company__country")
+    )
+    state, before = {}, {}
+    for pk, available, price, total_shares, country in locked:
+        state[pk] = [available, price]
+        before[pk] = (price, total_shares, country)
+
+    accepted, touched = [], set()
+    for index, row in enumerate(rows):
+        current = state.get(row[0])
+        if current is None or current[0] < row[3]:
+            continue
+        current[0] -= row[3]
+        current[1] = row[4]
+        touched.add(row[0])
+        accepted.append(index)
+
+    for pk in touched:
+        state[pk][1] = from_cents(state[pk][1])
+    now = timezone.now()  # bulk_update skips auto_now
+    Stock.objects.using(using).bulk_update(
+        [
+            Stock(pk=pk, available_shares=state[pk][0], price=state[pk][1], updated_at=now)
+            for pk in sorted(touched)
+        ],
+        ["available_shares", "price", "updated_at"],
+        batch_size=batch_size,
+    )
+
+    update_holdings([rows[index] for index in accepted], using)
+    update_indices(
+        [
+            (country, total_shares, old_price, state[pk][1])
+            for pk, (old_price, total_shares, country) in before.items()
+            if pk in touched
+        ],
+        using,
+    )
+    return accepted, state
+
+
+class StepWriter:
+    """
+    Collects a simulation step's Trade and StockTransaction rows, then writes
+    them all in a single transaction.
+
+    Share accounting is done against the database, not the caller's copy of
+    the stocks (see ``settle_transactions``), so several writers can run
+    against the same stocks without losing updates or deadlocking.
+
+    On PostgreSQL rows are loaded with COPY in chunks of ``batch_size``;
+    other databases fall back to ``bulk_create``.
+
+    With an ``event_log`` (see ``market.eventlog``), every committed flush
+    is also appended to the log, so the run can be replayed.
+    """
+
+    def __init__(self, batch_size: int = 5000, using: str = "default", event_log=None):
+        self.batch_size = batch_size
+        self.using = using
+        self.event_log = event_log
+        self.trades: List[tuple] = []
+        self.transactions: List[tuple] = []
+        self.stocks = {}
+        self.rows_written = 0
+        self.rejected = 0
+        self.rejected_indices: List[int] = []  # Positions of the stock transactions the last flush dropped
+        self.settled = {}  # {stock_id: [available_shares, price]} as of the last flush
+        self.elapsed = 0.0
+
+    @property
+    def rows_per_second(self) -> float:
+        return self.rows_written / self.elapsed if self.elapsed else 0.0
+
+    def add_trade(self, seller_id, buyer_id, product_id, quantity, price_per_unit):
+        self.trades.append((seller_id, buyer_id, product_id, quantity, price_per_unit))
+
+    def add_trades(self, rows: Iterable[tuple]):
+        """Add (seller_id, buyer_id, product_id, quantity, price_per_unit) rows, prices in cents"""
+        self.trades.extend(rows)
+
+    def add_transaction(self, stock_id, buyer_id, seller_id, shares, price_per_share):
+        self.transactions.append((stock_id, buyer_id, seller_id, shares, price_per_share))
+
+    def add_transactions(self, rows: Iterable[tuple]):
+        """Add (stock_id, buyer_id, seller_id, shares, price_per_share) rows, prices in cents"""
+        self.transactions.extend(rows)
+
+    def update_stock(self, stock: Stock):
+        """Track an in-memory stock so it is refreshed from the database on flush"""
+        self.stocks[stock.pk] = stock
+
+    def flush(self, timestamp=None) -> int:
+        """Write everything collected so far in one transaction and reset"""
+        timestamp = timestamp or timezone.now()
+        started = time.perf_counter()
+        connection = connections[self.using]
+
+        with transaction.atomic(using=self.using):
+            changed = self._reserve_shares()
+            update_candles(self.transactions, timestamp, self.using)
+            update_product_candles(self.trades, timestamp, self.using)
+            if connection.vendor == "postgresql":
+                self._copy(Trade, TRADE_COLUMNS, self.trades, timestamp)
+                self._copy(StockTransaction, TRANSACTION_COLUMNS, self.transactions, timestamp)
+            else:
+                self._bulk_create(timestamp)
+            publish(self.transactions, self.trades, self.using, timestamp)
+
+        if self.event_log is not None:
+            self.event_log.write_step(timestamp, self.trades, self.transactions)
+        written = len(self.trades) + len(self.transactions) + changed
+        self.elapsed += time.perf_counter() - started
+        self.rows_written += written
+        self.trades, self.transactions, self.stocks = [], [], {}
+        return written
+
+    def _reserve_shares(self) -> int:
+        """Drop stock transactions the locked Stock rows cannot cover; update the rest"""
+        accepted, state = _settle(self.transactions, self.using, self.batch_size)
+        kept = set(accepted)
+        self.rejected_indices = [index for index in range(len(self.transactions)) if index not in kept]
+        self.rejected += len(self.rejected_indices)
+        self.transactions = [self.transactions[index] for index in accepted]
+        self.settled = state
+
+        for pk, stock in self.stocks.items():
+            if pk in state:
+                stock.available_shares, stock.price = state[pk]
+        return len({row[0] for row in self.transactions})
+
+    def _copy(self, model, columns, rows, timestamp):
+        if not rows:
+            return
+        table = model._meta.db_table
+        sql = f"COPY {table} ({', '.join(columns)}) FROM STDIN"
+        suffix = f"\t{timestamp.isoformat()}\n"
+
+        with connections[self.using].cursor() as cursor:
+            for start in range(0, len(rows), self.batch_size):
+                buffer = io.StringIO()
+                buffer.writelines(
+                    _copy_line(row, suffix) for row in rows[start:start + self.batch_size]
+                )
+                buffer.seek(0)
+                cursor.copy_expert(sql, buffer)
+
+    def _bulk_create(self, timestamp):
+        Trade.objects.using(self.using).bulk_create(
+            (
+                Trade(
+                    seller_id=seller_id,
+                    buyer_id=buyer_id,
+                    product_id=product_id,
+                    quantity=quantity,
+                    price_per_unit=from_cents(price),
+                    timestamp=timestamp,
+                )
+                for seller_id, buyer_id, product_id, quantity, price in self.trades
+            ),
+            batch_size=self.batch_size,
+        )
+        StockTransaction.objects.using(self.using).bulk_create(
+            (
+                StockTransaction(
+                    stock_id=stock_id,
+                    buyer_id=buyer_id,
+                    seller_id=seller_id,
+                    shares=shares,
+                    price_per_share=from_cents(price),
+                    timestamp=timestamp,
+                )
+                for stock_id, buyer_id, seller_id, shares, price in self.transactions
+            ),
+            batch_size=self.batch_size,
+        )
@@ -0,0 +1,194 @@
+"""
+Pluggable price models for the vectorized market simulator
+
+A model owns the current price of a fixed list of instruments and moves
+them a batch of ticks at a time: ``path(ticks)`` returns the (ticks, n)
+int64 price path in cents (see ``market.prices``) and advances the state
+to its last row. Models are built from Stock rows with ``from_stocks`` and
+registered in ``PRICE_MODELS`` by name.
+"""
+
+import logging
+import math
+from typing import Dict, Sequence, Tuple
+
+try:
+    import numpy as np
+
+    HAS_NUMPY = True
+except ImportError:  # NumPy is only required for vectorized runs
+    HAS_NUMPY = False
+
+from .prices import BASIS_POINTS, MIN_PRICE, to_cents
+
+logger = logging.getLogger(__name__)
+
+
+def walk(prices, steps):
+    """
+    Integer random walk: apply each row of ``steps`` (basis points) in turn
+    to ``prices`` (cents), rounding half up to a whole cent after every step
+    exactly like ``market.prices.scale``. Returns the (ticks, n) price path.
+
+    The rounding makes every tick depend on the rounded one before it, so
+    the path is not a cumulative product of the steps and the loop stays:
+    one Python iteration per tick, each a few array operations over all
+    instruments. The simulator draws many instruments over few ticks (one
+    per daemon tick), where that per-tick overhead is small.
+    """
+    path = np.empty(steps.shape, dtype=np.int64)
+    current = np.asarray(prices, dtype=np.int64)
+    for tick, step in enumerate(steps):
+        current = np.maximum(MIN_PRICE, (current * step + BASIS_POINTS // 2) // BASIS_POINTS)
+        path[tick] = current
+    return path
+
+
+class PriceModel:
+    """Base class: prices in cents for ``n`` instruments, moved by ``path``"""
+
+    name = None
+
+    def __init__(self, prices: Sequence[int], rng=None):
+        if not HAS_NUMPY:
+            raise ImportError("NumPy is required for price models")
+        self.rng = rng if rng is not None else np.random.default_rng()
+        self.prices = np.asarray(prices, dtype=np.int64)
+
+    @classmethod
+    def from_stocks(cls, stocks, rng=None, **params):
+        """Build the model for Stock rows (with their company loaded)"""
+        return cls([to_cents(stock.price) for stock in stocks], rng, **params)
+
+    def path(self, ticks: int):
+        raise NotImplementedError
+
+
+class RandomWalk(PriceModel):
+    """
+    Independent uniform steps of ``low``..``high`` basis points per tick,
+    rounded half up to a cent after every step (exact, see ``walk``).
+    """
+
+    name = "walk"
+
+    def __init__(self, prices, rng=None, low: int = 9800, high: int = 10200):
+        super().__init__(prices, rng)
+        self.low = low
+        self.high = high
+
+    def path(self, ticks: int):
+        steps = self.rng.integers(self.low, self.high + 1, size=(ticks, len(self.prices)))
+        path = walk(self.prices, steps)
+        if ticks:
+            self.prices = path[-1]
+        return path
+
+
+def country_loadings(
+    countries: Sequence[str], market: float = 0.5, country: float = 0.5
+) -> Tuple[list, "np.ndarray", "np.ndarray"]:
+    """
+    Factor loadings for a one-market-factor plus one-factor-per-country
+    model. Returns (factor names, loadings (n, k), idiosyncratic weights
+    (n,)). Each stock's shock has unit variance, so two stocks in the same
+    country correlate at market² + country² and across countries at market².
+    """
+    if market ** 2 + country ** 2 > 1:
+        raise ValueError("market² + country² must not exceed 1")
+    names = sorted(set(countries))
+    column = {name: index + 1 for index, name in enumerate(names)}
+    loadings = np.zeros((len(countries), len(names) + 1))
+    loadings[:, 0] = market
+    loadings[np.arange(len(countries)), [column[name] for name in countries]] = country
+    idiosyncratic = np.full(len(countries), math.sqrt(1 - market ** 2 - country ** 2))
+    return ["market", *names], loadings, idiosyncratic
+
+
+class CorrelatedGBM(PriceModel):
+    """
+    Geometric Brownian motion with correlated shocks:
+
+        log S[t+1] = log S[t] + (mu - sigma² / 2) + sigma * z[t]
+        z[t] = loadings @ f[t] + idiosyncratic * e[t]
+
+    with ``f`` one standard normal draw per factor and ``e`` one per
+    instrument, ``mu`` and ``sigma`` per tick. The log prices are kept in
+    float64 and only the returned path is rounded to cents, so rounding
+    never feeds back into the walk. A batch of ticks is one (ticks, k) @
+    (k, n) product plus a cumulative sum.
+    """
+
+    name = "gbm"
+
+    def __init__(
+        self,
+        prices,
+        rng=None,
+        loadings=None,
+        idiosyncratic=None,
+        sigma: float = 0.01,
+        mu: float = 0.0,
+    ):
+        super().__init__(prices, rng)
+        n = len(self.prices)
+        self.loadings = np.zeros((n, 0)) if loadings is None else np.asarray(loadings, dtype=np.float64)
+        self.idiosyncratic = (
+            np.ones(n) if idiosyncratic is None else np.asarray(idiosyncratic, dtype=np.float64)
+        )
+        self.sigma = sigma
+        self.drift = mu - sigma ** 2 / 2
+        # Pre-scaled by sigma so a tick is one product and one multiply-add
+        self.factor_weights = np.ascontiguousarray((self.loadings * sigma).T)
+        self.noise_weights = self.idiosyncratic * sigma
+        self.log_prices = np.log(np.maximum(self.prices, MIN_PRICE).astype(np.float64))
+
+    @classmethod
+    def from_stocks(cls, stocks, rng=None, market: float = 0.5, country: float = 0.5, **params):
+        """Load every stock on the market factor and on its company's country factor"""
+        _names, loadings, idiosyncratic = country_loadings(
+            [stock.company.country for stock in stocks], market, country
+        )
+        return cls(
+            [to_cents(stock.price) for stock in stocks],
+            rng,
+            loadings=loadings,
+            idiosyncratic=idiosyncratic,
+            **params,
+        )
+
+    def correlation(self, i: int, j: int) -> float:
+        """Implied correlation of the per-tick shocks of instruments ``i`` and ``j``"""
+
+        def variance(k):
+            return self.loadings[k] @ self.loadings[k] + self.idiosyncratic[k] ** 2
+
+        covariance = self.loadings[i] @ self.loadings[j] + (self.idiosyncratic[i] ** 2 if i == j else 0)
+        return float(covariance / (variance(i) * variance(j)) ** 0.5)
+
+    def path(self, ticks: int):
+        n, k = self.loadings.shape
+        shocks = self.rng.standard_normal((ticks, k)) @ self.factor_weights
+        shocks += self.rng.standard_normal((ticks, n)) * self.noise_weights
+        shocks += self.drift
+        log_path = np.cumsum(shocks, axis=0, out=shocks) if ticks > 1 else shocks
+        log_path += self.log_prices
+        if ticks:
+            self.log_prices = log_path[-1].copy()
+        path = np.rint(np.exp(log_path, out=log_path)).astype(np.int64)
+        np.maximum(path, MIN_PRICE, out=path)
+        if ticks:
+            self.prices = path[-1]
+        return path
+
+
+PRICE_MODELS: Dict[str, type] = {model.name: model for model in (RandomWalk, CorrelatedGBM)}
+
+
+def price_model(name: str, stocks, rng=None, **params) -> PriceModel:
+    """The registered model ``name`` built for ``stocks``"""
+    try:
+        model = PRICE_MODELS[name]
+    except KeyError:
+        raise ValueError(f"Unknown price model {name!r}; choose from {', '.join(PRICE_MODELS)}")
+    return model.from_stocks(stocks, rng, **params)
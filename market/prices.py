@@ -0,0 +1,46 @@
+"""
+Fixed-point prices: integer cents in the matching and simulation hot paths
+
+Every in-memory market row (StepWriter, order books, vectorized simulation,
+event log) carries prices as integer cents. ``Decimal`` only appears where
+rows meet the database or the API, through ``to_cents`` / ``from_cents``.
+Integer arithmetic is exact, so long runs cannot accumulate rounding drift.
+"""
+
+from decimal import ROUND_HALF_UP, Decimal
+from typing import Dict
+
+CENTS = 100
+BASIS_POINTS = 10000
+MIN_PRICE = 1  # One cent: random walks never reach zero
+
+_decimals: Dict[int, Decimal] = {}
+
+
+def to_cents(value) -> int:
+    """Decimal, int or numeric string in currency units -> integer cents (half up)"""
+    if not isinstance(value, Decimal):
+        value = Decimal(str(value))
+    return int(value.scaleb(2).quantize(Decimal(1), rounding=ROUND_HALF_UP))
+
+
+def from_cents(cents: int) -> Decimal:
+    """Integer cents -> Decimal with two places (cached: prices repeat a lot)"""
+    value = _decimals.get(cents)
+    if value is None:
+        if len(_decimals) > 1_000_000:
+            _decimals.clear()
+        value = _decimals[cents] = Decimal(cents).scaleb(-2)
+    return value
+
+
+def format_cents(cents: int) -> str:
+    """Integer cents -> "123.45" without going through Decimal or float"""
+    sign = "-" if cents < 0 else ""
+    units, rest = divmod(abs(cents), CENTS)
+    return f"{sign}{units}.{rest:02d}"
+
+
+def scale(cents: int, basis_points: int) -> int:
+    """``cents * basis_points / 10000`` rounded half up, floored at one cent"""
+    return max(MIN_PRICE, (cents * basis_points + BASIS_POINTS // 2) // BASIS_POINTS)
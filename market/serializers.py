@@ -1,5 +1,5 @@
 from rest_framework import serializers
-from .models import Company, Product, Stock, Trade, StockTransaction
+from .models import Company, Product, Stock, Trade, StockTransaction, Candle, Holding, MarketIndex, IndexLevel, Settlement, SettlementBatch
 
 class CompanySerializer(serializers.ModelSerializer):
     class Meta:
@@ -26,3 +26,36 @@ class StockTransactionSerializer(serializers.ModelSerializer):
     class Meta:
         model = StockTransaction
         fields = '__all__'
+
+class CandleSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Candle
+        fields = ['bucket', 'open', 'high', 'low', 'close', 'volume']
+
+class HoldingSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Holding
+        fields = ['company', 'stock', 'shares']
+
+class MarketIndexSerializer(serializers.ModelSerializer):
+    name = serializers.CharField(read_only=True)
+    level = serializers.FloatField(read_only=True)
+
+    class Meta:
+        model = MarketIndex
+        fields = ['id', 'name', 'country', 'level', 'market_cap', 'updated_at']
+
+class IndexLevelSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = IndexLevel
+        fields = ['timestamp', 'level']
+
+class SettlementSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Settlement
+        fields = ['id', 'batch', 'timestamp', 'payer', 'payee', 'amount', 'payer_gross', 'payee_gross', 'trade_count']
+
+class SettlementBatchSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = SettlementBatch
+        fields = ['id', 'window_start', 'window_end', 'trade_count', 'pair_count', 'gross_amount', 'net_amount', 'created_at']
@@ -0,0 +1,171 @@
+"""
+Bilateral netting of company-to-company trades into settlement batches
+
+Every trade is an obligation of its buyer to its seller for quantity *
+price. Over a settlement window the obligations between two companies are
+netted into one Settlement per pair, so settling a window takes one
+payment per pair instead of one per trade.
+"""
+
+import logging
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, Iterator, Optional, Tuple
+
+from django.db import connections, transaction
+from django.db.models import Max, Min
+
+from .candles import bucket_start
+from .models import Settlement, SettlementBatch, Trade
+from .prices import from_cents, to_cents
+
+logger = logging.getLogger(__name__)
+
+# One pass over the window's trades: the hash aggregate is the sparse pair
+# matrix, keyed by (lower id, higher id) with what each side owes the other.
+# Memory is bounded by the number of pairs (PostgreSQL spills to disk past
+# work_mem), never by the number of trades.
+NET_SQL = """
+    WITH pairs AS (
+        SELECT LEAST(buyer_id, seller_id) AS low,
+               GREATEST(buyer_id, seller_id) AS high,
+               SUM(CASE WHEN buyer_id < seller_id THEN quantity * price_per_unit ELSE 0 END) AS low_owes,
+               SUM(CASE WHEN buyer_id > seller_id THEN quantity * price_per_unit ELSE 0 END) AS high_owes,
+               COUNT(*) AS trades
+        FROM market_trade
+        WHERE "timestamp" >= %(start)s AND "timestamp" < %(end)s AND buyer_id <> seller_id
+        GROUP BY 1, 2
+    )
+    INSERT INTO market_settlement
+        (batch_id, payer_id, payee_id, amount, payer_gross, payee_gross, trade_count, "timestamp")
+    SELECT %(batch)s,
+           CASE WHEN low_owes >= high_owes THEN low ELSE high END,
+           CASE WHEN low_owes >= high_owes THEN high ELSE low END,
+           ABS(low_owes - high_owes),
+           GREATEST(low_owes, high_owes),
+           LEAST(low_owes, high_owes),
+           trades,
+           %(end)s
+    FROM pairs
+"""
+
+TOTALS_SQL = """
+    SELECT COUNT(*), COALESCE(SUM(trade_count), 0),
+           COALESCE(SUM(payer_gross + payee_gross), 0), COALESCE(SUM(amount), 0)
+    FROM market_settlement
+    WHERE batch_id = %s
+"""
+
+
+def net_obligations(rows: Iterable[tuple]) -> Dict[Tuple[int, int], list]:
+    """
+    Fold (buyer_id, seller_id, amount in cents) rows into {(low id, high id):
+    [cents low owes high, cents high owes low, trade count]}. Self-trades
+    are skipped.
+    """
+    pairs = defaultdict(lambda: [0, 0, 0])
+    for buyer_id, seller_id, cents in rows:
+        if buyer_id == seller_id:
+            continue
+        if buyer_id < seller_id:
+            entry = pairs[(buyer_id, seller_id)]
+            entry[0] += cents
+        else:
+            entry = pairs[(seller_id, buyer_id)]
+            entry[1] += cents
+        entry[2] += 1
+    return pairs
+
+
+def _settlements(batch: SettlementBatch, pairs: Dict[Tuple[int, int], list]) -> Iterator[Settlement]:
+    for (low, high), (low_owes, high_owes, trades) in pairs.items():
+        payer, payee = (low, high) if low_owes >= high_owes else (high, low)
+        yield Settlement(
+            batch=batch,
+            payer_id=payer,
+            payee_id=payee,
+            amount=from_cents(abs(low_owes - high_owes)),
+            payer_gross=from_cents(max(low_owes, high_owes)),
+            payee_gross=from_cents(min(low_owes, high_owes)),
+            trade_count=trades,
+            timestamp=batch.window_end,
+        )
+
+
+def _net_orm(batch: SettlementBatch, chunk_size: int, using: str):
+    """Fallback for other databases: stream the window's trades through ``net_obligations``"""
+    trades = (
+        Trade.objects.using(using)
+        .filter(timestamp__gte=batch.window_start, timestamp__lt=batch.window_end)
+        .values_list("buyer_id", "seller_id", "quantity", "price_per_unit")
+        .iterator(chunk_size=chunk_size)
+    )
+    pairs = net_obligations(
+        (buyer_id, seller_id, quantity * to_cents(price))
+        for buyer_id, seller_id, quantity, price in trades
+    )
+    Settlement.objects.using(using).bulk_create(_settlements(batch, pairs), batch_size=chunk_size)
+
+
+def settle_window(
+    start: datetime,
+    end: datetime,
+    replace: bool = False,
+    chunk_size: int = 10000,
+    using: str = "default",
+) -> Optional[SettlementBatch]:
+    """
+    Net the trades with start <= timestamp < end into a SettlementBatch, in
+    one transaction. An existing batch for the same window is kept (and None
+    returned) unless ``replace`` is set; a window that overlaps a different
+    existing batch is refused so no trade is settled twice.
+    """
+    with transaction.atomic(using=using):
+        batches = SettlementBatch.objects.using(using)
+        overlapping = batches.select_for_update().filter(window_start__lt=end, window_end__gt=start)
+        for batch in overlapping:
+            if (batch.window_start, batch.window_end) != (start, end):
+                raise ValueError(
+                    f"Window [{start}, {end}) overlaps settlement batch {batch.pk} "
+                    f"[{batch.window_start}, {batch.window_end})"
+                )
+            if not replace:
+                return None
+            batch.delete()
+
+        batch = batches.create(window_start=start, window_end=end)
+        connection = connections[using]
+        if connection.vendor == "postgresql":
+            with connection.cursor() as cursor:
+                cursor.execute(NET_SQL, {"batch": batch.pk, "start": start, "end": end})
+        else:
+            _net_orm(batch, chunk_size, using)
+        with connection.cursor() as cursor:
+            cursor.execute(TOTALS_SQL, [batch.pk])
+            totals = cursor.fetchone()
+
+        batch.pair_count, batch.trade_count, batch.gross_amount, batch.net_amount = totals
+        batch.save(update_fields=["pair_count", "trade_count", "gross_amount", "net_amount"])
+    return batch
+
+
+def pending_windows(
+    seconds: int, end: datetime, start: Optional[datetime] = None, using: str = "default"
+) -> Iterator[Tuple[datetime, datetime]]:
+    """
+    Complete ``seconds``-wide windows ending no later than ``end``, from
+    ``start`` or else from the end of the last batch (the oldest trade's
+    window when nothing has been settled yet).
+    """
+    if start is None:
+        start = SettlementBatch.objects.using(using).aggregate(last=Max("window_end"))["last"]
+    if start is None:
+        oldest = Trade.objects.using(using).aggregate(first=Min("timestamp"))["first"]
+        if oldest is None:
+            return
+        start = bucket_start(oldest, seconds)
+
+    width = timedelta(seconds=seconds)
+    while start + width <= end:
+        yield start, start + width
+        start += width
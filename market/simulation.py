@@ -0,0 +1,133 @@
+"""
+Vectorized market simulation: whole tick batches for every stock and product at once
+
+Prices are int64 arrays of cents (see ``market.prices``).
+"""
+
+import logging
+from typing import Optional, Sequence
+
+try:
+    import numpy as np
+
+    HAS_NUMPY = True
+except ImportError:  # NumPy is only required for vectorized runs
+    HAS_NUMPY = False
+
+from .price_models import PriceModel, RandomWalk
+
+logger = logging.getLogger(__name__)
+
+
+class SimulationBatch:
+    """Column arrays produced by one vectorized simulation run"""
+
+    def __init__(self, **columns):
+        self.__dict__.update(columns)
+
+    @property
+    def trade_count(self) -> int:
+        return len(self.trade_product)
+
+    @property
+    def transaction_count(self) -> int:
+        return len(self.tx_stock)
+
+
+class VectorizedMarket:
+    """
+    Generates trades and stock transactions as NumPy array operations.
+
+    Every tick produces one trade per product and one stock transaction per
+    stock. Product prices follow a +/-5% random walk and stock prices follow
+    ``stock_model`` (see ``market.price_models``; by default a +/-2% random
+    walk, like the scalar simulator). Counterparties are drawn so a company
+    never trades with itself, and stock transactions are only accepted while
+    the cumulative shares stay within ``available_shares``.
+    """
+
+    def __init__(
+        self,
+        company_ids: Sequence[int],
+        product_ids: Sequence[int],
+        product_prices: Sequence[int],
+        stock_ids: Sequence[int],
+        stock_prices: Sequence[int],
+        stock_available: Sequence[int],
+        seed: Optional[int] = None,
+        stock_model: Optional[PriceModel] = None,
+    ):
+        if not HAS_NUMPY:
+            raise ImportError("NumPy is required for vectorized market simulation")
+        if len(company_ids) < 2:
+            raise ValueError("At least two companies are needed to simulate trades")
+
+        self.rng = np.random.default_rng(seed)
+        self.company_ids = np.asarray(company_ids, dtype=np.int64)
+        self.product_ids = np.asarray(product_ids, dtype=np.int64)
+        self.product_prices = np.asarray(product_prices, dtype=np.int64)
+        self.stock_ids = np.asarray(stock_ids, dtype=np.int64)
+        self.stock_prices = np.asarray(stock_prices, dtype=np.int64)
+        self.stock_available = np.asarray(stock_available, dtype=np.int64)
+        self.product_model = RandomWalk(self.product_prices, self.rng, 9500, 10500)
+        if stock_model is None:
+            stock_model = RandomWalk(self.stock_prices, self.rng, 9800, 10200)
+        self.stock_model = stock_model  # Draws from its own generator, if it was given one
+
+    def update_stocks(self, prices: Sequence[int], available: Sequence[int]):
+        """Replace the stocks' last prices (cents) and available shares, e.g. with the settled state"""
+        self.stock_prices = np.asarray(prices, dtype=np.int64)
+        self.stock_available = np.asarray(available, dtype=np.int64)
+
+    def _counterparties(self, shape):
+        """Draw (first, second) company ids with first != second everywhere"""
+        n = len(self.company_ids)
+        first = self.rng.integers(0, n, size=shape)
+        second = (first + self.rng.integers(1, n, size=shape)) % n
+        return self.company_ids[first], self.company_ids[second]
+
+    def run(self, ticks: int) -> SimulationBatch:
+        """Simulate ``ticks`` ticks and return the generated rows as columns"""
+        rng = self.rng
+        n_products = len(self.product_ids)
+        n_stocks = len(self.stock_ids)
+
+        # Product trades: one per product per tick along a random price path
+        product_paths = self.product_model.path(ticks)
+        sellers, buyers = self._counterparties((ticks, n_products))
+        quantities = rng.integers(1, 101, size=(ticks, n_products))
+
+        # Stock transactions: one per stock per tick, accepted while shares last
+        stock_paths = self.stock_model.path(ticks)
+        tx_buyers, tx_sellers = self._counterparties((ticks, n_stocks))
+        shares = rng.integers(1, 1001, size=(ticks, n_stocks))
+        accepted = np.cumsum(shares, axis=0) <= self.stock_available
+
+        # Last accepted price per stock becomes the new stock price
+        has_fill = accepted.any(axis=0)
+        last_tick = ticks - 1 - np.argmax(accepted[::-1], axis=0)
+        last_price = stock_paths[last_tick, np.arange(n_stocks)]
+        new_prices = np.where(has_fill, last_price, self.stock_prices)
+        new_available = self.stock_available - np.where(accepted, shares, 0).sum(axis=0)
+
+        self.product_prices = product_paths[-1]
+        self.stock_prices = new_prices
+        self.stock_available = new_available
+
+        stock_grid = np.broadcast_to(self.stock_ids, (ticks, n_stocks))
+        return SimulationBatch(
+            trade_product=np.broadcast_to(self.product_ids, (ticks, n_products)).ravel(),
+            trade_seller=sellers.ravel(),
+            trade_buyer=buyers.ravel(),
+            trade_quantity=quantities.ravel(),
+            trade_price=product_paths.ravel(),
+            tx_stock=stock_grid[accepted],
+            tx_buyer=tx_buyers[accepted],
+            tx_seller=tx_sellers[accepted],
+            tx_shares=shares[accepted],
+            tx_price=stock_paths[accepted],
+            stock_ids=self.stock_ids,
+            stock_prices=new_prices,
+            stock_available=new_available,
+            stock_changed=has_fill,
+        )
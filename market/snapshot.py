@@ -0,0 +1,231 @@
+"""
+In-memory market snapshot for dashboards: every stock's last price and day statistics
+
+The snapshot is loaded once per process, then kept current from the
+"price" events published by ``market.events``, received through the
+process's event broadcaster (``market.streaming``, one LISTEN connection
+per process). Each stock's JSON fragment is re-encoded only when the stock
+changes, and the full response body is assembled at most once per version,
+so serving it is a dictionary lookup and a memory copy.
+
+Without PostgreSQL there are no events; the snapshot is then reloaded
+every RESYNC_SECONDS.
+"""
+
+import hashlib
+import json
+import logging
+import threading
+import time
+from datetime import timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from django.db import connections
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .candles import bucket_start
+from .models import Candle, Stock
+from .prices import format_cents, to_cents
+from .streaming import broadcaster
+
+logger = logging.getLogger(__name__)
+
+DAY_SECONDS = 86400
+RESYNC_SECONDS = 300  # Full reload interval; also bounds the effect of a missed event
+
+
+class StockDay:
+    """One stock's last price and statistics for the current (UTC) day, in cents"""
+
+    __slots__ = ("company", "price", "reference", "volume", "high", "low")
+
+    def __init__(self, company: str, price: int, reference: int, volume=0, high=None, low=None):
+        self.company = company
+        self.price = price
+        self.reference = reference  # Previous day's close, else today's open
+        self.volume = volume
+        self.high = high
+        self.low = low
+
+    def roll(self):
+        """Start a new day from the last price"""
+        self.reference = self.price
+        self.volume = 0
+        self.high = self.low = None
+
+    def encode(self, stock_id: int) -> bytes:
+        change = self.price - self.reference
+        return json.dumps(
+            {
+                "id": stock_id,
+                "company": self.company,
+                "price": format_cents(self.price),
+                "change": format_cents(change),
+                "change_percent": round(change * 100 / self.reference, 2) if self.reference else None,
+                "volume": self.volume,
+                "high": None if self.high is None else format_cents(self.high),
+                "low": None if self.low is None else format_cents(self.low),
+            },
+            separators=(",", ":"),
+        ).encode()
+
+
+class MarketSnapshot:
+    """
+    Process-wide snapshot. ``render()`` returns (etag, body); the ETag is a
+    hash of the content, so every process serving the same market state
+    hands out the same ETag.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.stocks: Dict[int, StockDay] = {}
+        self.fragments: Dict[int, bytes] = {}
+        self.dirty = set()
+        self.day = None
+        self.loaded_at = 0.0
+        self.rendered: Optional[Tuple[str, bytes]] = None
+        self.stale = True  # Reload before the next render
+        self.watching = False
+
+    def load(self, using: str = "default"):
+        """Rebuild the snapshot from the stocks and today's daily candles"""
+        now = timezone.now()
+        today = bucket_start(now, DAY_SECONDS)
+        candles = Candle.objects.using(using).filter(interval="1d")
+        current = {
+            stock_id: (open_, high, low, volume)
+            for stock_id, open_, high, low, volume in candles.filter(bucket=today).values_list(
+                "stock_id", "open", "high", "low", "volume"
+            )
+        }
+        previous = dict(
+            candles.filter(bucket=today - timedelta(days=1)).values_list("stock_id", "close")
+        )
+
+        stocks = {}
+        for pk, company, price in Stock.objects.using(using).order_by("pk").values_list(
+            "pk", "company__name", "price"
+        ):
+            price = to_cents(price)
+            open_, high, low, volume = current.get(pk, (None, None, None, 0))
+            reference = previous.get(pk, open_)
+            stocks[pk] = StockDay(
+                company,
+                price,
+                price if reference is None else to_cents(reference),
+                volume,
+                None if high is None else to_cents(high),
+                None if low is None else to_cents(low),
+            )
+
+        with self.lock:
+            self.stocks = stocks
+            self.fragments = {}
+            self.dirty = set(stocks)
+            self.day = today
+            self.rendered = None
+            self.loaded_at = time.monotonic()
+            self.stale = False
+
+    def apply(self, events: Iterable[dict]) -> bool:
+        """
+        Fold "price" events into the snapshot. Returns False when an event
+        refers to a stock the snapshot does not know (a reload is needed).
+
+        An event stamped on a later day starts that day first. One stamped
+        on an earlier day is not part of today's statistics; it only sets
+        the price (and the reference close) of a stock with no fill today.
+        """
+        known = True
+        with self.lock:
+            self._roll_day()
+            for event in events:
+                if event.get("type") != "price":
+                    continue
+                stock = self.stocks.get(event["stock"])
+                if stock is None:
+                    known = False
+                    continue
+                price = to_cents(event["price"])
+                stamp = parse_datetime(event["timestamp"]) if "timestamp" in event else timezone.now()
+                day = bucket_start(stamp, DAY_SECONDS)
+                if day > self.day:
+                    self._roll_to(day)
+                elif day < self.day:
+                    if stock.high is None:
+                        stock.price = stock.reference = price
+                        self.dirty.add(event["stock"])
+                        self.rendered = None
+                    continue
+                stock.price = price
+                high = to_cents(event.get("high", event["price"]))
+                low = to_cents(event.get("low", event["price"]))
+                stock.high = high if stock.high is None else max(stock.high, high)
+                stock.low = low if stock.low is None else min(stock.low, low)
+                stock.volume += event["volume"]
+                self.dirty.add(event["stock"])
+                self.rendered = None
+        return known
+
+    def on_events(self, events: Optional[List[dict]]):
+        """
+        Broadcaster watcher. ``None`` (LISTEN was re-established, events may
+        have been missed) or an unknown stock marks the snapshot stale, and
+        the next render reloads it.
+        """
+        if events is None or not self.apply(events):
+            self.stale = True
+
+    def _roll_day(self):
+        today = bucket_start(timezone.now(), DAY_SECONDS)
+        if self.day is not None and today > self.day:
+            self._roll_to(today)
+
+    def _roll_to(self, day):
+        for stock in self.stocks.values():
+            stock.roll()
+        self.dirty = set(self.stocks)
+        self.day = day
+        self.rendered = None
+
+    def render(self) -> Tuple[str, bytes]:
+        """(ETag, JSON body) of the current snapshot"""
+        self.ensure_started()
+        if self.stale or time.monotonic() - self.loaded_at > RESYNC_SECONDS:
+            self.load()
+        rendered = self.rendered
+        if rendered is not None and bucket_start(timezone.now(), DAY_SECONDS) == self.day:
+            return rendered
+
+        with self.lock:
+            self._roll_day()
+            if self.rendered is None:
+                for pk in self.dirty:
+                    self.fragments[pk] = self.stocks[pk].encode(pk)
+                self.dirty = set()
+                stocks = b"[" + b",".join(self.fragments[pk] for pk in sorted(self.fragments)) + b"]"
+                version = hashlib.blake2b(stocks, digest_size=8).hexdigest()
+                body = (
+                    f'{{"version":"{version}","day":"{self.day.date().isoformat()}","stocks":'.encode()
+                    + stocks
+                    + b"}"
+                )
+                self.rendered = (f'"{version}"', body)
+            return self.rendered
+
+    def ensure_started(self):
+        """Start following market events through the broadcaster (idempotent)"""
+        if self.watching:
+            return
+        with self.lock:
+            if self.watching:
+                return
+            self.watching = True
+        if connections["default"].vendor == "postgresql":
+            broadcaster.watch(self.on_events)
+            broadcaster.start()
+
+
+snapshot = MarketSnapshot()
@@ -0,0 +1,284 @@
+"""
+Server-Sent Events feed of live market events for ASGI deployments
+
+One LISTEN connection per process receives the events published by
+``market.events`` and fans them out to per-stock subscriber queues. Each
+subscriber is a coroutine waiting on its own bounded queue, so thousands of
+idle clients cost memory, not threads. In-process consumers such as the
+market snapshot watch the same connection (see ``Broadcaster.watch``).
+"""
+
+import asyncio
+import json
+import logging
+import threading
+from collections import defaultdict
+from typing import Callable, Dict, List, Optional, Set
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.db import connections
+from django.http import HttpResponse, StreamingHttpResponse
+
+from .events import CHANNEL
+
+logger = logging.getLogger(__name__)
+
+TRADES_TOPIC = "trades"
+HEARTBEAT_SECONDS = 15
+QUEUE_SIZE = 1000
+
+
+class Subscriber:
+    """
+    A client's bounded event queue.
+
+    When a slow client lets its queue fill up, the oldest events are dropped
+    and the client is sent a "lagged" event with the number of events it
+    missed, so it can re-sync from the REST endpoints.
+    """
+
+    def __init__(self, topics: Set, maxsize: int = QUEUE_SIZE):
+        self.topics = topics
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=maxsize)
+        self.dropped = 0
+        self.loop = asyncio.get_running_loop()
+
+    def offer(self, event: dict):
+        if _running_loop() is not self.loop:
+            # The listener runs on its own thread: hand over to the client's loop
+            self.loop.call_soon_threadsafe(self.offer, event)
+            return
+        if self.queue.full():
+            self.queue.get_nowait()
+            self.dropped += 1
+        self.queue.put_nowait(event)
+
+    async def next_event(self, timeout: float) -> Optional[dict]:
+        if self.dropped:
+            dropped, self.dropped = self.dropped, 0
+            return {"type": "lagged", "dropped": dropped}
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+
+class Broadcaster:
+    """
+    Routes events to the subscribers of their stock (or the trades topic),
+    and every batch of events to the watchers.
+    """
+
+    def __init__(self):
+        self.topics: Dict[object, Set[Subscriber]] = defaultdict(set)
+        self.watchers: List[Callable[[Optional[List[dict]]], None]] = []
+        self._listener: Optional[asyncio.Task] = None
+        self._thread: Optional[threading.Thread] = None
+
+    def watch(self, callback: Callable[[Optional[List[dict]]], None]):
+        """
+        Call ``callback(events)`` with every batch of events, on the listener's
+        thread, and ``callback(None)`` each time LISTEN is (re)established:
+        events published before that may have been missed.
+        """
+        self.watchers.append(callback)
+
+    def subscribe(self, topics: Set) -> Subscriber:
+        subscriber = Subscriber(topics)
+        for topic in topics:
+            self.topics[topic].add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber: Subscriber):
+        for topic in subscriber.topics:
+            subscribers = self.topics.get(topic)
+            if subscribers is not None:
+                subscribers.discard(subscriber)
+                if not subscribers:
+                    del self.topics[topic]
+
+    def publish(self, event: dict):
+        topic = event.get("stock", TRADES_TOPIC if event.get("type") == "trade" else None)
+        for subscriber in tuple(self.topics.get(topic, ())):
+            subscriber.offer(event)
+
+    def _notify_watchers(self, events: Optional[List[dict]]):
+        for callback in self.watchers:
+            try:
+                callback(events)
+            except Exception as e:
+                logger.error(f"Market event watcher failed: {e}")
+
+    def start(self):
+        """
+        Start listening (idempotent): as a task on the running event loop, or
+        from synchronous code on a daemon thread with an event loop of its own.
+        """
+        if self._thread is not None and self._thread.is_alive():
+            return
+        if self._listener is not None and not self._listener.done():
+            return
+        loop = _running_loop()
+        if loop is not None:
+            self._listener = loop.create_task(self._listen())
+        else:
+            self._thread = threading.Thread(
+                target=asyncio.run, args=(self._listen(),), name="market-events", daemon=True
+            )
+            self._thread.start()
+
+    async def stop(self):
+        if self._listener is not None:
+            self._listener.cancel()
+            try:
+                await self._listener
+            except asyncio.CancelledError:
+                pass
+            self._listener = None
+
+    async def _listen(self):
+        """
+        Receive NOTIFY payloads without a thread, reconnecting with backoff.
+        The connection is in psycopg2's asynchronous mode, so connecting,
+        LISTEN and reading notifications never block the event loop.
+        """
+        import psycopg2
+
+        backoff = 1
+        while True:
+            conn = None
+            try:
+                params = connections["default"].get_connection_params()
+                params.pop("cursor_factory", None)
+                conn = psycopg2.connect(**params, async_=True)  # Always autocommit
+                await _wait(conn)
+                cursor = conn.cursor()  # Must outlive the pending query
+                cursor.execute(f"LISTEN {CHANNEL}")
+                await _wait(conn)
+                logger.info("Listening for market events")
+                backoff = 1
+                self._notify_watchers(None)
+
+                while True:
+                    await _readable(conn.fileno())
+                    conn.poll()
+                    while conn.notifies:
+                        events = json.loads(conn.notifies.pop(0).payload)
+                        for event in events:
+                            self.publish(event)
+                        self._notify_watchers(events)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Market event listener failed, retrying in {backoff}s: {e}")
+                await asyncio.sleep(backoff)
+                backoff = min(backoff * 2, 30)
+            finally:
+                if conn is not None:
+                    conn.close()
+
+
+def _running_loop() -> Optional[asyncio.AbstractEventLoop]:
+    try:
+        return asyncio.get_running_loop()
+    except RuntimeError:
+        return None
+
+
+async def _readable(fd: int, writable: bool = False):
+    """Wait until the event loop sees ``fd`` readable (or writable)"""
+    loop = asyncio.get_running_loop()
+    ready = loop.create_future()
+    add, remove = (loop.add_writer, loop.remove_writer) if writable else (loop.add_reader, loop.remove_reader)
+    add(fd, lambda: ready.done() or ready.set_result(None))
+    try:
+        await ready
+    finally:
+        remove(fd)
+
+
+async def _wait(conn):
+    """Drive an asynchronous psycopg2 connection until its pending operation completes"""
+    import psycopg2.extensions
+
+    while True:
+        state = conn.poll()
+        if state == psycopg2.extensions.POLL_OK:
+            return
+        await _readable(conn.fileno(), writable=state == psycopg2.extensions.POLL_WRITE)
+
+
+broadcaster = Broadcaster()
+
+
+def parse_topics(params) -> Set:
+    topics = set()
+    for value in params.get("stocks", "").split(","):
+        if value.strip().isdigit():
+            topics.add(int(value))
+    if params.get("trades") in ("1", "true", "yes"):
+        topics.add(TRADES_TOPIC)
+    return topics
+
+
+async def event_stream(subscriber: Subscriber):
+    try:
+        yield ": connected\n\n"
+        while True:
+            event = await subscriber.next_event(HEARTBEAT_SECONDS)
+            if event is None:
+                yield ": keepalive\n\n"
+                continue
+            yield f"event: {event['type']}\ndata: {json.dumps(event)}\n\n"
+    finally:
+        broadcaster.unsubscribe(subscriber)
+
+
+async def authenticate(request):
+    """
+    The session user, or else the user of a JWT access token sent as
+    ``Authorization: Bearer <token>`` (as for the REST API); None if neither.
+    """
+    from rest_framework.exceptions import AuthenticationFailed
+    from rest_framework_simplejwt.authentication import JWTAuthentication
+
+    user = await request.auser()
+    if user.is_authenticated:
+        return user
+    try:
+        result = await sync_to_async(JWTAuthentication().authenticate)(request)
+    except AuthenticationFailed:
+        return None
+    return result[0] if result else None
+
+
+async def market_stream(request):
+    """
+    SSE feed: ``market/stream/?stocks=1,2,3&trades=1``
+
+    Emits "price", "transaction" and "trade" events for the subscribed stocks
+    (and product trades if ``trades=1``), plus "lagged" if the client falls
+    behind. Only available when served by an ASGI server. Clients sign in
+    with a session or a JWT access token, like the REST endpoints.
+    """
+    if not isinstance(request, ASGIRequest):
+        return HttpResponse("Streaming requires the ASGI application.", status=501)
+
+    if not settings.DEBUG and await authenticate(request) is None:
+        response = HttpResponse("Authentication credentials were not provided.", status=401)
+        response["WWW-Authenticate"] = 'Bearer realm="api"'
+        return response
+
+    topics = parse_topics(request.GET)
+    if not topics:
+        return HttpResponse("Subscribe with ?stocks=<ids> and/or ?trades=1", status=400)
+
+    broadcaster.start()
+    response = StreamingHttpResponse(
+        event_stream(broadcaster.subscribe(topics)), content_type="text/event-stream"
+    )
+    response["Cache-Control"] = "no-cache"
+    response["X-Accel-Buffering"] = "no"  # Disable proxy buffering (nginx)
+    return response
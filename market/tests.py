@@ -1,3 +1,1407 @@
-from django.test import TestCase
+import gzip
+import io
+import itertools
+import json
+import math
+import multiprocessing
+import os
+import random
+import shutil
+import statistics
+import tempfile
+from unittest import mock
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+from decimal import ROUND_HALF_UP, Decimal
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import AnonymousUser
+from django.core.management import CommandError, call_command
+from django.db import DataError, connections, transaction
+from django.db.models import F, Q, Sum
+from django.test import AsyncRequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from api.models import ResourceVersion
+
+from .analytics import rolling_series, window_stats
+from .candles import rebuild_candles
+from .daemon import MarketDaemon, SyncFailed
+from .events import CHANNEL
+from .eventlog import EventLog, read_records, replay
+from .export import export_range, next_start, read_manifest, write_columns
+from .holdings import position_deltas, rebuild_holdings
+from .indices import fold_index_deltas, rebuild_indices, record_level
+from .ingest import caches, parse_rows
+from .models import ArchivedPartition, Candle, Company, Holding, IndexDelta, IndexLevel, MarketIndex, Product, Stock, StockTransaction, Trade
+from .management.commands import simulate_market
+from .management.commands.simulate_market import Command as SimulateCommand
+from .orderbook import BUY, SELL, Exchange, Order, OrderBook
+from .pagination import decode_cursor, encode_cursor
+from .partitions import create_partition, ensure_partitions, list_partitions, month_start, partition_name
+from .persistence import StepWriter, settle_transactions
+from .prices import format_cents, from_cents, scale, to_cents
+from .settlements import net_obligations
+from .simulation import VectorizedMarket
+from .snapshot import MarketSnapshot, snapshot
+from .streaming import authenticate, broadcaster, market_stream
+from .price_models import HAS_NUMPY, CorrelatedGBM, RandomWalk, country_loadings, walk
+
+
+def _hammer_stock(worker, stock_id, company_ids, steps):
+    """Worker process: mix single settled transactions and whole simulation steps on one stock"""
+    rng = random.Random(worker)
+    try:
+        for _ in range(steps):
+            if rng.random() < 0.5:
+                buyer, seller = rng.sample(company_ids, 2)
+                row = (stock_id, buyer, seller, rng.randint(1, 500), 1000)
+                with transaction.atomic():
+                    accepted, _state = settle_transactions([row])
+                    if accepted:
+                        StockTransaction.objects.create(
+                            stock_id=stock_id,
+                            buyer_id=buyer,
+                            seller_id=seller,
+                            shares=row[3],
+                            price_per_share=Decimal("10.00"),
+                        )
+            else:
+                writer = StepWriter()
+                for _ in range(rng.randint(1, 10)):
+                    buyer, seller = rng.sample(company_ids, 2)
+                    writer.add_transaction(
+                        stock_id, buyer, seller, rng.randint(1, 500), rng.randint(900, 1100)
+                    )
+                writer.flush()
+    finally:
+        connections.close_all()
+
+
+class ShareAccountingStressTest(TransactionTestCase):
+    """Many processes writing the same stock must conserve its shares"""
+
+    WORKERS = 6
+    STEPS = 40
+
+    def test_concurrent_writers_conserve_shares(self):
+        companies = [
+            Company.objects.create(name=f"Company {i}", country="Testland")
+            for i in range(5)
+        ]
+        total = 50000
+        stock = Stock.objects.create(
+            company=companies[0],
+            total_shares=total,
+            available_shares=total,
+            price=Decimal("10.00"),
+        )
+        company_ids = [company.id for company in companies]
+
+        connections.close_all()
+        context = multiprocessing.get_context("fork")
+        processes = [
+            context.Process(
+                target=_hammer_stock, args=(worker, stock.id, company_ids, self.STEPS)
+            )
+            for worker in range(self.WORKERS)
+        ]
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join()
+            self.assertEqual(process.exitcode, 0)
+
+        stock.refresh_from_db()
+        sold = StockTransaction.objects.filter(stock=stock).aggregate(
+            total=Sum("shares")
+        )["total"] or 0
+        self.assertGreaterEqual(stock.available_shares, 0)
+        self.assertEqual(stock.available_shares + sold, total)
+
+
+class IntegerPriceTest(SimpleTestCase):
+    """Integer-cent prices must follow the exact decimal arithmetic, however long the run"""
+
+    STEPS = 100000
+
+    def test_conversions(self):
+        self.assertEqual(to_cents(Decimal("123.45")), 12345)
+        self.assertEqual(to_cents(Decimal("0.005")), 1)
+        self.assertEqual(to_cents("19.99"), 1999)
+        self.assertEqual(from_cents(12345), Decimal("123.45"))
+        self.assertEqual(format_cents(5), "0.05")
+        self.assertEqual(format_cents(-12345), "-123.45")
+
+    def test_walk_has_no_rounding_drift(self):
+        rng = random.Random(7)
+        cents, exact = 10000, Decimal("100.00")
+        for _ in range(self.STEPS):
+            basis_points = rng.randint(9800, 10200)
+            cents = scale(cents, basis_points)
+            exact = max(
+                Decimal("0.01"),
+                (exact * basis_points / 10000).quantize(Decimal("0.01"), rounding=ROUND_HALF_UP),
+            )
+            self.assertEqual(from_cents(cents), exact)
+
+    def test_vectorized_walk_matches_scalar(self):
+        if not HAS_NUMPY:
+            self.skipTest("NumPy is not installed")
+        import numpy as np
+
+        steps = np.random.default_rng(3).integers(9500, 10501, size=(self.STEPS // 10, 8))
+        start = [1, 99, 1250, 10000, 12345, 99999, 250000, 999999]
+        path = walk(start, steps)
+        for column, cents in enumerate(start):
+            for tick in range(len(steps)):
+                cents = scale(cents, int(steps[tick, column]))
+            self.assertEqual(int(path[-1, column]), cents)
+
+
+class StepWriterPriceTest(TestCase):
+    """Cent rows written by StepWriter must land in the database exactly"""
+
+    def test_long_run_persists_exact_prices(self):
+        companies = [
+            Company.objects.create(name=f"Company {i}", country="Testland") for i in range(3)
+        ]
+        product = Product.objects.create(company=companies[0], name="Widget", price=Decimal("12.50"))
+        stock = Stock.objects.create(
+            company=companies[0], total_shares=10 ** 9, available_shares=10 ** 9, price=Decimal("100.00")
+        )
+
+        rng = random.Random(11)
+        trade_cents, stock_cents = 1250, 10000
+        trade_turnover = transaction_turnover = 0
+        for _ in range(50):
+            writer = StepWriter()
+            for _ in range(40):
+                trade_cents = scale(trade_cents, rng.randint(9500, 10500))
+                stock_cents = scale(stock_cents, rng.randint(9800, 10200))
+                quantity, shares = rng.randint(1, 100), rng.randint(1, 1000)
+                writer.add_trade(companies[1].pk, companies[2].pk, product.pk, quantity, trade_cents)
+                writer.add_transaction(stock.pk, companies[1].pk, companies[2].pk, shares, stock_cents)
+                trade_turnover += quantity * trade_cents
+                transaction_turnover += shares * stock_cents
+            writer.flush()
+
+        stock.refresh_from_db()
+        self.assertEqual(stock.price, from_cents(stock_cents))
+        self.assertEqual(
+            Trade.objects.aggregate(total=Sum(F("quantity") * F("price_per_unit")))["total"],
+            Decimal(trade_turnover).scaleb(-2),
+        )
+        self.assertEqual(
+            StockTransaction.objects.aggregate(total=Sum(F("shares") * F("price_per_share")))["total"],
+            Decimal(transaction_turnover).scaleb(-2),
+        )
+        self.assertEqual(
+            Candle.objects.filter(stock=stock, interval="1d").aggregate(total=Sum("turnover"))["total"],
+            Decimal(transaction_turnover).scaleb(-2),
+        )
+
+
+class StepWriterCopyTest(TestCase):
+    """StepWriter loads a step with COPY in batches, in one transaction"""
+
+    def setUp(self):
+        self.companies = [Company.objects.create(name=f"Company {i}", country="Testland") for i in range(3)]
+        self.product = Product.objects.create(company=self.companies[0], name="Widget", price=Decimal("1.00"))
+        self.stock = Stock.objects.create(
+            company=self.companies[0], total_shares=100, available_shares=100, price=Decimal("10.00")
+        )
+
+    def test_batches_nulls_and_rejections(self):
+        first, second = self.companies[1].pk, self.companies[2].pk
+        writer = StepWriter(batch_size=3)
+        writer.update_stock(self.stock)
+        writer.add_trades((first, second, self.product.pk, quantity, 1000 + quantity) for quantity in range(1, 8))
+        writer.add_transaction(self.stock.pk, first, None, 60, 1111)
+        writer.add_transaction(self.stock.pk, second, first, 60, 1222)  # Only 40 shares left
+        writer.add_transaction(self.stock.pk, second, first, 40, 1333)
+        timestamp = datetime(2026, 3, 4, 5, 6, 7, tzinfo=dt_timezone.utc)
+
+        self.assertEqual(writer.flush(timestamp), 7 + 2 + 1)  # Rows plus the one stock updated
+        self.assertEqual(writer.rejected, 1)
+        self.assertEqual(writer.rejected_indices, [1])
+        self.assertEqual(
+            sorted(Trade.objects.values_list("quantity", "price_per_unit")),
+            [(quantity, from_cents(1000 + quantity)) for quantity in range(1, 8)],
+        )
+        self.assertEqual(
+            list(StockTransaction.objects.order_by("id").values_list("seller_id", "shares", "price_per_share")),
+            [(None, 60, Decimal("11.11")), (first, 40, Decimal("13.33"))],
+        )
+        self.assertEqual(set(Trade.objects.values_list("timestamp", flat=True)), {timestamp})
+        self.assertEqual(set(StockTransaction.objects.values_list("timestamp", flat=True)), {timestamp})
+        # The tracked in-memory stock follows the settled row
+        self.assertEqual((self.stock.available_shares, self.stock.price), (0, Decimal("13.33")))
+        self.assertEqual(writer.trades, [])
+
+    def test_failed_flush_writes_nothing(self):
+        writer = StepWriter(batch_size=2)
+        writer.add_transaction(self.stock.pk, self.companies[1].pk, None, 10, 1100)
+        writer.add_trades((self.companies[1].pk, self.companies[2].pk, self.product.pk, 1, 100) for _ in range(4))
+        # Overflows numeric columns after the stock has been settled
+        writer.add_trade(self.companies[1].pk, self.companies[2].pk, self.product.pk, 1, 10**12)
+        with self.assertRaises(DataError):
+            writer.flush()
+        self.assertFalse(Trade.objects.exists())
+        self.assertFalse(StockTransaction.objects.exists())
+        self.stock.refresh_from_db()
+        self.assertEqual(self.stock.available_shares, 100)
+
+
+class CandleTest(TestCase):
+    """Flushes merge into OHLCV bars that match a rebuild from the history"""
+
+    def setUp(self):
+        self.client = APIClient(SERVER_NAME="localhost")
+        self.client.force_authenticate(get_user_model().objects.create(username="reader"))
+        self.companies = [Company.objects.create(name=f"Company {i}", country="Testland") for i in range(3)]
+        self.stock = Stock.objects.create(
+            company=self.companies[0], total_shares=10**6, available_shares=10**6, price=Decimal("10.00")
+        )
+
+    def flush(self, timestamp, fills):
+        writer = StepWriter()
+        for shares, cents in fills:
+            writer.add_transaction(self.stock.pk, self.companies[1].pk, self.companies[2].pk, shares, cents)
+        writer.flush(timestamp)
+
+    def bars(self, interval):
+        return list(
+            Candle.objects.filter(stock=self.stock, interval=interval)
+            .order_by("bucket")
+            .values_list("bucket", "open", "high", "low", "close", "volume", "turnover")
+        )
+
+    def test_incremental_bars_match_rebuild(self):
+        minute = datetime(2026, 5, 1, 9, 30, tzinfo=dt_timezone.utc)
+        self.flush(minute + timedelta(seconds=5), [(10, 1000), (5, 1200)])
+        self.flush(minute + timedelta(seconds=40), [(20, 900), (1, 1100)])
+        self.flush(minute + timedelta(minutes=1), [(3, 1300)])
+
+        self.assertEqual(self.bars("1m"), [
+            (minute, Decimal("10.00"), Decimal("12.00"), Decimal("9.00"), Decimal("11.00"), 36, Decimal("351.00")),
+            (minute + timedelta(minutes=1), *[Decimal("13.00")] * 4, 3, Decimal("39.00")),
+        ])
+        self.assertEqual(self.bars("1h"), [
+            (minute.replace(minute=0), Decimal("10.00"), Decimal("13.00"), Decimal("9.00"), Decimal("13.00"),
+             39, Decimal("390.00")),
+        ])
+
+        incremental = {interval: self.bars(interval) for interval in ("1m", "5m", "1h", "1d")}
+        rebuild_candles(keys=[self.stock.pk])
+        self.assertEqual({interval: self.bars(interval) for interval in incremental}, incremental)
+
+    def test_candle_endpoint(self):
+        minute = datetime(2026, 5, 1, 9, 30, tzinfo=dt_timezone.utc)
+        for offset in range(3):
+            self.flush(minute + timedelta(minutes=offset), [(1, 1000 + offset)])
+        url = f"/market/stocks/{self.stock.pk}/candles/"
+
+        response = self.client.get(url, {"interval": "1m", "from": (minute + timedelta(minutes=1)).isoformat()})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([row["close"] for row in response.data], ["10.01", "10.02"])
+
+        response = self.client.get(url, {"interval": "1d"})
+        self.assertEqual(
+            [(row["open"], row["close"], row["volume"]) for row in response.data], [("10.00", "10.02", 3)]
+        )
+
+        self.assertEqual(self.client.get(url, {"interval": "2m"}).status_code, 400)
+        self.assertEqual(self.client.get(url, {"from": "yesterday"}).status_code, 400)
+
+
+class MonthlyPartitionTest(TestCase):
+    """Rows are routed to their month's partition and expired months are archived"""
+
+    def setUp(self):
+        self.company = Company.objects.create(name="Company 0", country="Testland")
+        self.product = Product.objects.create(company=self.company, name="Widget", price=Decimal("20.00"))
+        self.old = datetime(2024, 3, 15, 12, tzinfo=dt_timezone.utc)
+        self.directory = tempfile.mkdtemp(prefix="market-archive-test-")
+        self.addCleanup(shutil.rmtree, self.directory)
+
+    def flush(self, timestamp):
+        writer = StepWriter()
+        writer.add_trade(self.company.pk, self.company.pk, self.product.pk, 1, 2000)
+        writer.flush(timestamp)
+
+    def rows_in(self, partition):
+        with connections["default"].cursor() as cursor:
+            cursor.execute(f"SELECT count(*) FROM {partition}")
+            return cursor.fetchone()[0]
+
+    def partitions(self):
+        return [name for name, _month in list_partitions("market_trade")]
+
+    def test_rows_route_by_month(self):
+        now = datetime.now(dt_timezone.utc)
+        current = partition_name("market_trade", month_start(now.date()))
+        self.assertIn(current, self.partitions())
+        self.assertIn(partition_name("market_trade", month_start(now.date(), 3)), self.partitions())
+
+        self.flush(now)
+        self.flush(self.old)  # No partition reaches that far back
+        self.assertEqual(self.rows_in(current), 1)
+        self.assertEqual(self.rows_in("market_trade_default"), 1)
+        self.assertEqual(Trade.objects.count(), 2)
+
+    def test_archive_expired_months(self):
+        with connections["default"].cursor() as cursor:
+            create_partition(cursor, "market_trade", month_start(self.old.date()))
+        self.flush(self.old)
+        self.flush(datetime.now(dt_timezone.utc))
+        self.assertEqual(self.rows_in("market_trade_p202403"), 1)
+        connections["default"].check_constraints()  # As a commit would, so the partition can be dropped
+
+        with self.assertRaises(CommandError):
+            call_command("archive_partitions", stdout=io.StringIO())
+        out = io.StringIO()
+        call_command("archive_partitions", dry_run=True, stdout=out)
+        self.assertIn("Would archive market_trade_p202403", out.getvalue())
+        self.assertIn("market_trade_p202403", self.partitions())
+
+        call_command("archive_partitions", export_dir=self.directory, stdout=io.StringIO())
+        self.assertNotIn("market_trade_p202403", self.partitions())
+        self.assertEqual(Trade.objects.count(), 1)
+        with gzip.open(os.path.join(self.directory, "market_trade_p202403.csv.gz"), "rt") as handle:
+            lines = handle.read().splitlines()
+        self.assertEqual(len(lines), 2)  # Header and the archived row
+        self.assertIn("2024-03-15", lines[1])
+
+    def test_rebuilds_keep_archived_months(self):
+        stock = Stock.objects.create(company=self.company, total_shares=100, available_shares=100, price=Decimal("10.00"))
+        with connections["default"].cursor() as cursor:
+            create_partition(cursor, "market_stocktransaction", month_start(self.old.date()))
+        for timestamp, price in ((self.old, 1100), (datetime.now(dt_timezone.utc), 1200)):
+            writer = StepWriter()
+            writer.add_transaction(stock.pk, self.company.pk, None, 10, price)
+            writer.flush(timestamp)
+        connections["default"].check_constraints()
+        call_command("archive_partitions", keep_tables=True, stdout=io.StringIO())
+        self.assertEqual(
+            list(ArchivedPartition.objects.filter(table="market_stocktransaction").values_list("month", flat=True)),
+            [date(2024, 3, 1)],
+        )
+
+        with self.assertRaisesMessage(CommandError, "archived"):
+            call_command("rebuild_holdings", stdout=io.StringIO())
+        self.assertEqual(Holding.objects.get(company=self.company).shares, 20)
+
+        rebuild_candles()
+        daily = Candle.objects.filter(stock=stock, interval="1d").order_by("bucket")
+        self.assertEqual([(bar.bucket.date(), bar.close) for bar in daily][0], (self.old.date(), Decimal("11.00")))
+        self.assertEqual(daily.count(), 2)
+
+
+class KeysetPaginationTest(TestCase):
+    """Cursors walk the (timestamp, id) order exactly once, across timestamp ties"""
+
+    def setUp(self):
+        self.client = APIClient(SERVER_NAME="localhost")
+        self.client.force_authenticate(get_user_model().objects.create(username="reader"))
+        self.companies = [Company.objects.create(name=f"Company {i}", country="Testland") for i in range(4)]
+        product = Product.objects.create(company=self.companies[0], name="Widget", price=Decimal("1.00"))
+        first = datetime(2026, 2, 1, 12, 0, tzinfo=dt_timezone.utc)
+        # Three rows share the first timestamp, four the second
+        for timestamp, pairs in ((first, [(1, 2), (2, 3), (1, 3)]), (first + timedelta(seconds=1), [(2, 1)] * 4)):
+            writer = StepWriter()
+            for seller, buyer in pairs:
+                writer.add_trade(self.companies[seller].pk, self.companies[buyer].pk, product.pk, 1, 100)
+            writer.flush(timestamp)
+        self.expected = list(Trade.objects.order_by("-timestamp", "-id").values_list("id", flat=True))
+
+    def walk(self, url, link):
+        pages = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            pages.append([row["id"] for row in response.data["results"]])
+            url = response.data[link]
+        return pages
+
+    def test_walk_forwards_and_back(self):
+        pages = self.walk("/market/trades/?page_size=2", "next")
+        self.assertEqual([len(page) for page in pages], [2, 2, 2, 1])
+        self.assertEqual(list(itertools.chain(*pages)), self.expected)
+
+        last = self.client.get("/market/trades/?page_size=2").data
+        while last["next"]:
+            last = self.client.get(last["next"]).data
+        back = self.walk(last["previous"], "previous")
+        self.assertEqual(list(itertools.chain(*reversed(back))), self.expected[:-1])
+
+    def test_company_filter_and_bad_cursors(self):
+        # Company 1 sells twice at the first timestamp and buys four times at the second
+        company = self.companies[1].pk
+        pages = self.walk(f"/market/trades/?page_size=4&company={company}", "next")
+        sides = set(Trade.objects.filter(Q(buyer=company) | Q(seller=company)).values_list("id", flat=True))
+        self.assertEqual(list(itertools.chain(*pages)), [pk for pk in self.expected if pk in sides])
+        self.assertEqual([len(page) for page in pages], [4, 2])
+
+        cursor = encode_cursor(datetime(2026, 2, 1, tzinfo=dt_timezone.utc), 5)
+        self.assertEqual(decode_cursor(cursor), (datetime(2026, 2, 1, tzinfo=dt_timezone.utc), 5))
+        self.assertEqual(self.client.get("/market/trades/?after=bm9wZQ").status_code, 400)
+        self.assertEqual(self.client.get(f"/market/trades/?after={cursor}&before={cursor}").status_code, 400)
+
+
+class HoldingsTest(TestCase):
+    """Fills are upserted into positions that a rebuild from the history reproduces"""
+
+    def setUp(self):
+        self.client = APIClient(SERVER_NAME="localhost")
+        self.client.force_authenticate(get_user_model().objects.create(username="reader"))
+        self.companies = [Company.objects.create(name=f"Company {i}", country="Testland") for i in range(4)]
+        self.stocks = [
+            Stock.objects.create(company=company, total_shares=1000, available_shares=1000, price=Decimal("1.00"))
+            for company in self.companies[:2]
+        ]
+
+    def positions(self):
+        return sorted(Holding.objects.exclude(shares=0).values_list("company_id", "stock_id", "shares"))
+
+    def test_position_deltas(self):
+        rows = [(7, 1, None, 10, 100), (7, 2, 1, 4, 100), (8, 1, 2, 3, 100), (7, 1, 2, 0, 100)]
+        self.assertEqual(position_deltas(rows), {(1, 7): 6, (2, 7): 4, (1, 8): 3, (2, 8): -3})
+
+    def test_upsert_matches_rebuild(self):
+        a, b, c, d = (company.pk for company in self.companies)
+        first, second = (stock.pk for stock in self.stocks)
+        for rows in (
+            [(first, a, None, 100, 100), (first, b, None, 50, 100), (second, c, None, 30, 100)],
+            [(first, c, a, 40, 100), (first, a, b, 50, 100), (second, d, c, 30, 100)],
+        ):
+            writer = StepWriter()
+            writer.add_transactions(rows)
+            writer.flush()
+
+        expected = [(a, first, 110), (c, first, 40), (d, second, 30)]
+        self.assertEqual(self.positions(), expected)
+        self.assertEqual(Holding.objects.filter(company_id=b, stock_id=first).get().shares, 0)
+
+        Holding.objects.update(shares=999)
+        self.assertEqual(rebuild_holdings(), 3)
+        self.assertEqual(self.positions(), expected)
+        self.assertFalse(Holding.objects.filter(shares=0).exists())
+
+        response = self.client.get(f"/market/companies/{a}/holdings/")
+        self.assertEqual([(row["stock"], row["shares"]) for row in response.data], [(first, 110)])
+        response = self.client.get(f"/market/stocks/{first}/holders/")
+        self.assertEqual([(row["company"], row["shares"]) for row in response.data], [(a, 110), (c, 40)])
+
+
+class AnalyticsTest(TestCase):
+    """Window and rolling statistics over known candles, and the analytics endpoint"""
+
+    def setUp(self):
+        self.client = APIClient(SERVER_NAME="localhost")
+        self.client.force_authenticate(get_user_model().objects.create(username="reader"))
+        self.companies = [Company.objects.create(name=f"Company {i}", country="Testland") for i in range(3)]
+        self.stock = Stock.objects.create(
+            company=self.companies[0], total_shares=10**6, available_shares=10**6, price=Decimal("10.00")
+        )
+        # 1m bars: 09:30 closes at 12 (40 shares, 460 turnover), 09:31 at 11 (20, 220),
+        # nothing at 09:32, 09:33 at 13 (50, 650)
+        self.minute = datetime(2026, 5, 1, 9, 30, tzinfo=dt_timezone.utc)
+        for offset, fills in ((0, [(10, 1000), (30, 1200)]), (1, [(20, 1100)]), (3, [(50, 1300)])):
+            writer = StepWriter()
+            for shares, cents in fills:
+                writer.add_transaction(self.stock.pk, self.companies[1].pk, self.companies[2].pk, shares, cents)
+            writer.flush(self.minute + timedelta(minutes=offset, seconds=10))
+        self.returns = [math.log(11 / 12), math.log(13 / 11)]
+
+    def test_window_stats(self):
+        end = self.minute + timedelta(minutes=3, seconds=30)
+        stats = window_stats(self.stock.pk, self.minute, end, "1m")
+        self.assertEqual((stats["bars"], stats["volume"]), (3, 110))
+        self.assertEqual((stats["from"], stats["to"]), (self.minute, self.minute + timedelta(minutes=4)))
+        self.assertEqual(
+            (stats["open"], stats["high"], stats["low"], stats["close"]),
+            (Decimal("10.00"), Decimal("13.00"), Decimal("10.00"), Decimal("13.00")),
+        )
+        self.assertAlmostEqual(stats["vwap"], (460 + 220 + 650) / 110)
+        # 12 stood 60s and 11 stood 120s; 13 stands from 09:33 until the window ends at 09:33:30
+        self.assertAlmostEqual(stats["twap"], (12 * 60 + 11 * 120 + 13 * 30) / 210)
+        self.assertAlmostEqual(stats["volatility"], statistics.stdev(self.returns))
+        self.assertAlmostEqual(
+            stats["annualized_volatility"], statistics.stdev(self.returns) * math.sqrt(365 * 86400 / 60)
+        )
+
+        # A window ending on a bucket boundary holds the last bar for its full width
+        stats = window_stats(self.stock.pk, self.minute, self.minute + timedelta(minutes=4), "1m")
+        self.assertAlmostEqual(stats["twap"], (12 * 60 + 11 * 120 + 13 * 60) / 240)
+
+    def test_rolling_series(self):
+        series = rolling_series(self.stock.pk, self.minute, self.minute + timedelta(minutes=4), 2, "1m")
+        self.assertEqual(
+            [(row["bucket"], row["close"], row["volume"], row["rolling_volume"]) for row in series],
+            [
+                (self.minute, Decimal("12.00"), 40, 40),
+                (self.minute + timedelta(minutes=1), Decimal("11.00"), 20, 60),
+                (self.minute + timedelta(minutes=3), Decimal("13.00"), 50, 70),
+            ],
+        )
+        for row, vwap in zip(series, [460 / 40, 680 / 60, 870 / 70]):
+            self.assertAlmostEqual(row["vwap"], vwap)
+        # One return in the first two windows is not enough for a sample deviation
+        self.assertEqual([row["volatility"] for row in series[:2]], [None, None])
+        self.assertAlmostEqual(series[2]["volatility"], statistics.stdev(self.returns))
+
+    def test_analytics_endpoint(self):
+        url = f"/market/stocks/{self.stock.pk}/analytics/"
+        end = self.minute + timedelta(minutes=3, seconds=30)
+        response = self.client.get(url, {"from": self.minute.isoformat(), "to": end.isoformat(), "window": 2})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["interval"], "1m")
+        self.assertAlmostEqual(response.data["twap"], (12 * 60 + 11 * 120 + 13 * 30) / 210)
+        self.assertEqual([row["rolling_volume"] for row in response.data["series"]], [40, 60, 70])
+
+        year = {"from": self.minute.isoformat(), "to": (self.minute + timedelta(days=365)).isoformat()}
+        self.assertEqual(self.client.get(url, year).data["interval"], "1d")
+        self.assertEqual(self.client.get(url, {**year, "interval": "1m"}).status_code, 400)
+        self.assertEqual(self.client.get(url, {**year, "interval": "1h"}).status_code, 400)
+        self.assertEqual(self.client.get(url, {**year, "interval": "1d"}).status_code, 200)
+
+    def test_benchmark_command(self):
+        out = io.StringIO()
+        call_command("benchmark_analytics", days=1, step=3600, requests=2, stdout=out)
+        self.assertIn("Generated 24 transactions and 24 trades over 1 days", out.getvalue())
+        self.assertIn("product  1 year", out.getvalue())
+        # Everything it generated is rolled back
+        self.assertEqual(Stock.objects.count(), 1)
+        self.assertEqual(StockTransaction.objects.count(), 4)
+
+
+class ExportTest(TestCase):
+    """History exports to aligned .npy columns that open memory-mapped"""
+
+    def setUp(self):
+        if not HAS_NUMPY:
+            self.skipTest("NumPy is not installed")
+        self.client = APIClient(SERVER_NAME="localhost")
+        self.client.force_authenticate(get_user_model().objects.create(username="reader"))
+        self.companies = [Company.objects.create(name=f"Company {i}", country="Testland") for i in range(3)]
+        self.stock = Stock.objects.create(
+            company=self.companies[0], total_shares=1000, available_shares=1000, price=Decimal("1.00")
+        )
+        self.start = datetime(2026, 4, 1, tzinfo=dt_timezone.utc)
+        for minute in range(5):
+            writer = StepWriter()
+            writer.add_transaction(self.stock.pk, self.companies[1].pk, None, minute + 1, 1000 + minute)
+            writer.add_transaction(self.stock.pk, self.companies[2].pk, self.companies[1].pk, 1, 999)
+            writer.flush(self.start + timedelta(minutes=minute))
+        self.directory = tempfile.mkdtemp(prefix="market-export-test-")
+        self.addCleanup(shutil.rmtree, self.directory)
+
+    def load(self, name, directory=None):
+        import numpy as np
+
+        return np.load(os.path.join(directory or self.directory, f"{name}.npy"), mmap_mode="r")
+
+    def test_columns_line_up(self):
+        import numpy as np
+
+        count = write_columns("stock_transactions", self.directory, chunk_size=3)
+        self.assertEqual(count, 10)
+        expected = list(
+            StockTransaction.objects.order_by("timestamp", "id").values_list("id", "seller_id", "shares", "timestamp")
+        )
+        self.assertIsInstance(self.load("id"), np.memmap)
+        self.assertEqual(self.load("id").tolist(), [row[0] for row in expected])
+        self.assertEqual(self.load("seller_id").tolist(), [row[1] or 0 for row in expected])
+        self.assertEqual(self.load("shares").tolist(), [row[2] for row in expected])
+        self.assertEqual(
+            self.load("timestamp").astype("datetime64[us]").tolist(),
+            [row[3].replace(tzinfo=None) for row in expected],
+        )
+        self.assertEqual(self.load("price_per_share").dtype, np.int64)
+        self.assertEqual(self.load("price_per_share")[:2].tolist(), [1000, 999])
+
+    def test_incremental_ranges(self):
+        middle = self.start + timedelta(minutes=2)
+        self.assertEqual(next_start("stock_transactions", self.directory), self.start)
+        first = export_range("stock_transactions", self.directory, self.start, middle)
+        self.assertEqual(first["rows"], 4)
+        self.assertEqual(next_start("stock_transactions", self.directory), middle)
+        second = export_range("stock_transactions", self.directory, middle, self.start + timedelta(hours=1))
+        self.assertEqual(second["rows"], 6)
+
+        dataset = os.path.join(self.directory, "stock_transactions")
+        manifest = read_manifest(dataset)
+        self.assertEqual([chunk["rows"] for chunk in manifest["chunks"]], [4, 6])
+        self.assertEqual(manifest["columns"]["timestamp"], "<M8[us]")
+        shares = [
+            self.load("shares", os.path.join(dataset, chunk["path"])).tolist() for chunk in manifest["chunks"]
+        ]
+        self.assertEqual(shares, [[1, 1, 2, 1], [3, 1, 4, 1, 5, 1]])
+
+    def test_export_endpoint(self):
+        import numpy as np
+
+        window = {
+            "from": (self.start + timedelta(minutes=3)).isoformat(),
+            "to": (self.start + timedelta(hours=1)).isoformat(),
+        }
+        response = self.client.get("/market/export/stock_transactions/shares.npy", window)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(np.load(io.BytesIO(b"".join(response.streaming_content))).tolist(), [4, 1, 5, 1])
+        response = self.client.get("/market/export/stock_transactions/price_per_share.npy", window)
+        self.assertEqual(np.load(io.BytesIO(b"".join(response.streaming_content))).tolist(), [1003, 999, 1004, 999])
+        response = self.client.get("/market/export/stock_transactions/shares.npy", {"from": window["from"]})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("to", response.json())
+        self.assertEqual(self.client.get("/market/export/stock_transactions/nope.npy").status_code, 404)
+        self.assertEqual(self.client.get("/market/export/orders/id.npy").status_code, 404)
+
+
+class NettingTest(SimpleTestCase):
+    """Bilateral netting folds each company pair's trades into one obligation"""
+
+    def test_net_obligations(self):
+        pairs = net_obligations(
+            [
+                (1, 2, 1000),  # 1 bought from 2: 1 owes 2
+                (2, 1, 300),
+                (3, 1, 500),
+                (1, 2, 250),
+                (4, 4, 999),  # Self-trade, skipped
+            ]
+        )
+        self.assertEqual(dict(pairs), {(1, 2): [1250, 300, 3], (1, 3): [0, 500, 1]})
+
+
+class CorrelatedGBMTest(SimpleTestCase):
+    """Shocks must correlate as the country loadings imply"""
+
+    def setUp(self):
+        if not HAS_NUMPY:
+            self.skipTest("NumPy is not installed")
+
+    def model(self, seed):
+        import numpy as np
+
+        countries = ["DE", "DE", "US", "US", "JP"]
+        _names, loadings, idiosyncratic = country_loadings(countries, market=0.6, country=0.5)
+        return CorrelatedGBM(
+            [10000] * len(countries),
+            np.random.default_rng(seed),
+            loadings=loadings,
+            idiosyncratic=idiosyncratic,
+        )
+
+    def test_realized_correlation_matches_loadings(self):
+        import numpy as np
+
+        model = self.model(1)
+        path = model.path(20000)
+        self.assertEqual(path.dtype, np.int64)
+        self.assertTrue((path >= 1).all())
+        returns = np.diff(np.log(path.astype(np.float64)), axis=0)
+        realized = np.corrcoef(returns.T)
+        self.assertAlmostEqual(model.correlation(0, 1), 0.61)
+        self.assertAlmostEqual(model.correlation(0, 2), 0.36)
+        self.assertAlmostEqual(realized[0, 1], 0.61, delta=0.03)
+        self.assertAlmostEqual(realized[0, 2], 0.36, delta=0.03)
+
+    def test_seeded_paths_are_reproducible(self):
+        first, second = self.model(7), self.model(7)
+        for ticks in (1, 5, 100):
+            self.assertTrue((first.path(ticks) == second.path(ticks)).all())
+
+
+class VectorizedMarketTest(SimpleTestCase):
+    """Vectorized ticks keep counterparties distinct and stocks within their shares"""
+
+    def setUp(self):
+        if not HAS_NUMPY:
+            self.skipTest("NumPy is not installed")
+
+    def market(self, seed):
+        return VectorizedMarket(
+            company_ids=[1, 2, 3],
+            product_ids=[10, 11],
+            product_prices=[500, 2000],
+            stock_ids=[20, 21],
+            stock_prices=[10000, 100],
+            stock_available=[5000, 0],
+            seed=seed,
+        )
+
+    def test_batch_invariants(self):
+        market = self.market(3)
+        batch = market.run(50)
+        self.assertEqual(batch.trade_count, 100)
+        self.assertTrue((batch.trade_seller != batch.trade_buyer).all())
+        self.assertTrue((batch.tx_buyer != batch.tx_seller).all())
+        self.assertTrue(((batch.trade_quantity >= 1) & (batch.trade_quantity <= 100)).all())
+
+        # Stock 21 has no shares left, so only stock 20 trades, within its 5000
+        self.assertEqual(set(batch.tx_stock.tolist()), {20})
+        self.assertLessEqual(batch.tx_shares.sum(), 5000)
+        self.assertEqual(batch.stock_available.tolist(), [5000 - batch.tx_shares.sum(), 0])
+        self.assertEqual(batch.stock_changed.tolist(), [True, False])
+        self.assertEqual(batch.stock_prices.tolist(), [batch.tx_price[-1], 100])
+        self.assertEqual(market.product_prices.tolist(), batch.trade_price[-2:].tolist())
+
+    def test_seeded_runs_are_reproducible(self):
+        first, second = self.market(9).run(20), self.market(9).run(20)
+        for column in ("trade_seller", "trade_price", "tx_shares", "tx_price", "stock_prices"):
+            self.assertEqual(getattr(first, column).tolist(), getattr(second, column).tolist(), column)
+
+    def test_stock_model_keeps_its_generator(self):
+        import numpy as np
+
+        rng = np.random.default_rng(1)
+        model = RandomWalk([10000, 100], rng)
+        market = VectorizedMarket(
+            company_ids=[1, 2], product_ids=[], product_prices=[], stock_ids=[20, 21],
+            stock_prices=[10000, 100], stock_available=[5000, 5000], seed=1, stock_model=model,
+        )
+        self.assertIs(model.rng, rng)
+        self.assertIsNot(market.rng, rng)
+
+    def test_daemon_ticks_start_from_the_settled_stocks(self):
+        market = self.market(4)
+        stocks = [
+            Stock(id=20, price=Decimal("100.00"), available_shares=5000),
+            Stock(id=21, price=Decimal("1.00"), available_shares=0),
+        ]
+        # The daemon settled another writer's fills into the stocks
+        stocks[0].available_shares, stocks[0].price = 0, Decimal("90.00")
+        stocks[1].available_shares = 3000
+        writer = StepWriter()
+        SimulateCommand().vectorized_tick(writer, market, stocks)
+
+        self.assertEqual({row[0] for row in writer.transactions}, {21})
+        self.assertEqual(market.stock_prices[0], 9000)
+        # The stocks follow the tick until it is settled
+        self.assertEqual([stock.available_shares for stock in stocks], market.stock_available.tolist())
+        self.assertEqual(stocks[1].available_shares, 3000 - writer.transactions[0][3])
+        self.assertEqual(to_cents(stocks[1].price), writer.transactions[0][4])
+
+
+class VectorizedSimulationCommandTest(TestCase):
+    """simulate_market --vectorized persists what the vectorized market generated"""
+
+    def setUp(self):
+        if not HAS_NUMPY:
+            self.skipTest("NumPy is not installed")
+        companies = [Company.objects.create(name=f"Company {i}", country="Testland") for i in range(3)]
+        Product.objects.create(company=companies[0], name="Widget", price=Decimal("5.00"))
+        self.stock = Stock.objects.create(
+            company=companies[1], total_shares=10**6, available_shares=10**6, price=Decimal("100.00")
+        )
+
+    def test_vectorized_run(self):
+        out = io.StringIO()
+        call_command("simulate_market", vectorized=True, ticks=10, seed=5, stdout=out)
+        self.assertIn("10 trades, 10 stock transactions", out.getvalue())
+        self.assertEqual(Trade.objects.count(), 10)
+        shares = StockTransaction.objects.aggregate(total=Sum("shares"))["total"]
+        self.stock.refresh_from_db()
+        self.assertEqual(self.stock.available_shares, 10**6 - shares)
+        last = StockTransaction.objects.order_by("timestamp", "id").last()
+        self.assertEqual(self.stock.price, last.price_per_share)
+
+
+class ConditionalStockListTest(TestCase):
+    """The stock list answers 304 until a write (bulk ones included) bumps its version"""
+
+    def setUp(self):
+        self.client = APIClient(SERVER_NAME="localhost")
+        self.client.force_authenticate(get_user_model().objects.create(username="reader"))
+        company = Company.objects.create(name="Company 0", country="Testland")
+        self.stock = Stock.objects.create(company=company, price=Decimal("100.00"))
+
+    def test_not_modified_until_stocks_change(self):
+        response = self.client.get("/market/stocks/")
+        self.assertEqual(response.status_code, 200)
+        etag = response["ETag"]
+
+        with self.assertNumQueries(1):
+            response = self.client.get("/market/stocks/", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response["ETag"], etag)
+
+        with transaction.atomic():
+            accepted, _state = settle_transactions(
+                [(self.stock.pk, self.stock.company_id, self.stock.company_id, 10, 10100)]
+            )
+        self.assertEqual(len(accepted), 1)
+        response = self.client.get("/market/stocks/", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+        self.assertEqual(response.json()[0]["price"], "101.00")
+        self.assertEqual(response.json()[0]["available_shares"], 999990)
+
+    def test_rows_changed_out_of_timestamp_order(self):
+        company = Company.objects.create(name="Company 1", country="Testland")
+        other = Stock.objects.create(company=company, price=Decimal("50.00"))
+        etag = self.client.get("/market/stocks/")["ETag"]
+
+        # A change stamped earlier than the newest row must still show
+        Stock.objects.filter(pk=self.stock.pk).update(
+            price=Decimal("99.00"), updated_at=other.updated_at - timedelta(seconds=1)
+        )
+        response = self.client.get("/market/stocks/", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        etag = response["ETag"]
+
+        other.delete()
+        response = self.client.get("/market/stocks/", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()), 1)
+
+    def test_if_modified_since_alone_is_not_trusted(self):
+        last_modified = self.client.get("/market/stocks/")["Last-Modified"]
+        # A delete leaves no newer stamp behind
+        Stock.objects.filter(pk=self.stock.pk).delete()
+        response = self.client.get("/market/stocks/", HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), [])
+
+    def test_versions_are_striped(self):
+        self.assertTrue(ResourceVersion.objects.filter(name__startswith="market_stock:").exists())
+        self.assertFalse(ResourceVersion.objects.filter(name="market_stock").exists())
+
+
+class StockTransactionCreateTest(TestCase):
+    """Posting a stock transaction settles it; the seller is optional"""
+
+    def setUp(self):
+        self.client = APIClient(SERVER_NAME="localhost")
+        self.client.force_authenticate(get_user_model().objects.create(username="writer"))
+        self.issuer = Company.objects.create(name="Issuer", country="Testland")
+        self.buyer = Company.objects.create(name="Buyer", country="Testland")
+        self.stock = Stock.objects.create(
+            company=self.issuer, total_shares=1000, available_shares=1000, price=Decimal("10.00")
+        )
+
+    def test_create_without_seller(self):
+        response = self.client.post(
+            "/market/stock-transactions/",
+            {"stock": self.stock.pk, "buyer": self.buyer.pk, "shares": 10, "price_per_share": "12.50"},
+            format="json",
+        )
+        self.assertEqual(response.status_code, 201, response.content)
+        self.assertIsNone(StockTransaction.objects.get().seller_id)
+        self.stock.refresh_from_db()
+        self.assertEqual(self.stock.available_shares, 990)
+        self.assertEqual(self.stock.price, Decimal("12.50"))
+        self.assertEqual(
+            list(Holding.objects.values_list("company_id", "shares")), [(self.buyer.pk, 10)]
+        )
+
+    def test_rejects_more_than_available(self):
+        response = self.client.post(
+            "/market/stock-transactions/",
+            {"stock": self.stock.pk, "buyer": self.buyer.pk, "seller": None, "shares": 1001, "price_per_share": "12.50"},
+            format="json",
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(StockTransaction.objects.exists())
+
+
+class BulkIngestTest(TestCase):
+    """Bulk ingest converts prices to cents exactly and reports every rejected row"""
+
+    def setUp(self):
+        for cache in caches.values():
+            cache.ids = None  # Ids cached by earlier tests are gone
+        self.client = APIClient(SERVER_NAME="localhost")
+        self.client.force_authenticate(get_user_model().objects.create(username="loader"))
+        self.seller = Company.objects.create(name="Seller", country="Testland")
+        self.buyer = Company.objects.create(name="Buyer", country="Testland")
+        self.product = Product.objects.create(company=self.seller, name="Widget", price=Decimal("1.00"))
+        self.stock = Stock.objects.create(
+            company=self.seller, total_shares=100, available_shares=100, price=Decimal("10.00")
+        )
+
+    def post(self, path, body):
+        return self.client.generic("POST", path, body, content_type="application/x-ndjson")
+
+    def trade(self, **fields):
+        row = {"seller": self.seller.pk, "buyer": self.buyer.pk, "product": self.product.pk, "quantity": 1}
+        return json.dumps({**row, **fields})
+
+    def test_decimal_prices_are_exact(self):
+        self.assertEqual(parse_rows(b'[{"price": 0.29}]'), [{"price": Decimal("0.29")}])
+        body = "\n".join(self.trade(price_per_unit=price) for price in ("0.29", "12.340", "99999999.99"))
+        body += "\n" + '{"seller": %d, "buyer": %d, "product": %d, "quantity": 2, "price_per_unit": 1.15}' % (
+            self.seller.pk, self.buyer.pk, self.product.pk
+        )
+        response = self.post("/market/trades/bulk/", body)
+        self.assertEqual(response.status_code, 201, response.content)
+        self.assertEqual(response.data["accepted"], 4)
+        self.assertEqual(
+            sorted(Trade.objects.values_list("price_per_unit", flat=True)),
+            [Decimal("0.29"), Decimal("1.15"), Decimal("12.34"), Decimal("99999999.99")],
+        )
+
+    def test_rejected_rows(self):
+        rows = [
+            self.trade(price_per_unit="12.345"),
+            self.trade(price_per_unit="100000000.00"),
+            self.trade(price_per_unit="NaN"),
+            self.trade(price_per_unit=True),
+            self.trade(price_per_unit="1.00", quantity=-1),
+            self.trade(price_per_unit="1.00", quantity=2**40),
+            self.trade(price_per_unit="1.00", quantity="3"),
+            self.trade(price_per_unit="1.00", seller=10**9),
+            self.trade(price_per_unit="1.00", buyer=None),
+            self.trade(price_per_unit="1.00", product=0),
+            "[]",
+            self.trade(price_per_unit="1.00"),
+        ]
+        response = self.post("/market/trades/bulk/", "\n".join(rows))
+        self.assertEqual(response.status_code, 201, response.content)
+        self.assertEqual((response.data["accepted"], response.data["rejected"]), (1, 11))
+        errors = {entry["row"]: entry["errors"] for entry in response.data["errors"]}
+        self.assertEqual(errors[0], {"price_per_unit": ["Ensure that there are no more than 2 decimal places."]})
+        self.assertEqual(errors[1], {"price_per_unit": ["Ensure that there are no more than 10 digits in total."]})
+        self.assertEqual(errors[2], {"price_per_unit": ["A valid number is required."]})
+        self.assertEqual(errors[3], {"price_per_unit": ["A valid number is required."]})
+        self.assertEqual(errors[4], {"quantity": ["Ensure this value is greater than or equal to 0."]})
+        self.assertEqual(errors[5], {"quantity": ["Ensure this value is less than or equal to 2147483647."]})
+        self.assertEqual(errors[6], {"quantity": ["A valid integer is required."]})
+        self.assertEqual(errors[7], {"seller": [f'Invalid pk "{10**9}" - object does not exist.']})
+        self.assertEqual(errors[8], {"buyer": ["This field is required."]})
+        self.assertEqual(errors[9], {"product": ["Incorrect type. Expected pk value, received int."]})
+        self.assertEqual(errors[10], {"non_field_errors": ["Invalid data. Expected a dictionary."]})
+        self.assertEqual(Trade.objects.get().price_per_unit, Decimal("1.00"))
+
+    def test_stock_transactions_without_seller(self):
+        body = json.dumps([
+            {"stock": self.stock.pk, "buyer": self.buyer.pk, "seller": None, "shares": 60, "price_per_share": "11.00"},
+            {"stock": self.stock.pk, "buyer": self.buyer.pk, "shares": 60, "price_per_share": "11.00"},
+        ])
+        response = self.client.post("/market/stock-transactions/bulk/", body, content_type="application/json")
+        self.assertEqual(response.status_code, 201, response.content)
+        self.assertEqual(response.data["errors"], [
+            {"row": 1, "errors": {"shares": ["Not enough available shares for this stock."]}}
+        ])
+        self.assertIsNone(StockTransaction.objects.get().seller_id)
+
+    def test_deleted_ids(self):
+        gone = Company.objects.create(name="Gone", country="Testland")
+        pk = gone.pk
+        caches["company"].load()
+        gone.delete()  # Still in the id cache
+
+        body = "\n".join([self.trade(buyer=pk, price_per_unit="2.00"), self.trade(price_per_unit="3.00")])
+        response = self.post("/market/trades/bulk/", body)
+        self.assertEqual(response.status_code, 201, response.content)
+        self.assertEqual(response.data["errors"], [
+            {"row": 0, "errors": {"buyer": [f'Invalid pk "{pk}" - object does not exist.']}}
+        ])
+        self.assertEqual(list(Trade.objects.values_list("price_per_unit", flat=True)), [Decimal("3.00")])
+
+    def test_empty_body(self):
+        response = self.post("/market/trades/bulk/", "")
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(str(response.data["detail"]), "Expected a non-empty JSON array or NDJSON rows.")
+
+
+class MarketSnapshotConditionalTest(TestCase):
+    """The snapshot honours If-None-Match lists, weak validators and *"""
+
+    def setUp(self):
+        self.client = APIClient(SERVER_NAME="localhost")
+        self.client.force_authenticate(get_user_model().objects.create(username="reader"))
+        patcher = mock.patch.object(snapshot, "render", return_value=('"v1"', b'{"stocks":[]}'))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_matching_validators(self):
+        for header in ('"v1"', 'W/"v1"', '"v0", "v1"', "*"):
+            response = self.client.get("/market/snapshot/", HTTP_IF_NONE_MATCH=header)
+            self.assertEqual(response.status_code, 304, header)
+            self.assertEqual(response["ETag"], '"v1"')
+
+    def test_changed_snapshot(self):
+        response = self.client.get("/market/snapshot/", HTTP_IF_NONE_MATCH='"v0"')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.content, b'{"stocks":[]}')
+        self.assertEqual(response["ETag"], '"v1"')
+
+
+class MarketSnapshotTest(TestCase):
+    """Price events keep the snapshot current; the day statistics restart every UTC day"""
+
+    def setUp(self):
+        company = Company.objects.create(name="Company 0", country="Testland")
+        self.stock = Stock.objects.create(company=company, price=Decimal("10.00"))
+        self.snapshot = MarketSnapshot()
+        self.snapshot.watching = True  # No broadcaster in tests; events are fed directly
+
+    def event(self, price, volume, timestamp, **fields):
+        return {
+            "type": "price", "stock": self.stock.pk, "price": price, "volume": volume,
+            "timestamp": timestamp.isoformat(), **fields,
+        }
+
+    def rendered(self):
+        etag, body = self.snapshot.render()
+        return etag, json.loads(body)["stocks"][0]
+
+    def test_events_update_the_snapshot(self):
+        etag, _stock = self.rendered()
+        now = datetime.now(dt_timezone.utc)
+        self.snapshot.on_events([self.event("11.00", 30, now, high="11.50", low="10.50")])
+        changed, stock = self.rendered()
+        self.assertNotEqual(changed, etag)
+        self.assertEqual((stock["price"], stock["high"], stock["low"], stock["volume"]), ("11.00", "11.50", "10.50", 30))
+        self.assertEqual(self.rendered()[0], changed)
+
+        # An unknown stock (or a reconnect) makes the next render reload from the database
+        self.snapshot.on_events([{"type": "price", "stock": 0, "price": "1.00", "volume": 1}])
+        self.assertTrue(self.snapshot.stale)
+        self.assertEqual(self.rendered()[1]["price"], "10.00")
+        self.snapshot.on_events(None)
+        self.assertTrue(self.snapshot.stale)
+
+    def test_day_statistics_reset(self):
+        self.rendered()
+        now = datetime.now(dt_timezone.utc)
+        self.snapshot.on_events([self.event("11.00", 30, now)])
+        tomorrow = now + timedelta(days=1)
+        self.snapshot.on_events([self.event("12.00", 5, tomorrow)])
+        _etag, stock = self.rendered()
+        self.assertEqual((stock["price"], stock["change"], stock["volume"]), ("12.00", "1.00", 5))
+        self.assertEqual(json.loads(self.snapshot.render()[1])["day"], tomorrow.date().isoformat())
+
+        # A late fill of the day before is not part of the new day
+        self.snapshot.on_events([self.event("9.00", 7, now)])
+        _etag, stock = self.rendered()
+        self.assertEqual((stock["price"], stock["volume"], stock["low"]), ("12.00", 5, "12.00"))
+
+
+class MarketIndexTest(TestCase):
+    """Settling records index deltas that are folded into the indices after commit"""
+
+    def setUp(self):
+        self.company = Company.objects.create(name="Company 0", country="Testland")
+        self.stock = Stock.objects.create(company=self.company, total_shares=1000, price=Decimal("10.00"))
+        rebuild_indices()
+
+    def settle(self, price_cents):
+        with self.captureOnCommitCallbacks(execute=True):
+            with transaction.atomic():
+                settle_transactions([(self.stock.pk, self.company.pk, None, 1, price_cents)])
+
+    def test_deltas_fold_after_commit(self):
+        market = MarketIndex.objects.get(country="")
+        self.assertEqual(market.level, 1000.0)
+
+        with self.captureOnCommitCallbacks() as callbacks:
+            with transaction.atomic():
+                settle_transactions([(self.stock.pk, self.company.pk, None, 1, 1100)])
+        self.assertEqual(IndexDelta.objects.count(), 2)  # Market and Testland
+        market.refresh_from_db()
+        self.assertEqual(market.market_cap, Decimal("10000.00"))
+
+        for callback in callbacks:
+            callback()
+        self.assertFalse(IndexDelta.objects.exists())
+        for index in MarketIndex.objects.all():
+            self.assertEqual(index.market_cap, Decimal("11000.00"))
+            self.assertAlmostEqual(index.level, 1100.0)
+            self.assertEqual(index.levels.count(), 1)
+
+    def test_rebuild_discards_pending_deltas(self):
+        self.settle(1200)
+        with transaction.atomic():
+            settle_transactions([(self.stock.pk, self.company.pk, None, 1, 1500)])
+        rebuild_indices()
+        self.assertFalse(IndexDelta.objects.exists())
+        self.assertEqual(fold_index_deltas(), 0)
+        self.assertEqual(MarketIndex.objects.get(country="").market_cap, Decimal("15000.00"))
+
+    def test_new_country_is_seeded_once(self):
+        company = Company.objects.create(name="Company 1", country="Newland")
+        stock = Stock.objects.create(company=company, total_shares=100, price=Decimal("10.00"))
+        for price in (1100, 1300):
+            with transaction.atomic():  # Committed; the folds have not run yet
+                settle_transactions([(stock.pk, company.pk, None, 1, price)])
+
+        self.assertEqual(fold_index_deltas(), 4)
+        self.assertEqual(MarketIndex.objects.get(country="Newland").market_cap, Decimal("1300.00"))
+        # The market index already existed: it only gains the deltas (listings need a rebuild)
+        self.assertEqual(MarketIndex.objects.get(country="").market_cap, Decimal("10300.00"))
+        self.assertFalse(IndexDelta.objects.exists())
+
+    def test_levels_keep_one_point_per_minute(self):
+        index = MarketIndex.objects.get(country="")
+        start = datetime(2026, 5, 1, 12, tzinfo=dt_timezone.utc)
+        IndexLevel.objects.create(index=index, timestamp=start - timedelta(days=8), level=1.0)
+        record_level(index, start)
+        self.assertEqual(index.levels.count(), 1)  # Starting a minute pruned the expired level
+        record_level(index, start + timedelta(seconds=30))
+        record_level(index, start + timedelta(seconds=60))
+        self.assertEqual(
+            list(index.levels.order_by("timestamp").values_list("timestamp", flat=True)),
+            [start + timedelta(seconds=30), start + timedelta(seconds=60)],
+        )
+
+
+class EventLogReplayTest(TransactionTestCase):
+    """A log written by parallel shards replays to the same market"""
+
+    def setUp(self):
+        for i in range(6):
+            company = Company.objects.create(name=f"Company {i}", country=f"Land {i % 2}")
+            Product.objects.create(company=company, name=f"Product {i}", price=Decimal("20.00"))
+            Stock.objects.create(company=company, price=Decimal("10.00"))
+        handle, self.path = tempfile.mkstemp(suffix=".log")
+        os.close(handle)
+        os.unlink(self.path)
+        self.addCleanup(lambda: os.path.exists(self.path) and os.unlink(self.path))
+
+    def market(self):
+        return (
+            sorted(Trade.objects.values_list("seller", "buyer", "product", "quantity", "price_per_unit", "timestamp")),
+            sorted(
+                StockTransaction.objects.values_list("stock", "buyer", "seller", "shares", "price_per_share", "timestamp")
+            ),
+            sorted(Stock.objects.values_list("pk", "available_shares", "price")),
+        )
+
+    def test_parallel_run_replays(self):
+        call_command("simulate_market", workers=2, seed=7, orders=200, event_log=self.path, stdout=io.StringIO())
+        call_command("simulate_market", workers=2, seed=8, orders=200, event_log=self.path, stdout=io.StringIO())
+        kinds = [kind for kind, _payload in read_records(self.path)]
+        self.assertEqual(kinds[:2], [b"H", b"R"])
+        self.assertEqual(kinds.count(b"H") + kinds.count(b"R"), 2)
+
+        expected = self.market()
+        self.assertTrue(expected[0] and expected[1])
+        Company.objects.all().delete()
+
+        out = io.StringIO()
+        call_command("replay_market", self.path, stdout=out)
+        self.assertNotIn("rejected", out.getvalue())
+        self.assertEqual(self.market(), expected)
+
+
+class HistoricalPartitionTest(TestCase):
+    """Rows older than the partitions are given their own month, not left in the default partition"""
+
+    def setUp(self):
+        self.company = Company.objects.create(name="Company 0", country="Testland")
+        self.product = Product.objects.create(company=self.company, name="Widget", price=Decimal("20.00"))
+        self.old = datetime(2024, 3, 15, 12, tzinfo=dt_timezone.utc)
+
+    def rows_in(self, partition):
+        with connections["default"].cursor() as cursor:
+            cursor.execute(f"SELECT count(*) FROM {partition}")
+            return cursor.fetchone()[0]
+
+    def test_ensure_partitions_moves_default_rows(self):
+        writer = StepWriter()
+        writer.add_trade(self.company.pk, self.company.pk, self.product.pk, 1, 2000)
+        writer.flush(self.old)  # Unlike create(), keeps the timestamp given
+        self.assertEqual(self.rows_in("market_trade_default"), 1)
+
+        names = ensure_partitions(since=self.old.date())
+        self.assertIn("market_trade_p202403", names)
+        self.assertEqual(self.rows_in("market_trade_default"), 0)
+        self.assertEqual(self.rows_in("market_trade_p202403"), 1)
+        self.assertEqual(Trade.objects.count(), 1)
+
+    def test_replay_creates_the_logged_months(self):
+        with tempfile.NamedTemporaryFile(suffix=".log") as handle:
+            with EventLog(handle.name) as log:
+                log.write_step(self.old, [(self.company.pk, self.company.pk, self.product.pk, 2, 2000)], [])
+            stats = replay(handle.name, StepWriter(), load_reference_data=False)
+        self.assertEqual(stats["trades"], 1)
+        self.assertEqual(self.rows_in("market_trade_default"), 0)
+        self.assertEqual(self.rows_in("market_trade_p202403"), 1)
+
+
+class OrderBookTest(SimpleTestCase):
+    """Price-time priority matching on one stock's book"""
+
+    def setUp(self):
+        self.book = OrderBook(1)
+        self.ids = itertools.count(1)
+
+    def submit(self, side, company_id, quantity, price=None):
+        order = Order(next(self.ids), side, company_id, price, quantity)
+        return order, self.book.submit(order)
+
+    def fills(self, fills):
+        return [(fill.buyer_id, fill.seller_id, fill.shares, fill.price) for fill in fills]
+
+    def test_price_then_time_priority(self):
+        self.submit(SELL, 1, 10, 1010)
+        self.submit(SELL, 2, 10, 1000)
+        self.submit(SELL, 3, 10, 1000)
+        _order, fills = self.submit(BUY, 9, 25, 1010)
+        self.assertEqual(self.fills(fills), [(9, 2, 10, 1000), (9, 3, 10, 1000), (9, 1, 5, 1010)])
+        self.assertEqual(self.book.last_price, 1010)
+        self.assertEqual(self.book.depth(), {"bids": [], "asks": [(1010, 5)]})
+
+    def test_partial_fill_rests_remainder(self):
+        self.submit(SELL, 1, 10, 1000)
+        order, fills = self.submit(BUY, 2, 15, 1005)
+        self.assertEqual(self.fills(fills), [(2, 1, 10, 1000)])
+        self.assertEqual(order.remaining, 5)
+        self.assertEqual(self.book.best_bid(), 1005)
+        self.assertIsNone(self.book.best_ask())
+
+        # A market order takes what there is and never rests
+        order, fills = self.submit(SELL, 3, 8)
+        self.assertEqual(self.fills(fills), [(2, 3, 5, 1005)])
+        self.assertEqual(order.remaining, 3)
+        self.assertEqual(len(self.book), 0)
+
+    def test_cancelled_orders_are_skipped(self):
+        first, _fills = self.submit(SELL, 1, 10, 1000)
+        self.submit(SELL, 2, 10, 1000)
+        self.assertTrue(self.book.cancel(first.id))
+        self.assertFalse(self.book.cancel(first.id))
+        _order, fills = self.submit(BUY, 3, 10, 1000)
+        self.assertEqual(self.fills(fills), [(3, 2, 10, 1000)])
+
+    def test_no_last_price_without_a_fill(self):
+        cancelled, _fills = self.submit(SELL, 1, 10, 1000)
+        self.book.cancel(cancelled.id)
+        self.submit(SELL, 2, 10, 1000)
+        order, fills = self.submit(BUY, 2, 10, 1000)  # Only its own ask: self-trade prevention
+        self.assertEqual(fills, [])
+        self.assertIsNone(self.book.last_price)
+        self.assertIsNone(self.book.best_ask())
+        self.assertEqual(self.book.best_bid(), 1000)  # The incoming order rests instead
+        self.assertEqual(order.remaining, 10)
+
+    def test_cancel_removes_an_emptied_level(self):
+        first, _fills = self.submit(SELL, 1, 10, 1000)
+        second, _fills = self.submit(SELL, 2, 10, 1000)
+        self.submit(SELL, 3, 10, 1010)
+        self.book.cancel(first.id)
+        self.assertEqual(self.book.depth(), {"bids": [], "asks": [(1000, 10), (1010, 10)]})
+        self.book.cancel(second.id)
+        self.assertEqual(self.book.best_ask(), 1010)
+        self.assertEqual(self.book.depth(), {"bids": [], "asks": [(1010, 10)]})
+
+    def test_order_flow_records_every_fill(self):
+        stock = mock.Mock(id=1, price=Decimal("10.00"), available_shares=1500)
+        book_exchange = Exchange()
+        matched = []
+
+        def submit(*args):
+            fills = Exchange.submit(book_exchange, *args)
+            matched.extend(fills)
+            return fills
+
+        command = SimulateCommand()
+        command.rng = random.Random(3)
+        writer = mock.Mock()
+        with mock.patch.object(simulate_market, "exchange", mock.Mock(book=book_exchange.book, submit=submit)):
+            command.simulate_order_flow(writer, [mock.Mock(id=i) for i in range(1, 5)], [stock], 200)
+
+        recorded = [call.args for call in writer.add_transaction.call_args_list]
+        self.assertGreater(len(recorded), 0)
+        # The book and the writer agree on every fill, within the shares there were
+        self.assertEqual(recorded, [(1, f.buyer_id, f.seller_id, f.shares, f.price) for f in matched])
+        self.assertEqual(sum(row[3] for row in recorded), 1500 - stock.available_shares)
+        self.assertGreaterEqual(stock.available_shares, 0)
+
+
+class MarketDaemonTest(TransactionTestCase):
+    """The daemon's in-memory stocks follow what the database settled"""
+
+    def test_stocks_follow_settled_state(self):
+        company = Company.objects.create(name="Company 0", country="Testland")
+        buyer = Company.objects.create(name="Company 1", country="Testland")
+        Stock.objects.create(company=company, total_shares=100, available_shares=100, price=Decimal("10.00"))
+        stock = Stock.objects.get()
+        # Another writer takes most of the shares after the daemon loaded the stock
+        with transaction.atomic():
+            accepted, _state = settle_transactions([(stock.pk, buyer.pk, None, 85, 1000)])
+        self.assertEqual(len(accepted), 1)
+
+        def generate(collector):
+            if stock.available_shares >= 10:
+                stock.available_shares -= 10
+                collector.update_stock(stock)
+                collector.add_transaction(stock.pk, buyer.pk, None, 10, 1250)
+
+        daemon = MarketDaemon(generate, tick_seconds=0.01, report=lambda message: None)
+        daemon.run(max_ticks=5)
+
+        self.assertEqual(StockTransaction.objects.count(), 1)
+        stored = Stock.objects.get()
+        self.assertEqual(stored.available_shares, 5)
+        self.assertEqual((stock.available_shares, stock.price), (5, Decimal("12.50")))
+
+    def test_persistent_sync_failure_stops_the_daemon(self):
+        company = Company.objects.create(name="Company 0", country="Testland")
+
+        def generate(collector):
+            collector.add_trade(company.pk, company.pk, 999999, 1, 100)  # No such product
+
+        daemon = MarketDaemon(generate, tick_seconds=0.01, max_pending=2, report=lambda message: None)
+        daemon.sync.retries, daemon.sync.backoff = 2, 0.01
+        with self.assertRaises(SyncFailed):
+            daemon.run(max_ticks=100)
+        self.assertLess(daemon.ticks, 100)
+        self.assertFalse(Trade.objects.exists())
+
+
+class MarketStreamTest(TransactionTestCase):
+    """The SSE feed accepts JWT clients and listens without blocking the event loop"""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create(username="streamer")
+        self.factory = AsyncRequestFactory()
+
+    @override_settings(DEBUG=False)
+    async def test_authentication(self):
+        request = self.factory.get("/market/stream/?stocks=1")
+        request.auser = self.anonymous
+        response = await market_stream(request)
+        self.assertEqual(response.status_code, 401)
+
+        token = await sync_to_async(lambda: str(AccessToken.for_user(self.user)))()
+        request = self.factory.get("/market/stream/?stocks=1", headers={"Authorization": f"Bearer {token}"})
+        request.auser = self.anonymous
+        self.assertEqual(await authenticate(request), self.user)
+
+        request = self.factory.get("/market/stream/?stocks=1", headers={"Authorization": "Bearer nonsense"})
+        request.auser = self.anonymous
+        self.assertIsNone(await authenticate(request))
+
+    async def anonymous(self):
+        return AnonymousUser()
+
+    async def test_listener_delivers_notifications(self):
+        subscriber = broadcaster.subscribe({7})
+        batches = []
+        broadcaster.watch(batches.append)
+        broadcaster.start()
+        try:
+            event = None
+            for _ in range(50):
+                # Resent until the listener has connected and run LISTEN
+                await sync_to_async(self.notify)([{"type": "price", "stock": 7, "price": "1.00"}])
+                event = await subscriber.next_event(0.1)
+                if event is not None:
+                    break
+            self.assertEqual(event, {"type": "price", "stock": 7, "price": "1.00"})
+            # Watchers hear of the connection, then get the same batches
+            self.assertIsNone(batches[0])
+            self.assertIn([{"type": "price", "stock": 7, "price": "1.00"}], batches)
+        finally:
+            broadcaster.watchers.remove(batches.append)
+            broadcaster.unsubscribe(subscriber)
+            await broadcaster.stop()
+
+    def notify(self, events):
+        with connections["default"].cursor() as cursor:
+            cursor.execute("SELECT pg_notify(%s, %s)", [CHANNEL, json.dumps(events)])
@@ -1,10 +1,25 @@
 from django.urls import path
-from .views import CompanyListCreateView, ProductListCreateView, StockListCreateView, TradeListCreateView, StockTransactionListCreateView
+from .streaming import market_stream
+from .views import CompanyListCreateView, ProductListCreateView, StockListCreateView, TradeListCreateView, StockTransactionListCreateView, StockCandlesView, CompanyHoldingsView, StockHoldersView, MarketIndexListView, IndexHistoryView, StockAnalyticsView, ProductAnalyticsView, MarketExportView, BulkTradeIngestView, BulkStockTransactionIngestView, SettlementListView, SettlementBatchListView, MarketSnapshotView
 
 urlpatterns = [
     path('companies/', CompanyListCreateView.as_view(), name='companies'),
     path('products/', ProductListCreateView.as_view(), name='products'),
     path('stocks/', StockListCreateView.as_view(), name='stocks'),
+    path('companies/<int:pk>/holdings/', CompanyHoldingsView.as_view(), name='company-holdings'),
+    path('stocks/<int:pk>/candles/', StockCandlesView.as_view(), name='stock-candles'),
+    path('stocks/<int:pk>/analytics/', StockAnalyticsView.as_view(), name='stock-analytics'),
+    path('products/<int:pk>/analytics/', ProductAnalyticsView.as_view(), name='product-analytics'),
+    path('stocks/<int:pk>/holders/', StockHoldersView.as_view(), name='stock-holders'),
+    path('indices/', MarketIndexListView.as_view(), name='indices'),
+    path('indices/<int:pk>/history/', IndexHistoryView.as_view(), name='index-history'),
     path('trades/', TradeListCreateView.as_view(), name='trades'),
     path('stock-transactions/', StockTransactionListCreateView.as_view(), name='stock-transactions'),
+    path('export/<str:dataset>/<str:column>.npy', MarketExportView.as_view(), name='market-export'),
+    path('trades/bulk/', BulkTradeIngestView.as_view(), name='trades-bulk'),
+    path('stock-transactions/bulk/', BulkStockTransactionIngestView.as_view(), name='stock-transactions-bulk'),
+    path('settlements/', SettlementListView.as_view(), name='settlements'),
+    path('settlements/batches/', SettlementBatchListView.as_view(), name='settlement-batches'),
+    path('snapshot/', MarketSnapshotView.as_view(), name='market-snapshot'),
+    path('stream/', market_stream, name='market-stream'),
 ]
\ No newline at end of file
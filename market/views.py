@@ -1,5 +1,41 @@
+import os
+import shutil
+import tempfile
+from datetime import timedelta
+
+from django.db import transaction
+from django.http import FileResponse, Http404, HttpResponse
+from django.shortcuts import get_object_or_404
+from django.utils import timezone
+from django.utils.cache import get_conditional_response
+from django.utils.dateparse import parse_datetime
 from rest_framework import serializers, generics
-from market.models import Company, Product, Stock, Trade, StockTransaction
+from rest_framework.exceptions import ValidationError
+from rest_framework.response import Response
+from rest_framework.views import APIView
+from core.conditional import ConditionalGetMixin
+from market.analytics import MAX_BARS, bar_count, choose_interval, rolling_series, window_stats
+from market.candles import INTERVALS, update_candles, update_product_candles
+from market.events import publish
+from market.export import DATASETS, HAS_NUMPY, columns as export_columns, write_columns
+from market.ingest import MAX_ROWS, TRADE_FIELDS, TRANSACTION_FIELDS, ingest, parse_rows
+from market.models import Company, Product, Stock, Trade, StockTransaction, Candle, ProductCandle, Holding, MarketIndex, IndexLevel, Settlement, SettlementBatch
+from market.pagination import KeysetPagination, SettlementPagination
+from market.persistence import settle_transactions
+from market.prices import to_cents
+from market.snapshot import snapshot
+from market.serializers import CandleSerializer, HoldingSerializer, MarketIndexSerializer, IndexLevelSerializer, SettlementSerializer, SettlementBatchSerializer
+
+
+def parse_datetime_param(params, name):
+    """Parse an optional ISO 8601 query parameter, rejecting malformed values"""
+    value = params.get(name)
+    if not value:
+        return None
+    parsed = parse_datetime(value)
+    if parsed is None:
+        raise ValidationError({name: "Must be an ISO 8601 datetime."})
+    return parsed
 
 
 class CompanySerializer(serializers.ModelSerializer):
@@ -48,19 +84,370 @@ class ProductListCreateView(generics.ListCreateAPIView):
     serializer_class = ProductSerializer
 
 
-class StockListCreateView(generics.ListCreateAPIView):
+class StockListCreateView(ConditionalGetMixin, generics.ListCreateAPIView):
     queryset = Stock.objects.all()
     serializer_class = StockSerializer
+    version_tables = ("market_stock",)  # Striped, see market migration 0012
+
+
+class MarketHistoryMixin:
+    """
+    Newest-first keyset pagination plus time-range (``from``/``to``) and
+    equality filters for the append-only market tables.
+    """
 
+    pagination_class = KeysetPagination
+    filter_fields = ("buyer", "seller")
 
-class TradeListCreateView(generics.ListCreateAPIView):
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.request.method != "GET":
+            return queryset
+
+        params = self.request.query_params
+        start = parse_datetime_param(params, "from")
+        end = parse_datetime_param(params, "to")
+        if start:
+            queryset = queryset.filter(timestamp__gte=start)
+        if end:
+            queryset = queryset.filter(timestamp__lt=end)
+        for field in self.filter_fields:
+            value = params.get(field)
+            if value:
+                if not value.isdigit():
+                    raise ValidationError({field: "Must be an integer id."})
+                queryset = queryset.filter(**{field: value})
+        if params.get("company") and not params["company"].isdigit():
+            raise ValidationError({"company": "Must be an integer id."})
+        return queryset
+
+
+class TradeListCreateView(MarketHistoryMixin, generics.ListCreateAPIView):
     queryset = Trade.objects.all()
     serializer_class = TradeSerializer
+    filter_fields = ("buyer", "seller", "product")
+
+    def perform_create(self, serializer):
+        with transaction.atomic():
+            instance = serializer.save()
+            rows = [
+                (
+                    instance.seller_id,
+                    instance.buyer_id,
+                    instance.product_id,
+                    instance.quantity,
+                    to_cents(instance.price_per_unit),
+                )
+            ]
+            update_product_candles(rows, instance.timestamp)
+            publish(trades=rows, timestamp=instance.timestamp)
 
 
-class StockTransactionListCreateView(generics.ListCreateAPIView):
+class StockTransactionListCreateView(MarketHistoryMixin, generics.ListCreateAPIView):
     queryset = StockTransaction.objects.all()
     serializer_class = StockTransactionSerializer
+    filter_fields = ("buyer", "seller", "stock")
+
+    def perform_create(self, serializer):
+        """Settle the shares atomically in the database before recording the transaction"""
+        data = serializer.validated_data
+        seller = data.get("seller")  # Optional: shares issued by the company itself
+        row = (
+            data["stock"].pk,
+            data["buyer"].pk,
+            getattr(seller, "pk", None),
+            data["shares"],
+            to_cents(data["price_per_share"]),
+        )
+        with transaction.atomic():
+            accepted, _ = settle_transactions([row])
+            if not accepted:
+                raise serializers.ValidationError(
+                    {"shares": "Not enough available shares for this stock."}
+                )
+            instance = serializer.save()
+            update_candles(accepted, instance.timestamp)
+            publish(transactions=accepted, timestamp=instance.timestamp)
+
+
+class BulkIngestView(APIView):
+    """
+    Bulk load: POST a JSON array or newline-delimited JSON objects with the
+    same fields as the single-object endpoint (up to 100,000 rows).
+
+    Rows are validated column by column against cached ids and the valid
+    ones are loaded in one transaction with COPY. The response reports the
+    accepted count and the errors of every rejected row by index.
+    """
+
+    fields = TRADE_FIELDS
+    max_bytes = 64 * 1024 * 1024
+
+    def post(self, request):
+        # Read the raw stream: the body of a large feed exceeds
+        # DATA_UPLOAD_MAX_MEMORY_SIZE and is never form-parsed anyway.
+        # DRF gives no stream for an empty body.
+        stream = request.stream
+        body = stream.read(self.max_bytes + 1) if stream is not None else b""
+        if len(body) > self.max_bytes:
+            raise ValidationError({"detail": f"Request body exceeds {self.max_bytes} bytes."})
+        try:
+            rows = parse_rows(body)
+        except (UnicodeDecodeError, ValueError) as e:
+            raise ValidationError({"detail": f"Invalid JSON: {e}"})
+        if not isinstance(rows, list) or not rows:
+            raise ValidationError({"detail": "Expected a non-empty JSON array or NDJSON rows."})
+        if len(rows) > MAX_ROWS:
+            raise ValidationError({"detail": f"At most {MAX_ROWS} rows per request."})
+
+        result = ingest(rows, self.fields)
+        return Response(result, status=201 if result["accepted"] else 400)
+
+
+class BulkTradeIngestView(BulkIngestView):
+    fields = TRADE_FIELDS
+
+
+class BulkStockTransactionIngestView(BulkIngestView):
+    fields = TRANSACTION_FIELDS
+
+
+class StockCandlesView(generics.ListAPIView):
+    """
+    OHLCV candles for one stock, read only from the pre-aggregated candle store.
+
+    Query parameters: ``interval`` (1m, 5m, 1h or 1d; default 1m) and optional
+    ISO 8601 ``from`` / ``to`` bounds on the bucket start.
+    """
+
+    serializer_class = CandleSerializer
+    max_candles = 5000
+
+    def get_queryset(self):
+        params = self.request.query_params
+        interval = params.get("interval", "1m")
+        if interval not in INTERVALS:
+            raise ValidationError(
+                {"interval": f"Must be one of: {', '.join(INTERVALS)}"}
+            )
+
+        queryset = Candle.objects.filter(stock_id=self.kwargs["pk"], interval=interval)
+        start = parse_datetime_param(params, "from")
+        end = parse_datetime_param(params, "to")
+        if start:
+            queryset = queryset.filter(bucket__gte=start)
+        if end:
+            queryset = queryset.filter(bucket__lt=end)
+        return queryset.order_by("bucket")[: self.max_candles]
+
+
+class AnalyticsView(APIView):
+    """
+    VWAP, TWAP, volatility and volume of one stock or product over a window.
+
+    Query parameters: ISO 8601 ``from`` / ``to`` (default: the last 24 hours),
+    ``interval`` (1m, 5m, 1h or 1d; default: the finest one that covers the
+    window in at most 5000 bars, which is also the limit for an explicit
+    one) and ``window=<bars>`` to add a rolling series over that many bars.
+    Answered from the candle store in SQL.
+    """
+
+    model = Candle
+    parent_model = Stock
+
+    def get(self, request, pk):
+        params = request.query_params
+        get_object_or_404(self.parent_model, pk=pk)
+        end = parse_datetime_param(params, "to") or timezone.now()
+        start = parse_datetime_param(params, "from") or end - timedelta(days=1)
+        if start >= end:
+            raise ValidationError({"from": "Must be before 'to'."})
+        interval = params.get("interval") or choose_interval(start, end)
+        if interval not in INTERVALS:
+            raise ValidationError(
+                {"interval": f"Must be one of: {', '.join(INTERVALS)}"}
+            )
+        if bar_count(start, end, interval) > MAX_BARS:
+            raise ValidationError(
+                {"interval": f"More than {MAX_BARS} bars over this window; use a coarser interval."}
+            )
+
+        data = window_stats(pk, start, end, interval, model=self.model)
+        window = params.get("window")
+        if window:
+            if not window.isdigit() or int(window) < 2:
+                raise ValidationError({"window": "Must be an integer of at least 2."})
+            data["series"] = rolling_series(pk, start, end, int(window), interval, model=self.model)
+        return Response(data)
+
+
+class StockAnalyticsView(AnalyticsView):
+    model = Candle
+    parent_model = Stock
+
+
+class ProductAnalyticsView(AnalyticsView):
+    model = ProductCandle
+    parent_model = Product
+
+
+class MarketSnapshotView(APIView):
+    """
+    Every stock's last price, day change, day volume, high/low and company
+    name in one payload, for dashboards.
+
+    Served from the process's in-memory snapshot (see ``market.snapshot``)
+    as pre-rendered bytes; send the ETag back in ``If-None-Match`` to get a
+    304 while nothing has changed (matched like ``core.conditional``: lists,
+    weak validators and ``*``).
+    """
+
+    def get(self, request):
+        etag, body = snapshot.render()
+        response = get_conditional_response(request, etag=etag)
+        if response is None:
+            response = HttpResponse(body, content_type="application/json")
+        if response.status_code in (200, 304):
+            response["ETag"] = etag
+            response["Cache-Control"] = "no-cache"
+        return response
+
+
+class MarketExportView(APIView):
+    """
+    One column of a dataset (``trades`` or ``stock_transactions``) as a NumPy
+    ``.npy`` file: ``market/export/<dataset>/<column>.npy?from=&to=``.
+
+    Rows are in (timestamp, id) order and ``to`` is required, so the columns
+    fetched separately for one closed time range line up. Prices are int64
+    cents. Save the files and open them with ``numpy.load(path,
+    mmap_mode="r")``. The rows are streamed from a server-side cursor into a
+    temporary file, so the server's memory use does not depend on the range.
+    """
+
+    def get(self, request, dataset, column):
+        if not HAS_NUMPY:
+            return Response({"detail": "NumPy is not installed on the server."}, status=501)
+        if dataset not in DATASETS or column not in {name for name, _dtype, _sql in export_columns(dataset)}:
+            raise Http404
+        params = request.query_params
+        start = parse_datetime_param(params, "from")
+        end = parse_datetime_param(params, "to")
+        if end is None:
+            # Without an end each request would see however many rows exist by then
+            raise ValidationError({"to": "Required, so that every column covers the same rows."})
+
+        directory = tempfile.mkdtemp(prefix="market-export-")
+        try:
+            write_columns(dataset, directory, start, end, [column])
+            # The open handle keeps the data readable after the directory is removed
+            handle = open(os.path.join(directory, f"{column}.npy"), "rb")
+        finally:
+            shutil.rmtree(directory)
+        return FileResponse(
+            handle,
+            as_attachment=True,
+            filename=f"{dataset}-{column}.npy",
+            content_type="application/octet-stream",
+        )
+
+
+class CompanyHoldingsView(generics.ListAPIView):
+    """Every non-zero share position held by one company"""
+
+    serializer_class = HoldingSerializer
+
+    def get_queryset(self):
+        return (
+            Holding.objects.filter(company_id=self.kwargs["pk"])
+            .exclude(shares=0)
+            .order_by("stock_id")
+        )
+
+
+class StockHoldersView(generics.ListAPIView):
+    """Companies holding a stock, largest positions first"""
+
+    serializer_class = HoldingSerializer
+    max_holders = 1000
+
+    def get_queryset(self):
+        return (
+            Holding.objects.filter(stock_id=self.kwargs["pk"], shares__gt=0)
+            .order_by("-shares")[: self.max_holders]
+        )
+
+
+class MarketIndexListView(generics.ListAPIView):
+    """Current level of the market index and every country sub-index"""
+
+    queryset = MarketIndex.objects.order_by("country")
+    serializer_class = MarketIndexSerializer
+    pagination_class = None
+
+
+class IndexHistoryView(generics.ListAPIView):
+    """
+    Level history of one index, oldest first.
+
+    Optional ISO 8601 ``from`` / ``to`` bounds on the timestamp; returns at
+    most ``max_levels`` points (the most recent ones when there are more).
+    """
+
+    serializer_class = IndexLevelSerializer
+    pagination_class = None
+    max_levels = 5000
+
+    def get_queryset(self):
+        params = self.request.query_params
+        queryset = IndexLevel.objects.filter(index_id=self.kwargs["pk"])
+        start = parse_datetime_param(params, "from")
+        end = parse_datetime_param(params, "to")
+        if start:
+            queryset = queryset.filter(timestamp__gte=start)
+        if end:
+            queryset = queryset.filter(timestamp__lt=end)
+        levels = list(queryset.order_by("-timestamp", "-id")[: self.max_levels])
+        levels.reverse()
+        return levels
+
+
+class SettlementListView(MarketHistoryMixin, generics.ListAPIView):
+    """
+    Netted settlements, newest window first: one per company pair and
+    settlement batch (see the ``settle_trades`` command).
+
+    Filters: ``batch``, ``payer``, ``payee``, ``company`` (either side) and
+    ISO 8601 ``from`` / ``to`` on the settlement time (the window end).
+    """
+
+    queryset = Settlement.objects.all()
+    serializer_class = SettlementSerializer
+    pagination_class = SettlementPagination
+    filter_fields = ("batch", "payer", "payee")
+
+
+class SettlementBatchListView(generics.ListAPIView):
+    """
+    Settlement batches, newest window first, with their trade, pair and
+    gross/net totals. Optional ISO 8601 ``from`` / ``to`` bounds on the
+    window end; returns at most ``max_batches`` batches.
+    """
+
+    serializer_class = SettlementBatchSerializer
+    pagination_class = None
+    max_batches = 1000
+
+    def get_queryset(self):
+        params = self.request.query_params
+        queryset = SettlementBatch.objects.all()
+        start = parse_datetime_param(params, "from")
+        end = parse_datetime_param(params, "to")
+        if start:
+            queryset = queryset.filter(window_end__gte=start)
+        if end:
+            queryset = queryset.filter(window_end__lt=end)
+        return queryset.order_by("-window_end")[: self.max_batches]
 
 
 # Optionally, add detail views and simulation endpoints as needed